@@ -0,0 +1,70 @@
+# benchmarks/bench_ann.py
+from __future__ import annotations
+import argparse, pathlib, sys, time
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
+if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
+
+from cache.ann import IVFIndex, default_nlist
+from cache.emb import EmbCache
+from themes.hybrid_graph import knn_blocked
+from config import LMSTUDIO_EMB_MODEL
+from utils.io import jdump
+
+def synthetic(n: int, dim: int, n_topics: int, seed: int = 0) -> np.ndarray:
+    """Topic-clustered unit vectors, a rough stand-in for abstract embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_topics, dim))
+    X = centers[rng.integers(0, n_topics, n)] + 0.6 * rng.normal(size=(n, dim))
+    X = X.astype("float32")
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+def main(args):
+    if args.from_cache:
+        M = EmbCache().matrix(args.model)
+        X = np.asarray(M[:args.n] if args.n else M)
+    else:
+        X = synthetic(args.n, args.dim, args.topics)
+    n = X.shape[0]
+    print(f"vectors: {X.shape}")
+
+    t = time.perf_counter()
+    ex_idx, _ = knn_blocked(X, k=args.k)
+    t_exact = time.perf_counter() - t
+    print(f"exact   : {t_exact:.2f}s")
+
+    nlist = args.nlist or default_nlist(n)
+    t = time.perf_counter()
+    ivf = IVFIndex.build(X, nlist=nlist)
+    t_build = time.perf_counter() - t
+    print(f"ivf build: nlist={nlist} time={t_build:.2f}s")
+
+    rows = []
+    for nprobe in args.nprobe:
+        t = time.perf_counter()
+        idx, _ = ivf.search(X, args.k, nprobe=nprobe, exclude=np.arange(n))
+        dt = time.perf_counter() - t
+        recall = float(np.mean([len(set(a) & set(b)) for a, b in zip(idx, ex_idx)]) / max(1, args.k))
+        rows.append({"nprobe": nprobe, "recall": recall, "time_s": dt, "speedup": t_exact / dt})
+        print(f"nprobe={nprobe:<4} recall@{args.k}={recall:.3f}  time={dt:.2f}s  speedup={t_exact/dt:.1f}x")
+
+    if args.out:
+        jdump({"n": n, "dim": int(X.shape[1]), "k": args.k, "nlist": nlist,
+               "exact_s": t_exact, "build_s": t_build, "runs": rows}, pathlib.Path(args.out))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Recall/latency of the IVF index against exact blocked kNN")
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--topics", type=int, default=60)
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--nlist", type=int, default=None)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[2, 4, 8, 16, 32])
+    ap.add_argument("--from-cache", action="store_true", help="use vectors from the embedding cache instead of synthetic ones")
+    ap.add_argument("--model", default=LMSTUDIO_EMB_MODEL)
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    args = ap.parse_args()
+    main(args)
@@ -0,0 +1,53 @@
+# benchmarks/bench_embed.py
+from __future__ import annotations
+import argparse, pathlib, sys
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
+if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
+
+from clients.lmstudio import LMEmbeddings
+from config import LMSTUDIO_BASE, LMSTUDIO_EMB_MODEL
+from utils.io import jdump
+
+WORDS = ("patients trial outcome cohort randomized placebo dose response mortality risk analysis "
+         "treatment group baseline follow-up adverse events efficacy safety meta-analysis").split()
+
+def synthetic_texts(n: int, mean_words: int, seed: int = 0):
+    """Abstract-like texts with log-normal lengths around `mean_words` words."""
+    rng = np.random.default_rng(seed)
+    lens = np.clip(rng.lognormal(np.log(mean_words), 0.5, n).astype(int), 5, 8 * mean_words)
+    return [" ".join(rng.choice(WORDS, size=L)) for L in lens]
+
+def main(args):
+    texts = synthetic_texts(args.n, args.words)
+    print(f"texts: {len(texts)}  mean chars={np.mean([len(t) for t in texts]):.0f}  server={args.base}")
+    rows = []
+    for tokens in args.batch_tokens:
+        for conc in args.concurrency:
+            emb = LMEmbeddings(base=args.base, model=args.model, max_tokens=tokens, concurrency=conc)
+            emb.encode(texts[:min(len(texts), 32)])  # warm-up: model load, connections
+            emb.encode(texts)
+            st = dict(emb.last_stats, batch_tokens=tokens, concurrency=conc)
+            rows.append(st)
+            print(f"batch_tokens={tokens:<6} concurrency={conc:<3} batches={st['batches']:<5} "
+                  f"time={st['seconds']:.2f}s  {st['docs_per_s']:.1f} docs/s")
+    best = max(rows, key=lambda r: r["docs_per_s"])
+    print(f"best: batch_tokens={best['batch_tokens']} concurrency={best['concurrency']} "
+          f"({best['docs_per_s']:.1f} docs/s) -> LMSTUDIO_EMB_BATCH_TOKENS / LMSTUDIO_EMB_CONCURRENCY")
+    if args.out:
+        jdump({"n": len(texts), "model": args.model, "base": args.base, "runs": rows}, pathlib.Path(args.out))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Embedding throughput (docs/s) across batch token budgets and concurrency")
+    ap.add_argument("--n", type=int, default=2000)
+    ap.add_argument("--words", type=int, default=220, help="mean words per synthetic text")
+    ap.add_argument("--batch-tokens", dest="batch_tokens", type=int, nargs="+", default=[2048, 8192, 32768])
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--base", default=LMSTUDIO_BASE)
+    ap.add_argument("--model", default=LMSTUDIO_EMB_MODEL)
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    args = ap.parse_args()
+    main(args)
@@ -0,0 +1,202 @@
+# benchmarks/run_bench.py
+from __future__ import annotations
+import argparse, json, os, pathlib, platform, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
+if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
+
+SCENARIOS = ("build", "gaps", "ripple")
+QUERY_FRAC = 2 / 3  # corpus = universe / QUERY_FRAC, the rest are newer docs for ripple to find
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except Exception:
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10  # bytes on macOS, KiB on Linux
+
+# --- child side: one scenario per process, so peak RSS is the scenario's own ----------------
+def run_scenario(name: str, workdir: pathlib.Path, size: int) -> Dict[str, Any]:
+    import clients.lmstudio as lm
+    lm._HAVE_LMSDK = False  # the stand-in speaks the REST API only
+    from pipeline.artifact import Universe, save_universe
+    udir = workdir / "universe"
+    t0 = time.perf_counter()
+    stages: Dict[str, float] = {}
+    info: Dict[str, Any] = {}
+    if name == "build":
+        from pipeline.universe import build_universe
+        uni = build_universe(["benchmark"], None, None, retmax=size)
+        stages = {k: v for k, v in uni["timings"].items() if isinstance(v, (int, float)) and k != "total"}
+        t = time.perf_counter()
+        save_universe(uni, udir)
+        stages["save"] = round(time.perf_counter() - t, 3)
+        info = {"docs": uni["count"], "themes": len(uni["themes"])}
+    elif name == "gaps":
+        from pipeline.coverage import coverage_for_universe
+        from pipeline.gap import rank_gaps
+        t = time.perf_counter()
+        uni = Universe.open(udir)
+        docs_df = uni.docs(columns=["pmid", "title", "year", "pub_types"])
+        themes = list(uni.themes())
+        stages["load"] = round(time.perf_counter() - t, 3); t = time.perf_counter()
+        cover = coverage_for_universe(themes, docs_df)
+        stages["coverage"] = round(time.perf_counter() - t, 3); t = time.perf_counter()
+        ranked = rank_gaps({"themes": themes}, cover, datetime.now(timezone.utc).year, docs_df=docs_df)
+        stages["rank"] = round(time.perf_counter() - t, 3)
+        info = {"themes": len(themes), "ranked": len(ranked)}
+    elif name == "ripple":
+        from pipeline.evidence import split_by_kind
+        from pipeline.ripple import ripple_expand_from_primaries
+        t = time.perf_counter()
+        uni = Universe.open(udir)
+        off = uni.array("member_offsets")
+        i = int(max(range(len(off) - 1), key=lambda j: off[j+1] - off[j]))  # largest theme
+        tid = uni.theme_ids()[i]
+        sub = uni.docs(columns=["pmid", "title", "pub_types"], rows=uni.members(tid))
+        prim, _, _ = split_by_kind(sub.to_dict(orient="records"))
+        stages["load"] = round(time.perf_counter() - t, 3); t = time.perf_counter()
+        res = ripple_expand_from_primaries(prim, allowed_since_year=None, max_expand=100,
+                                           centroid=uni.array("centroids")[i], exclude=uni.pmids())
+        stages["ripple"] = round(time.perf_counter() - t, 3)
+        info = dict(res["stats"], seeds=len(prim), theme_id=tid)
+    else:
+        raise ValueError(f"unknown scenario {name!r}")
+    return {"seconds": round(time.perf_counter() - t0, 3), "peak_rss_mb": peak_rss_mb(), "stages": stages, "info": info}
+
+# --- parent side -------------------------------------------------------------------------
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+REPLAY_BASE = "http://replay.invalid"  # unresolvable: a replayed run cannot reach any network
+
+def _child_env(standins, cache_dir: pathlib.Path, args, archive: pathlib.Path | None = None) -> Dict[str, str]:
+    from benchmarks.standins import service_env
+    env = dict(os.environ, **(standins.env() if standins is not None else service_env(REPLAY_BASE)))
+    if archive is not None:
+        env.update({"HTTP_MODE": args.http_mode, "HTTP_ARCHIVE": str(archive),
+                    "HTTP_REPLAY_LATENCY": str(args.replay_latency)})
+    env.update({
+        "CACHE_DIR": str(cache_dir),
+        "ENTREZ_RATE": str(args.rate), "ICITE_RATE": str(args.rate),
+        "LMSTUDIO_USE_CLI": "0", "META_TTL_DAYS": "0",
+        "PYTHONPATH": os.pathsep.join([str(SRC), str(ROOT), env.get("PYTHONPATH", "")]),
+    })
+    if args.trace:
+        env["BENCH_TRACE_DIR"] = str(pathlib.Path(args.trace).resolve())
+    return env
+
+def main(args):
+    from benchmarks.synth import make_corpus, degree_summary
+    from benchmarks.standins import StandIns
+    from utils.io import jdump
+
+    base = pathlib.Path(args.workdir or tempfile.mkdtemp(prefix="bench_"))
+    runs: List[Dict[str, Any]] = []
+    replay = args.http_mode == "replay"
+    for size in args.sizes:
+        archive = pathlib.Path(args.archive) / f"n{size}.sqlite3" if args.http_mode != "live" else None
+        if replay and not archive.exists():
+            raise SystemExit(f"no archive for size {size}: {archive} (record it first with --http-mode record)")
+        si = None
+        if not replay:
+            t = time.perf_counter()
+            corpus = make_corpus(int(round(size / QUERY_FRAC)), query_frac=QUERY_FRAC, seed=args.seed)
+            print(f"[{size}] corpus {degree_summary(corpus)} in {time.perf_counter() - t:.1f}s")
+            si = StandIns(corpus, latency_ms=args.latency_ms, embed_ms_per_doc=args.embed_ms_per_doc, dim=args.dim).start()
+        work = base / f"n{size}"
+        work.mkdir(parents=True, exist_ok=True)
+        env = _child_env(si, work / "cache", args, archive)
+        try:
+            for name in args.scenarios:
+                if si is not None:
+                    si.reset_stats()
+                out = work / f"{name}.json"
+                cmd = [sys.executable, str(pathlib.Path(__file__).resolve()), "--child", name,
+                       "--workdir", str(work), "--sizes", str(size), "--result", str(out)]
+                proc = subprocess.run(cmd, env=env)
+                row: Dict[str, Any] = {"size": size, "scenario": name}
+                if proc.returncode == 0 and out.exists():
+                    row.update(json.loads(out.read_text(encoding="utf-8")))
+                else:
+                    row["error"] = f"exit code {proc.returncode}"
+                if si is not None:
+                    row["requests"] = si.reset_stats()
+                runs.append(row)
+                stages = "  ".join(f"{k}={v:.2f}" for k, v in row.get("stages", {}).items())
+                print(f"[{size}] {name:<7} {row.get('seconds', float('nan')):8.2f}s  "
+                      f"rss={row.get('peak_rss_mb') or 0:7.0f}MB  {stages}" + (f"  ERROR {row['error']}" if "error" in row else ""))
+        finally:
+            if si is not None:
+                si.stop()
+
+    report = {
+        "suite": "pipeline",
+        "git": _git_rev(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"sizes": args.sizes, "scenarios": args.scenarios, "latency_ms": args.latency_ms,
+                   "embed_ms_per_doc": args.embed_ms_per_doc, "dim": args.dim, "rate": args.rate, "seed": args.seed,
+                   "http_mode": args.http_mode, "replay_latency": args.replay_latency if replay else None},
+        "runs": runs,
+    }
+    if args.out:
+        jdump(report, pathlib.Path(args.out))
+        print(f"✔ wrote {args.out}")
+    if args.compare:
+        compare(json.loads(pathlib.Path(args.compare).read_text(encoding="utf-8")), report)
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Time / peak RSS of `new` relative to a baseline report, per (size, scenario)."""
+    prev = {(r["size"], r["scenario"]): r for r in old.get("runs", [])}
+    print(f"\n=== vs {old.get('git')} ({old.get('created')}) ===")
+    for r in new["runs"]:
+        o = prev.get((r["size"], r["scenario"]))
+        if not o or "seconds" not in o or "seconds" not in r:
+            continue
+        rss = (f"{r['peak_rss_mb'] / o['peak_rss_mb']:.2f}x" if r.get("peak_rss_mb") and o.get("peak_rss_mb") else "n/a")
+        print(f"{r['size']:>7} {r['scenario']:<7} time {o['seconds']:8.2f}s -> {r['seconds']:8.2f}s "
+              f"({r['seconds'] / max(o['seconds'], 1e-9):.2f}x)  rss {rss}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="End-to-end pipeline benchmarks against local stand-ins for Entrez, iCite and LM Studio")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="universe sizes (docs)")
+    ap.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    ap.add_argument("--latency-ms", dest="latency_ms", type=float, default=20.0, help="added to every stand-in response")
+    ap.add_argument("--embed-ms-per-doc", dest="embed_ms_per_doc", type=float, default=0.0)
+    ap.add_argument("--dim", type=int, default=128, help="stand-in embedding dimension")
+    ap.add_argument("--rate", type=float, default=0.0, help="client request rate limit (0 = unthrottled)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workdir", default=None, help="scratch dir for caches and universes (default: temp dir)")
+    ap.add_argument("--out", default=None, help="write the JSON report here")
+    ap.add_argument("--compare", default=None, help="baseline report to compare against")
+    ap.add_argument("--trace", default=None, help="directory for per-scenario Chrome traces (n{size}_{scenario}.json)")
+    ap.add_argument("--http-mode", dest="http_mode", choices=["live", "record", "replay"], default="live",
+                    help="record: archive every stand-in response; replay: serve them from the archive, no stand-ins")
+    ap.add_argument("--archive", default=str(ROOT / "benchmarks" / "archive"), help="HTTP archive directory (one n{size}.sqlite3 per size)")
+    ap.add_argument("--replay-latency", dest="replay_latency", default="0", help='ms added per replayed response, or "recorded"')
+    ap.add_argument("--child", choices=SCENARIOS, default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        from utils import trace
+        tdir = os.environ.get("BENCH_TRACE_DIR")
+        with trace.session(str(pathlib.Path(tdir) / f"n{args.sizes[0]}_{args.child}.json") if tdir else None):
+            res = run_scenario(args.child, pathlib.Path(args.workdir), args.sizes[0])
+        pathlib.Path(args.result).write_text(json.dumps(res), encoding="utf-8")
+    else:
+        main(args)
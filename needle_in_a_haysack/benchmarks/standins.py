@@ -0,0 +1,199 @@
+# benchmarks/standins.py
+from __future__ import annotations
+import json, threading, time, zlib, datetime as dt
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+import numpy as np
+
+from benchmarks.synth import DAY0, doc_text, doc_year
+
+ESEARCH_WINDOW = 9999
+HASH_BUCKETS = 1 << 14
+
+def service_env(url: str) -> Dict[str, str]:
+    """Client base URLs for stand-ins served at `url` (the same paths replay from an HTTP archive)."""
+    return {"ENTREZ_BASE": f"{url}/entrez/eutils", "ICITE_BASE": f"{url}/icite/api",
+            "LMSTUDIO_BASE": f"{url}/lmstudio"}
+
+class StandIns:
+    """
+    Local HTTP stand-ins for the services the pipeline talks to, serving a synthetic corpus:
+      /entrez/eutils/esearch.fcgi, efetch.fcgi      (JSON search with history paging and pdat
+                                                     windows; PubmedArticleSet XML)
+      /icite/api/pubs                               ({"data": [{pmid, year, references, cited_by}]}, fl honoured)
+      /lmstudio/v1/embeddings, /chat/completions    (hashed bag-of-words vectors; canned YAML)
+    Every response waits `latency_ms`; embeddings add `embed_ms_per_doc` per input.
+    esearch ignores the term and returns the corpus' query docs, newest first.
+    Request and item counts per endpoint are kept in `stats`.
+    """
+    def __init__(self, corpus: Dict[str, Any], latency_ms: float = 0.0, embed_ms_per_doc: float = 0.0,
+                 dim: int = 128, host: str = "127.0.0.1", port: int = 0):
+        self.corpus = corpus
+        self.latency = latency_ms / 1000.0
+        self.embed_cost = embed_ms_per_doc / 1000.0
+        self.row_of = {int(p): i for i, p in enumerate(corpus["pmids"])}
+        q = np.flatnonzero(corpus["query"])
+        self.query_rows = q[np.argsort(-corpus["days"][q], kind="stable")]  # newest first
+        self.table = np.random.default_rng(12345).normal(size=(HASH_BUCKETS, dim)).astype(np.float32)
+        self._bucket: Dict[str, int] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+            def log_message(self, *a): pass
+            def do_GET(self): outer._dispatch(self, None)
+            def do_POST(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                outer._dispatch(self, json.loads(self.rfile.read(n) or b"{}"))
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    # --- lifecycle ----------------------------------------------------------------------
+    def start(self) -> "StandIns":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def env(self) -> Dict[str, str]:
+        """Environment pointing the pipeline's clients at these stand-ins."""
+        return service_env(self.url)
+
+    def reset_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            out, self.stats = self.stats, {}
+        return out
+
+    # --- dispatch -----------------------------------------------------------------------
+    def _count(self, endpoint: str, items: int) -> None:
+        with self._lock:
+            st = self.stats.setdefault(endpoint, {"requests": 0, "items": 0})
+            st["requests"] += 1
+            st["items"] += items
+
+    def _dispatch(self, h: BaseHTTPRequestHandler, body: Any) -> None:
+        u = urlparse(h.path)
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        try:
+            if u.path.endswith("/esearch.fcgi"):
+                status, ctype, payload = self._esearch(q)
+            elif u.path.endswith("/efetch.fcgi"):
+                status, ctype, payload = self._efetch(q)
+            elif u.path.endswith("/pubs"):
+                status, ctype, payload = self._pubs(q)
+            elif u.path.endswith("/v1/embeddings"):
+                status, ctype, payload = self._embeddings(body or {})
+            elif u.path.endswith("/v1/chat/completions"):
+                status, ctype, payload = self._chat(body or {})
+            else:
+                status, ctype, payload = 404, "text/plain", b"not found"
+        except Exception as e:  # surface stand-in bugs as 500s instead of hanging the client
+            status, ctype, payload = 500, "text/plain", str(e).encode()
+        if self.latency:
+            time.sleep(self.latency)
+        h.send_response(status)
+        h.send_header("Content-Type", ctype)
+        h.send_header("Content-Length", str(len(payload)))
+        h.end_headers()
+        h.wfile.write(payload)
+
+    # --- Entrez -------------------------------------------------------------------------
+    def _date_rows(self, q: Dict[str, str]) -> np.ndarray:
+        rows = self.query_rows
+        lo, hi = q.get("mindate"), q.get("maxdate")
+        if not (lo or hi):
+            return rows
+        def day(s: str, end: bool) -> int:
+            parts = [int(x) for x in s.split("/")]
+            d = dt.date(parts[0], *(parts[1:] or ([12, 31] if end else [1, 1])))
+            return (d - DAY0).days
+        days = self.corpus["days"][rows]
+        keep = np.ones(rows.size, dtype=bool)
+        if lo:
+            keep &= days >= day(lo, False)
+        if hi:
+            keep &= days <= day(hi, True)
+        return rows[keep]
+
+    def _esearch(self, q: Dict[str, str]) -> Tuple[int, str, bytes]:
+        rows = self._date_rows(q)
+        start, size = int(q.get("retstart", 0)), int(q.get("retmax", 20))
+        if start > ESEARCH_WINDOW - 1:
+            return 400, "application/json", b'{"error": "retstart beyond window"}'
+        ids = [] if q.get("rettype") == "count" else [str(int(p)) for p in self.corpus["pmids"][rows[start:start + size]]]
+        self._count("esearch", len(ids))
+        res = {"esearchresult": {"count": str(rows.size), "idlist": ids, "webenv": "BENCH", "querykey": "1"}}
+        return 200, "application/json", json.dumps(res).encode()
+
+    def _efetch(self, q: Dict[str, str]) -> Tuple[int, str, bytes]:
+        rows = [self.row_of[int(p)] for p in q.get("id", "").split(",") if p.isdigit() and int(p) in self.row_of]
+        self._count("efetch", len(rows))
+        parts = ["<?xml version='1.0' encoding='UTF-8'?><PubmedArticleSet>"]
+        for i in rows:
+            d = doc_text(self.corpus, i)
+            pts = "".join(f"<PublicationType>{escape(p)}</PublicationType>" for p in d["pub_types"])
+            parts.append(
+                f"<PubmedArticle><MedlineCitation><PMID>{d['pmid']}</PMID><Article>"
+                f"<Journal><Title>Journal of Topic {int(self.corpus['topic'][i])}</Title><JournalIssue><PubDate>"
+                f"<Year>{d['year']}</Year></PubDate></JournalIssue></Journal>"
+                f"<ArticleTitle>{escape(d['title'])}</ArticleTitle>"
+                f"<Abstract><AbstractText>{escape(d['abstract'])}</AbstractText></Abstract>"
+                f"<PublicationTypeList>{pts}</PublicationTypeList></Article></MedlineCitation>"
+                f"<PubmedData><ArticleIdList><ArticleId IdType='doi'>10.5555/bench.{d['pmid']}</ArticleId>"
+                f"</ArticleIdList></PubmedData></PubmedArticle>")
+        parts.append("</PubmedArticleSet>")
+        return 200, "text/xml", "".join(parts).encode()
+
+    # --- iCite --------------------------------------------------------------------------
+    def _pubs(self, q: Dict[str, str]) -> Tuple[int, str, bytes]:
+        c = self.corpus
+        pm, refs, citers = c["pmids"], c["refs"], c["citers"]
+        data = []
+        for p in q.get("pmids", "").split(","):
+            i = self.row_of.get(int(p)) if p.isdigit() else None
+            if i is None:
+                continue
+            data.append({"pmid": int(pm[i]), "year": doc_year(c, i),
+                         "references": pm[refs.indices[refs.indptr[i]:refs.indptr[i+1]]].tolist(),
+                         "cited_by": pm[citers.indices[citers.indptr[i]:citers.indptr[i+1]]].tolist()})
+        if q.get("fl"):  # field list, like the real API
+            keep = q["fl"].split(",")
+            data = [{k: d[k] for k in keep if k in d} for d in data]
+        self._count("icite", len(data))
+        return 200, "application/json", json.dumps({"data": data}).encode()
+
+    # --- LM Studio ----------------------------------------------------------------------
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Hashed bag-of-words vectors: texts sharing vocabulary (topics) land close together."""
+        out = np.zeros((len(texts), self.table.shape[1]), dtype=np.float32)
+        bucket = self._bucket
+        for j, t in enumerate(texts):
+            ids = [bucket[w] if w in bucket else bucket.setdefault(w, zlib.crc32(w.encode()) % HASH_BUCKETS)
+                   for w in t.lower().split()]
+            if ids:
+                out[j] = self.table[ids].sum(axis=0)
+        return out / (np.linalg.norm(out, axis=1, keepdims=True) + 1e-12)
+
+    def _embeddings(self, body: Dict[str, Any]) -> Tuple[int, str, bytes]:
+        texts = body.get("input") or []
+        texts = [texts] if isinstance(texts, str) else texts
+        self._count("embeddings", len(texts))
+        if self.embed_cost:
+            time.sleep(self.embed_cost * len(texts))
+        vecs = self.embed(texts)
+        data = [{"object": "embedding", "index": j, "embedding": np.round(v, 6).tolist()} for j, v in enumerate(vecs)]
+        return 200, "application/json", json.dumps({"object": "list", "data": data, "model": body.get("model")}).encode()
+
+    def _chat(self, body: Dict[str, Any]) -> Tuple[int, str, bytes]:
+        self._count("chat", 1)
+        text = "label: synthetic theme\nquestions:\n  - Does the synthetic intervention work?"
+        return 200, "application/json", json.dumps({"choices": [{"message": {"role": "assistant", "content": text}}]}).encode()
@@ -0,0 +1,112 @@
+# benchmarks/synth.py
+from __future__ import annotations
+import datetime as dt
+from typing import Any, Dict, List
+import numpy as np
+import scipy.sparse as sp
+
+PMID0 = 10_000_000
+DAY0 = dt.date(1990, 1, 1)
+DAYS = (dt.date(2024, 12, 31) - DAY0).days
+
+COMMON = ("patients study outcome risk group analysis treatment effect results data clinical "
+          "association baseline follow-up increased reduced compared significant").split()
+DESIGNS = {  # pub types -> title phrase; paper_kind() reads either
+    "primary": (["Randomized Controlled Trial"], "a randomized trial"),
+    "cohort": (["Observational Study"], "a cohort study"),
+    "sr": (["Systematic Review", "Meta-Analysis"], "a systematic review and meta-analysis"),
+    "other": (["Journal Article"], "a narrative perspective"),
+}
+KINDS = np.array(list(DESIGNS))
+
+def make_corpus(n: int,
+                n_topics: int = 0,
+                query_frac: float = 2 / 3,
+                mean_refs: float = 18.0,
+                within_topic: float = 0.85,
+                sr_frac: float = 0.04,
+                seed: int = 0) -> Dict[str, Any]:
+    """
+    Synthetic PubMed-like corpus of n docs, PMIDs increasing with publication date:
+      - topic per doc (topic-specific vocabulary, so embeddings and terms cluster)
+      - kind per doc (RCT / cohort / SR-MA / other) via publication types
+      - citation graph: each doc cites earlier docs, mostly in its own topic, picked with
+        probability proportional to a Pareto 'fitness', so in-degree is heavy-tailed
+        (reference counts are log-normal; SRs cite ~3x more)
+      - `query`: the docs the stand-in esearch returns (the oldest query_frac), so ripple
+        has newer citers outside the universe to find.
+    refs / citers are CSR matrices over doc positions; texts are generated on demand (doc_text).
+    """
+    rng = np.random.default_rng(seed)
+    T = n_topics or max(8, int(round(np.sqrt(n) / 2)))
+    days = np.sort(rng.integers(0, DAYS, n))
+    pmids = PMID0 + np.arange(n, dtype=np.int64) * 3 + rng.integers(0, 3, n)
+    topic = rng.integers(0, T, n)
+    kind = rng.choice(KINDS, n, p=[0.45, 0.25, sr_frac, 0.30 - sr_frac])
+    fitness = rng.pareto(1.6, n) + 1.0
+
+    n_refs = np.minimum(rng.lognormal(np.log(mean_refs), 0.6, n), 400).astype(np.int64)
+    n_refs[kind == "sr"] *= 3
+    src = np.repeat(np.arange(n), n_refs)
+    local = rng.random(src.size) < within_topic
+    dst = np.empty(src.size, dtype=np.int64)
+    # weighted sampling over earlier docs: u * cumfitness[i-1] located in cumfitness
+    cum = np.cumsum(fitness)
+    g = ~local
+    dst[g] = np.searchsorted(cum, rng.random(int(g.sum())) * cum[np.maximum(src[g] - 1, 0)], side="right")
+    for t in range(T):
+        docs = np.flatnonzero(topic == t)
+        m = local & (topic[src] == t)
+        if not m.any() or docs.size == 0:
+            continue
+        pos = np.searchsorted(docs, src[m])  # docs of topic t before the citing doc
+        ct = np.cumsum(fitness[docs])
+        prev = np.where(pos > 0, ct[np.maximum(pos - 1, 0)], 0.0)
+        dst[m] = docs[np.minimum(np.searchsorted(ct, rng.random(int(m.sum())) * prev, side="right"), docs.size - 1)]
+    ok = dst < src
+    refs = sp.csr_matrix((np.ones(int(ok.sum()), dtype=np.int8), (src[ok], dst[ok])), shape=(n, n))
+    refs.sum_duplicates()
+    refs.data[:] = 1
+    return {
+        "pmids": pmids,
+        "days": days,
+        "topic": topic,
+        "kind": kind,
+        "query": np.arange(n) < int(n * query_frac),
+        "refs": refs,
+        "citers": refs.T.tocsr(),
+        "n_topics": T,
+        "seed": seed,
+    }
+
+def topic_words(t: int, k: int = 40) -> List[str]:
+    return [f"t{t}w{j}" for j in range(k)]
+
+def doc_year(corpus: Dict[str, Any], i: int) -> int:
+    return (DAY0 + dt.timedelta(days=int(corpus["days"][i]))).year
+
+def doc_text(corpus: Dict[str, Any], i: int) -> Dict[str, Any]:
+    """Deterministic title / abstract / year / pub types for doc position i."""
+    rng = np.random.default_rng((corpus["seed"], i))
+    t = int(corpus["topic"][i])
+    vocab = topic_words(t)
+    kind = str(corpus["kind"][i])
+    ptypes, phrase = DESIGNS[kind]
+    title = " ".join(rng.choice(vocab, 5)) + f" in {phrase}"
+    n_words = int(rng.integers(120, 260))
+    pick = rng.random(n_words) < 0.6
+    body = np.where(pick, rng.choice(vocab, n_words), rng.choice(COMMON, n_words))
+    return {
+        "pmid": str(int(corpus["pmids"][i])),
+        "title": title,
+        "abstract": " ".join(body.tolist()),
+        "year": doc_year(corpus, i),
+        "pub_types": list(ptypes),
+    }
+
+def degree_summary(corpus: Dict[str, Any]) -> Dict[str, float]:
+    indeg = np.diff(corpus["citers"].indptr)
+    outdeg = np.diff(corpus["refs"].indptr)
+    return {"docs": int(len(indeg)), "edges": int(corpus["refs"].nnz), "mean_refs": float(outdeg.mean()),
+            "max_citers": int(indeg.max()) if len(indeg) else 0,
+            "citers_p99": float(np.percentile(indeg, 99)) if len(indeg) else 0.0}
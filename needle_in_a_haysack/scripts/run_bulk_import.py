@@ -0,0 +1,59 @@
+# scripts/run_bulk_import.py
+from __future__ import annotations
+import argparse, pathlib, sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
+if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
+
+from pipeline.bulk import import_pubmed, import_icite
+from cache.pmindex import PmidIndex
+from config import BULK_WORKERS
+from utils import trace
+
+def expand(paths, patterns):
+    """Files as given; directories contribute their files matching `patterns`, sorted."""
+    out = []
+    for p in map(pathlib.Path, paths):
+        if p.is_dir():
+            out.extend(sorted({f for pat in patterns for f in p.glob(pat)}))
+        else:
+            out.append(p)
+    return out
+
+def main(args):
+    if args.pubmed:
+        files = expand(args.pubmed, ["*.xml", "*.xml.gz"])
+        print(f"PubMed: {len(files)} files, {args.workers} workers")
+        def progress(p):
+            print(f"  [{p['done']}/{p['of']}] {pathlib.Path(p['file']).name}  {p['records']:,} records  {p['seconds']}s")
+        st = import_pubmed(files, workers=args.workers, restart=args.restart, on_progress=progress)
+        print(f"✔ PubMed: {st['records']:,} records from {st['files']} files ({st['skipped']} already imported), "
+              f"{st['deleted']:,} deletions, {st['seconds']:.1f}s")
+    for f in expand(args.icite or [], ["*.csv", "*.csv.gz", "*.csv.zip", "*.json", "*.jsonl", "*.jsonl.gz"]):
+        print(f"iCite: {f}")
+        def progress(p):
+            print(f"  {p['rows']:,} rows  {p['records']:,} records  {p['seconds']}s")
+        st = import_icite(f, workers=args.workers, chunk_rows=args.chunk_rows, restart=args.restart, on_progress=progress)
+        if st["skipped"]:
+            print(f"✔ iCite: already imported ({st['rows']:,} rows)")
+        else:
+            print(f"✔ iCite: {st['records']:,} records" + (f" (resumed at row {st['resumed_from']:,})" if st["resumed_from"] else "")
+                  + f", {st['seconds']:.1f}s")
+    idx = PmidIndex()
+    print(f"PMID index: {idx.count():,} PMIDs (PubMed {idx.count('pubmed'):,}, iCite {idx.count('icite'):,})")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Load PubMed baseline/update XML and iCite snapshots into the local caches")
+    ap.add_argument("--pubmed", nargs="+", default=None, help="baseline/update .xml(.gz) files or directories")
+    ap.add_argument("--icite", nargs="+", default=None, help="iCite snapshot: icite_metadata.csv(.gz/.zip) or JSON lines")
+    ap.add_argument("--workers", type=int, default=BULK_WORKERS, help="parser processes")
+    ap.add_argument("--chunk-rows", dest="chunk_rows", type=int, default=50_000, help="iCite rows per worker task / checkpoint")
+    ap.add_argument("--restart", action="store_true", help="ignore checkpoints and reimport everything given")
+    ap.add_argument("--trace", default=None, help="write a Chrome trace (chrome://tracing, Perfetto) here and print a stage summary")
+    args = ap.parse_args()
+    if not (args.pubmed or args.icite):
+        ap.error("nothing to import: give --pubmed and/or --icite")
+    with trace.session(args.trace):
+        main(args)
@@ -0,0 +1,28 @@
+# scripts/run_emb_migrate.py
+from __future__ import annotations
+import argparse, pathlib, sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
+if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
+
+from cache.emb import EmbCache, BASE
+from config import LMSTUDIO_EMB_MODEL
+from utils import trace
+
+def main(args):
+    cache = EmbCache(pathlib.Path(args.base))
+    n = cache.migrate_legacy(args.model, remove=args.remove)
+    print(f"✔ migrated {n} legacy .npy vectors for {args.model} (dim={cache.dim(args.model)})"
+          + ("  | removed legacy files" if args.remove else ""))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=LMSTUDIO_EMB_MODEL)
+    ap.add_argument("--base", default=str(BASE))
+    ap.add_argument("--remove", action="store_true", help="delete {pmid}.npy files once imported")
+    ap.add_argument("--trace", default=None, help="write a Chrome trace (chrome://tracing, Perfetto) here and print a stage summary")
+    args = ap.parse_args()
+    with trace.session(args.trace):
+        main(args)
@@ -1,8 +1,7 @@
 # scripts/run_gap_hunt.py
 from __future__ import annotations
-import argparse, pathlib, sys, json
-from typing import Dict, Any, List
-import pandas as pd
+import argparse, pathlib, sys, time
+from typing import Dict
 from datetime import datetime, timezone
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
@@ -11,9 +10,13 @@ if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
 if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
 
 from utils.io import jdump
-from pipeline.coverage import coverage_for_theme
-from pipeline.gap import rank_gaps, top_terms
+from pipeline.artifact import Universe
+from pipeline.coverage import coverage_for_universe
+from pipeline.gap import rank_gaps
 from clients.lmstudio import LMChat
+from pipeline.label import label_themes
+from config import LMSTUDIO_CHAT_MAX_CONCURRENCY
+from utils import trace
 
 LABEL_SYS = "You summarize biomedical literature themes. Be concise and precise."
 LABEL_TMPL = """Given these paper titles (newline separated), return:
@@ -25,33 +28,37 @@ Titles:
 
 Return YAML with keys: label, questions"""
 
-def maybe_llm_label(chat: LMChat, titles: List[str]) -> Dict[str, Any]:
-    try:
-        resp = chat.chat(LABEL_SYS, LABEL_TMPL.format(titles="\n".join(titles)), temperature=0.2, max_tokens=400)
-        return {"llm_yaml": resp}
-    except Exception as e:
-        return {"llm_error": str(e)}
-
 def main(args):
-    uni = json.loads(pathlib.Path(args.universe).read_text(encoding="utf-8"))
-    docs_df = pd.DataFrame(uni["docs"])
-    cover_rows = [coverage_for_theme(t, docs_df) for t in uni["themes"]]
+    timings: Dict[str, float] = {}
+    t = time.perf_counter()
+    uni = Universe.open(args.universe)
+    docs_df = uni.docs(columns=["pmid", "title", "year", "pub_types"])
+    themes = list(uni.themes())
+    timings["load"] = round(time.perf_counter() - t, 3); t = time.perf_counter()
+    cover_rows = coverage_for_universe(themes, docs_df)
+    timings["coverage"] = round(time.perf_counter() - t, 3); t = time.perf_counter()
     now_year = datetime.now(timezone.utc).year
-    ranked = rank_gaps(uni, cover_rows, now_year)
+    ranked = rank_gaps({"themes": themes}, cover_rows, now_year, docs_df=docs_df)
+    timings["rank"] = round(time.perf_counter() - t, 3); t = time.perf_counter()
 
-    # Optional LLM labeling for the top themes
-    llm = LMChat() if args.llm_label else None
-    if llm:
-        id2members = {t["theme_id"]: t["members_idx"] for t in uni["themes"]}
+    # Optional LLM labeling for the top themes (concurrent, cached across runs)
+    if args.llm_label:
+        id2members = {th["theme_id"]: th["members_idx"] for th in themes}
+        title_col = docs_df["title"].to_numpy()
+        titles = {r["theme_id"]: title_col[id2members[r["theme_id"]][:30]].tolist() for r in ranked[:args.topk]}
+        labels, st = label_themes(LMChat(), titles, LABEL_SYS, LABEL_TMPL, concurrency=args.llm_concurrency)
         for r in ranked[:args.topk]:
-            idxs = id2members[r["theme_id"]]
-            titles = [docs_df.iloc[i]["title"] for i in idxs][:30]
-            r.update(maybe_llm_label(llm, titles))
+            r.update(labels[r["theme_id"]])
+        timings["label"] = st["seconds"]
+        print(f"[label] themes={st['themes']} cached={st['cached']} generated={st['generated']} "
+              f"errors={st['errors']} in {st['seconds']:.2f}s")
 
     outdir = pathlib.Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
-    jdump({"universe_file": str(args.universe), "coverage": cover_rows, "ranked": ranked}, outdir / "gaps.json")
+    jdump({"universe_file": str(args.universe), "coverage": cover_rows, "ranked": ranked, "timings": timings},
+          outdir / "gaps.json")
 
     print(f"✔ wrote {outdir/'gaps.json'}")
+    print("[timings] " + "  ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
     print("\n=== TOP CANDIDATES ===")
     for r in ranked[:args.topk]:
         print(f"- Theme {r['theme_id']}: GAP={r['gap_score']:.3f} | cov={r['coverage_ratio']:.2f} ({r['coverage_level']}) | E={r['E_size']} | new={r['new_primary_count']} | lastSR={r['last_sr_year']}")
@@ -66,9 +73,13 @@ def main(args):
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("--universe", required=True)
+    ap.add_argument("--universe", required=True, help="universe directory (or legacy universe.json)")
     ap.add_argument("--outdir", default="runs/gap_hunt")
     ap.add_argument("--topk", type=int, default=6)
     ap.add_argument("--llm-label", action="store_true", help="use local LLM (LM Studio) to label themes and draft questions")
+    ap.add_argument("--llm-concurrency", type=int, default=None,
+                    help=f"chat requests in flight (default: one per uncached theme, at most {LMSTUDIO_CHAT_MAX_CONCURRENCY})")
+    ap.add_argument("--trace", default=None, help="write a Chrome trace (chrome://tracing, Perfetto) here and print a stage summary")
     args = ap.parse_args()
-    main(args)
+    with trace.session(args.trace):
+        main(args)
@@ -1,43 +1,49 @@
 # scripts/run_ripple_boost.py
 from __future__ import annotations
-import argparse, pathlib, sys, json
-import pandas as pd
+import argparse, pathlib, sys
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 SRC = ROOT / "src"
 if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
 if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
 
-from pipeline.ripple import ripple_expand_from_primaries
+from pipeline.ripple import ripple_expand_from_primaries, MAX_EXPAND
 from pipeline.evidence import split_by_kind
 from utils.io import jdump
+from pipeline.artifact import Universe
+from utils import trace
 
 def main(args):
-    uni = json.loads(pathlib.Path(args.universe).read_text(encoding="utf-8"))
-    docs_df = pd.DataFrame(uni["docs"]).copy()
-    t = next((x for x in uni["themes"] if int(x["theme_id"])==int(args.theme_id)), None)
-    if not t:
+    uni = Universe.open(args.universe)
+    if int(args.theme_id) not in uni.theme_ids():
         print(f"Theme {args.theme_id} not found.")
         return
-    members = set(t["members_pmids"])
-    sub = docs_df[docs_df["pmid"].astype(str).isin(members)].copy()
+    sub = uni.docs(columns=["pmid", "title", "pub_types"], rows=uni.members(args.theme_id))
     prim, sr, _ = split_by_kind(sub.to_dict(orient="records"))
     if not prim:
         print("No primaries in theme; nothing to ripple from.")
         return
     allowed_since = args.since_year
-    res = ripple_expand_from_primaries(prim, allowed_since_year=allowed_since, max_expand=args.max_expand, prefer=args.prefer)
+    centroid = uni.array("centroids")[uni.theme_ids().index(int(args.theme_id))]
+    res = ripple_expand_from_primaries(prim, allowed_since_year=allowed_since, max_expand=args.max_expand,
+                                       prefer=args.prefer, centroid=centroid, exclude=uni.pmids())
     outdir = pathlib.Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
     jdump(res, outdir / f"ripple_theme{args.theme_id}.json")
-    print(f"✔ wrote {outdir / f'ripple_theme{args.theme_id}.json'} | candidates={len(res['candidates'])}")
+    st = res["stats"]
+    print(f"✔ wrote {outdir / f'ripple_theme{args.theme_id}.json'} | candidates={len(res['candidates'])} "
+          f"(pool={st['pool']} screened={st['screened']} fetched={st['fetched']})")
+    for s in res["scored"][:5]:
+        print(f"  {s['pmid']}  cos={s['cos']}  links={s['links']}  year={s['year']}  {res['meta'][s['pmid']].get('title', '')[:80]}")
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("--universe", required=True)
+    ap.add_argument("--universe", required=True, help="universe directory (or legacy universe.json)")
     ap.add_argument("--theme-id", type=int, required=True)
     ap.add_argument("--since-year", type=int, default=None, help="only include items >= year")
-    ap.add_argument("--max-expand", type=int, default=300)
+    ap.add_argument("--max-expand", type=int, default=MAX_EXPAND, help="shortlist fetched + embedded (ranked by seed links)")
     ap.add_argument("--prefer", choices=["citers","refs","both"], default="citers")
     ap.add_argument("--outdir", default="runs/ripple")
+    ap.add_argument("--trace", default=None, help="write a Chrome trace (chrome://tracing, Perfetto) here and print a stage summary")
     args = ap.parse_args()
-    main(args)
+    with trace.session(args.trace):
+        main(args)
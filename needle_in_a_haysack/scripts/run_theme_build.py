@@ -1,11 +1,10 @@
 # scripts/run_theme_build.py
 from __future__ import annotations
 
-import argparse, pathlib, sys, re, time
+import argparse, pathlib, sys, time
 from typing import List, Dict, Any
-import numpy as np, pandas as pd, networkx as nx
+import numpy as np, pandas as pd
 from tqdm import tqdm
-from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 
 
 # --- Make both project root and src/ importable ---
@@ -17,16 +16,16 @@ if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
 # --- Local imports ---
-from config import KNN_K, HYBRID_ALPHA, HYBRID_BETA, LMSTUDIO_EMB_MODEL
-from cache.emb import EmbCache
+from config import KNN_K, KNN_BLOCK, HYBRID_ALPHA, HYBRID_BETA
 from utils.io import jdump
-from clients.entrez import esearch, efetch_abstracts
-from clients.icite import get_pubs, extract_refs_and_citers
-from clients.lmstudio import LMEmbeddings
-from themes.hybrid_graph import cosine_sim_matrix, build_knn, hybrid_weights
+from clients.entrez import esearch
+from pipeline.embed import embed_cached
+from pipeline.fetch import fetch_meta, ensure_citations
+from themes.hybrid_graph import knn_blocked, hybrid_weights, ref_incidence, coupling_knn
 from themes.themes import soft_membership
-
-TOKEN_RE = re.compile(r"[A-Za-zÀ-ÿ0-9_]+")
+from themes.cluster import cluster_knn
+from themes.terms import build_dtm, top_terms_by_class
+from utils import trace
 
 PRIM_HINT = {"Randomized Controlled Trial","Clinical Trial","Cohort","Case-Control"}
 SR_HINT   = {"Systematic Review","Meta-Analysis","Review"}
@@ -40,17 +39,6 @@ def summarize_pubtypes(pt_lists):
         else: other+=1
     return prim, sr, other
 
-STOP = ENGLISH_STOP_WORDS
-
-def top_keywords(texts, topn: int = 8):
-    tf = {}
-    for t in texts:
-        for tok in TOKEN_RE.findall((t or "").lower()):
-            if len(tok) < 4 or tok in STOP:
-                continue
-            tf[tok] = tf.get(tok, 0) + 1
-    return [w for w,_ in sorted(tf.items(), key=lambda x: x[1], reverse=True)[:topn]]
-
 def nearest_to_centroid(vecs: np.ndarray, idxs: List[int], centroid: np.ndarray, k: int = 3) -> List[int]:
     # return indices (within idxs) of the k closest docs to centroid
     sub = vecs[idxs]
@@ -70,7 +58,8 @@ def build(args):
         return
 
     # 2) Fetch metadata (title, abstract, year, pub types, doi)
-    meta = efetch_abstracts(pmids)
+    meta, meta_hits = fetch_meta(pmids)
+    print(f"Metadata cache: hits={meta_hits} miss={len(pmids) - meta_hits}")
     if not meta:
         print("efetch returned no metadata.")
         return
@@ -80,143 +69,47 @@ def build(args):
     print(f"Fetched metadata for {n} items")
 
     # 3) Embeddings (cached)
-    cache = EmbCache()
     pmid_list = [str(x) for x in df["pmid"].tolist()]
     texts = (df["title"].fillna("") + "\n" + df["abstract"].fillna("")).tolist()
 
     tE = time.perf_counter()
-    cached = cache.get_many(LMSTUDIO_EMB_MODEL, pmid_list)
-    hits = len(cached); miss = len(pmid_list) - hits
-    print(f"Embedding cache: hits={hits} miss={miss}")
-
-    vecs = np.zeros((len(pmid_list), 0), dtype="float32")  # placeholder for shape
-    miss_idx, miss_texts, miss_pmids = [], [], []
-    for i, pmid in enumerate(pmid_list):
-        if pmid in cached:
-            continue
-        miss_idx.append(i); miss_texts.append(texts[i]); miss_pmids.append(pmid)
-
-    if miss_texts:
-        emb = LMEmbeddings()
-        new_vecs = emb.encode(miss_texts, batch_size=args.emb_batch)
-        # persist
-        cache.put_many(LMSTUDIO_EMB_MODEL, [(pmid, new_vecs[j]) for j, pmid in enumerate(miss_pmids)])
-    else:
-        new_vecs = np.empty((0, 0), dtype="float32")
-
-    # build full matrix in original order
-    # first, obtain dim from either cached or new_vecs
-    if hits > 0:
-        any_vec = next(iter(cached.values()))
-        dim = any_vec.size
-    elif miss > 0:
-        dim = new_vecs.shape[1]
-    else:
-        raise RuntimeError("No documents to embed.")
-    vecs = np.zeros((len(pmid_list), dim), dtype="float32")
-
-    # fill from cache
-    for i, pmid in enumerate(pmid_list):
-        if pmid in cached:
-            vecs[i] = cached[pmid]
-    # fill newly computed
-    for pos, j in enumerate(miss_idx):
-        vecs[j] = new_vecs[pos]
-
-    # L2-normalize (safety)
-    vecs /= (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12)
+    vecs, hits = embed_cached(pmid_list, texts, batch_size=args.emb_batch)
+    print(f"Embedding cache: hits={hits} miss={len(pmid_list) - hits}")
     tE = time.perf_counter() - tE
     n_dim = int(vecs.shape[1]) if vecs.ndim == 2 else -1
     print(f"Embeddings: shape={vecs.shape}, batch={args.emb_batch}, time={tE:.2f}s")
 
 
-    # 4) iCite references/citers for coupling
-    pubs = get_pubs(df["pmid"].tolist(), fields=["pmid","cited_by","references","doi","year"], legacy=True)
-    ref_sets: dict[str, set[int]] = {}
-    for rec in pubs:
-        refs, citers = extract_refs_and_citers(rec)
-        pmid = str(rec.get("pmid") or rec.get("_id") or "")
-        ref_sets[pmid] = set(refs)
+    # 4) iCite references/citers for coupling (citation store, fetched once)
+    cites = ensure_citations(pmid_list)
 
-    # 5) Cosine similarity (semantic)
-    cos = cosine_sim_matrix(vecs)
+    # 5) Cosine kNN (semantic), blocked so the n x n matrix is never materialized
+    with trace.span("theme_build.knn", docs=n):
+        knn_idx_cos, knn_cos = knn_blocked(vecs, k=args.knn_k or KNN_K, block=args.knn_block)
 
     # 6) Bibliographic coupling (Jaccard) on kNN pairs
-    knn_idx_cos, knn_cos = build_knn(cos, k=args.knn_k or KNN_K)
-    bc_knn = np.zeros_like(knn_cos, dtype="float32")
     tC = time.perf_counter()
-    for i in range(n):
-        Ri = ref_sets.get(str(df.iloc[i]["pmid"]), set())
-        if not Ri:
-            continue
-        for t, j in enumerate(knn_idx_cos[i]):
-            Rj = ref_sets.get(str(df.iloc[j]["pmid"]), set())
-            if not Rj:
-                continue
-            inter = len(Ri & Rj)
-            if inter:
-                uni = len(Ri | Rj) or 1
-                bc_knn[i, t] = inter / uni
+    with trace.span("theme_build.coupling", docs=n):
+        R = ref_incidence(cites.refs_of(pmid_list))
+        bc_knn = coupling_knn(R, knn_idx_cos)
     tC = time.perf_counter() - tC
     print(f"Coupling (kNN pairs): n={n}, k={knn_idx_cos.shape[1]}, time={tC:.2f}s")
 
     # 7) Hybrid weights for the kNN graph
     hyb = hybrid_weights(knn_cos, bc_knn, alpha=args.alpha or HYBRID_ALPHA, beta=args.beta or HYBRID_BETA)
 
-    # 8) Build weighted kNN graph
-    G = nx.Graph()
-    for i in range(n):
-        for t, j in enumerate(knn_idx_cos[i]):
-            w = float(hyb[i, t])
-            if w <= 0:
-                continue
-            if G.has_edge(i, j):
-                if G[i][j]["weight"] < w:
-                    G[i][j]["weight"] = w
-            else:
-                G.add_edge(i, j, weight=w)
-
-    # 9) Cluster: Leiden → HDBSCAN → thresholded components
-    labels = None
-    method = None
-    try:
-        import igraph as ig  # type: ignore
-        import leidenalg as la  # type: ignore
-        mapping = {n:i for i,n in enumerate(G.nodes())}
-        edges = [(mapping[u], mapping[v]) for u,v in G.edges()]
-        weights = [G[u][v].get("weight", 1.0) for u,v in G.edges()]
-        g = ig.Graph(n=len(mapping), edges=edges)
-        g.es["weight"] = weights
-        part = la.find_partition(g, la.RBConfigurationVertexPartition, weights="weight", resolution_parameter=args.resolution)
-        labels_ig = np.zeros(len(mapping), dtype=int)
-        for comm_id, members in enumerate(part):
-            for v in members:
-                labels_ig[v] = comm_id
-        labels = labels_ig
-        method = "leiden"
-    except Exception:
-        try:
-            import importlib.util
-            if importlib.util.find_spec("hdbscan") is None:
-                raise ImportError("hdbscan not installed")
-            import hdbscan  # type: ignore
-            labels = hdbscan.HDBSCAN(min_cluster_size=max(10, n // 50), metric="euclidean").fit_predict(vecs)
-            method = "hdbscan"
-        except Exception:
-            TH = float(args.threshold or 0.4)
-            H = nx.Graph((u,v,d) for u,v,d in G.edges(data=True) if d.get("weight",0.0) >= TH)
-            labels = -1 * np.ones(n, dtype=int)
-            cid = 0
-            for comp in nx.connected_components(H):
-                for i in comp:
-                    labels[i] = cid
-                cid += 1
-            method = f"components@{TH}"
+    # 8-9) Weighted kNN graph straight from the kNN arrays; Leiden → HDBSCAN → thresholded components
+    with trace.span("theme_build.cluster", docs=n):
+        labels, method = cluster_knn(vecs, knn_idx_cos, hyb, resolution=args.resolution, threshold=float(args.threshold or 0.4))
 
     # 10) Soft membership (top-2 themes per doc)
-    unique, W = soft_membership(vecs, labels, knn_idx_cos, hyb, topm=2, lam=0.5)
+    with trace.span("theme_build.soft_membership", docs=n):
+        unique, W = soft_membership(vecs, labels, knn_idx_cos, hyb, topm=2, lam=0.5)
 
-    # 11) Persist artifacts
+    # 11) Persist artifacts (title terms: c-TF-IDF over one doc x term matrix)
+    with trace.span("theme_build.terms", docs=n):
+        dtm, vocab = build_dtm(df["title"].fillna("").tolist())
+        terms = top_terms_by_class(dtm, vocab, labels, k=8)
     themes = []
     for t in unique:
         members = np.where(labels == t)[0].tolist()
@@ -236,6 +129,7 @@ def build(args):
                 "max": int(yrs.max()) if yrs.notna().any() else None,
                 "median": float(yrs.median()) if yrs.notna().any() else None,
             },
+            "terms": terms.get(int(t), []),
         }
         themes.append(theme)
 
@@ -264,9 +158,7 @@ def build(args):
         tid = theme["theme_id"]; members = theme["members_idx"]
         y = theme["year_stats"]
 
-        # keywords
-        t_texts = df.iloc[members]["title"].fillna("").tolist()
-        kws = top_keywords(t_texts, topn=8)
+        kws = theme["terms"]
 
         # representatives
         cent = np.array(theme["centroid"], dtype="float32")
@@ -309,6 +201,9 @@ if __name__ == "__main__":
     ap.add_argument("--resolution", type=float, default=0.6)
     ap.add_argument("--threshold", type=float, default=0.4, help="edge weight threshold if components fallback is used")
     ap.add_argument("--emb-batch", dest="emb_batch", type=int, default=48, help="embedding batch size (lower to reduce VRAM)")
+    ap.add_argument("--knn-block", dest="knn_block", type=int, default=KNN_BLOCK, help="rows per kNN block (lower to reduce memory)")
     ap.add_argument("--outdir", default="runs/theme_build")
+    ap.add_argument("--trace", default=None, help="write a Chrome trace (chrome://tracing, Perfetto) here and print a stage summary")
     args = ap.parse_args()
-    build(args)
+    with trace.session(args.trace):
+        build(args)
@@ -8,31 +8,50 @@ SRC = ROOT / "src"
 if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
 if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
 
-from pipeline.universe import build_universe
-from utils.io import jdump
+from pipeline.universe import build_universe, update_universe, search_pmids
+from pipeline.artifact import Universe, save_universe
+from config import KNN_BLOCK, META_TTL_DAYS
+from utils import trace
 
 def main(args):
     queries = [q.strip() for q in args.queries.split("||") if q.strip()]
-    uni = build_universe(
-        queries=queries,
-        year_min=args.year_min,
-        year_max=args.year_max,
-        retmax=args.retmax,
-        hydrate=args.hydrate,
-        hops=args.hops,
-        per_seed_budget=args.per_seed_budget,
-        knn_k=args.knn_k,
-        alpha=args.alpha,
-        beta=args.beta,
-        resolution=args.resolution,
-        threshold=args.threshold,
-        emb_batch=args.emb_batch
-    )
+    if args.update:
+        existing = Universe.open(args.update).to_dict()
+        new_pmids = search_pmids(queries, args.year_min, args.year_max, args.retmax)
+        uni = update_universe(existing, new_pmids, queries=queries, emb_batch=args.emb_batch,
+                              knn_block=args.knn_block, meta_ttl_days=args.meta_ttl_days,
+                              stream_chunk=args.stream_chunk, stream_depth=args.stream_depth)
+    else:
+        uni = build_universe(
+            queries=queries,
+            year_min=args.year_min,
+            year_max=args.year_max,
+            retmax=args.retmax,
+            hydrate=args.hydrate,
+            hops=args.hops,
+            per_seed_budget=args.per_seed_budget,
+            hydrate_budget=args.hydrate_budget,
+            knn_k=args.knn_k,
+            alpha=args.alpha,
+            beta=args.beta,
+            resolution=args.resolution,
+            threshold=args.threshold,
+            emb_batch=args.emb_batch,
+            knn_block=args.knn_block,
+            knn_backend=args.knn_backend,
+            meta_ttl_days=args.meta_ttl_days,
+            stream_chunk=args.stream_chunk,
+            stream_depth=args.stream_depth
+        )
     outdir = pathlib.Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
-    jdump(uni, outdir / "universe.json")
-    print(f"✔ wrote {outdir/'universe.json'}  | docs={uni['count']} themes={len(uni['themes'])} method={uni['cluster_method']}")
+    save_universe(uni, outdir)
+    print(f"✔ wrote {outdir}  | docs={uni['count']} themes={len(uni['themes'])} method={uni['cluster_method']}")
+    if args.json:
+        Universe(outdir).export_json(outdir / "universe.json")
+        print(f"✔ exported {outdir/'universe.json'}")
     # tiny preview
     print("Themes:", [t["theme_id"] for t in uni["themes"]])
+    print("Timings (s):", "  ".join(f"{k}={v}" for k, v in uni["timings"].items()))
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
@@ -43,12 +62,24 @@ if __name__ == "__main__":
     ap.add_argument("--hydrate", choices=["none","refs","citers","both"], default="none")
     ap.add_argument("--hops", type=int, default=1)
     ap.add_argument("--per-seed-budget", dest="per_seed_budget", type=int, default=150)
+    ap.add_argument("--hydrate-budget", dest="hydrate_budget", type=int, default=None,
+                    help="max PMIDs added by hydration over all hops (default: per-seed-budget x seeds)")
     ap.add_argument("--knn-k", type=int, default=20)
     ap.add_argument("--alpha", type=float, default=0.6)
     ap.add_argument("--beta", type=float, default=0.4)
     ap.add_argument("--resolution", type=float, default=0.6)
     ap.add_argument("--threshold", type=float, default=0.4)
     ap.add_argument("--emb-batch", dest="emb_batch", type=int, default=48)
+    ap.add_argument("--knn-backend", dest="knn_backend", choices=["exact","ann"], default="exact", help="ann = persistent IVF index over the embedding cache")
+    ap.add_argument("--knn-block", dest="knn_block", type=int, default=KNN_BLOCK, help="rows per kNN block (lower to reduce memory)")
+    ap.add_argument("--meta-ttl-days", dest="meta_ttl_days", type=float, default=META_TTL_DAYS, help="refetch cached PubMed metadata older than this")
+    ap.add_argument("--stream-chunk", dest="stream_chunk", type=int, default=200, help="PMIDs per fetch/embed pipeline chunk")
+    ap.add_argument("--stream-depth", dest="stream_depth", type=int, default=4, help="chunks buffered between pipeline stages")
+    ap.add_argument("--json", action="store_true", help="also export the single-file universe.json")
+    ap.add_argument("--update", default=None, help="existing universe (directory or universe.json): add the queries' new PMIDs to it incrementally "
+                                                   "(graph and hydration params are taken from the existing universe)")
     ap.add_argument("--outdir", default="runs/universe")
+    ap.add_argument("--trace", default=None, help="write a Chrome trace (chrome://tracing, Perfetto) here and print a stage summary")
     args = ap.parse_args()
-    main(args)
+    with trace.session(args.trace):
+        main(args)
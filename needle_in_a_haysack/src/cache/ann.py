@@ -0,0 +1,323 @@
+# src/cache/ann.py
+from __future__ import annotations
+import os, copy, json, pathlib, threading, time, numpy as np
+from typing import Any, Dict, Iterable, List, Tuple
+
+from cache.emb import EmbCache, _Store
+from themes.hybrid_graph import knn_blocked
+from utils.filelock import file_lock
+
+ANN_DIR = "ann"
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+_RETRAIN_GROWTH = 4.0  # retrain centroids once the store has grown this much since training
+_REBALANCE = 2.0  # ... or once list-size imbalance (largest / mean) is this many times its value at training
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype="float32")
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+
+def _assign(X: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+    out = np.empty(X.shape[0], dtype=np.int32)
+    for s in range(0, X.shape[0], block):
+        out[s:s+block] = np.argmax(_normalize(X[s:s+block]) @ centroids.T, axis=1)
+    return out
+
+def _in_sorted(sorted_rows: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Mask of `rows` that occur in `sorted_rows` (binary search: O(len(rows) log len(sorted_rows)))."""
+    if sorted_rows.size == 0:
+        return np.zeros(rows.size, dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_rows, rows), sorted_rows.size - 1)
+    return sorted_rows[pos] == rows
+
+def train_centroids(X: np.ndarray, nlist: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on (a sample of) X; returns unit-norm centroids [nlist, d]."""
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    nlist = max(1, min(nlist, n))
+    sample = np.sort(rng.choice(n, size=min(n, 256 * nlist), replace=False))
+    S = _normalize(X[sample])
+    C = S[rng.choice(S.shape[0], size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        a = _assign(S, C)
+        sums = np.zeros_like(C)
+        np.add.at(sums, a, S)
+        empty = np.bincount(a, minlength=nlist) == 0
+        sums[empty] = S[rng.choice(S.shape[0], size=int(empty.sum()))]  # re-seed empty lists
+        C = _normalize(sums)
+    return C
+
+def default_nlist(n: int) -> int:
+    return int(max(1, min(4096, round(4 * np.sqrt(max(n, 1))))))
+
+class IVFIndex:
+    """
+    Inverted-file index: each vector is assigned to its nearest centroid; a query scans
+    the `nprobe` closest lists and reranks those candidates exactly.
+    `vectors` may be any row-indexable float32 matrix (e.g. the EmbCache memmap).
+    Each list is a tuple of row arrays: extend() adds appended rows as new chunks, which a
+    search joins on first use, so growing the index never re-sorts the rows already in it.
+    """
+    def __init__(self, centroids: np.ndarray, assign: np.ndarray, vectors: np.ndarray):
+        self.centroids = centroids
+        self.vectors = vectors
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(centroids.shape[0] + 1))
+        self._lists: List[Tuple[np.ndarray, ...]] = [(order[offsets[l]:offsets[l+1]],) for l in range(centroids.shape[0])]
+        self.sizes = np.diff(offsets)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int | None = None) -> "IVFIndex":
+        C = train_centroids(vectors, nlist or default_nlist(vectors.shape[0]))
+        return cls(C, _assign(vectors, C), vectors)
+
+    def extend(self, assign: np.ndarray, vectors: np.ndarray) -> "IVFIndex":
+        """
+        A new index with the last len(assign) rows of `vectors` added to their lists, in
+        O(nlist + len(assign)); this one is left as is for searches still running on it.
+        """
+        out = copy.copy(self)
+        out.vectors, out._lists = vectors, list(self._lists)
+        start = vectors.shape[0] - assign.size
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(self.centroids.shape[0] + 1))
+        for l in np.flatnonzero(np.diff(bounds)):
+            out._lists[l] = self._lists[l] + (order[bounds[l]:bounds[l+1]] + start,)
+        out.sizes = self.sizes + np.diff(bounds)
+        return out
+
+    def imbalance(self) -> float:
+        """Largest list size over the mean list size (1.0 = perfectly even)."""
+        return float(self.sizes.max() * self.sizes.size / max(1, int(self.sizes.sum())))
+
+    def _list(self, l: int) -> np.ndarray:
+        parts = self._lists[l]
+        if len(parts) > 1:
+            parts = self._lists[l] = (np.concatenate(parts),)
+        return parts[0]
+
+    def search(self, Q: np.ndarray, k: int, nprobe: int = ANN_NPROBE,
+               allowed: np.ndarray | None = None,
+               exclude: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (rows [q, k], sims [q, k]) sorted by similarity; -1 / -inf pad rows with
+        fewer than k candidates. `allowed` is a boolean mask over rows or a sorted array of
+        allowed row ids; `exclude[i]` is a row never returned for query i (its self-match).
+        """
+        Q = _normalize(Q)
+        nq = Q.shape[0]
+        nprobe = max(1, min(nprobe, self.centroids.shape[0]))
+        probe = np.argpartition(-(Q @ self.centroids.T), kth=nprobe-1, axis=1)[:, :nprobe]
+        best_v = np.full((nq, k), -np.inf, dtype="float32")
+        best_i = np.full((nq, k), -1, dtype=np.int64)
+        if k == 0:
+            return best_i, best_v
+        # visit each list once, scoring every query that probes it
+        qs_by_list = np.argsort(probe.ravel(), kind="stable")
+        lists = probe.ravel()[qs_by_list]
+        bounds = np.searchsorted(lists, np.arange(self.centroids.shape[0] + 1))
+        for l in np.flatnonzero(np.diff(bounds)):
+            qi = qs_by_list[bounds[l]:bounds[l+1]] // nprobe
+            rows = self._list(l)
+            if allowed is not None:
+                rows = rows[allowed[rows]] if allowed.dtype == bool else rows[_in_sorted(allowed, rows)]
+            if rows.size == 0:
+                continue
+            S = Q[qi] @ _normalize(self.vectors[rows]).T
+            if exclude is not None:
+                S[exclude[qi][:, None] == rows[None, :]] = -np.inf
+            kk = min(k, rows.size)
+            part = np.argpartition(S, kth=S.shape[1]-kk, axis=1)[:, -kk:]
+            cand_v = np.concatenate([best_v[qi], np.take_along_axis(S, part, axis=1)], axis=1)
+            cand_i = np.concatenate([best_i[qi], rows[part]], axis=1)
+            top = np.argpartition(-cand_v, kth=k-1, axis=1)[:, :k]
+            best_v[qi] = np.take_along_axis(cand_v, top, axis=1)
+            best_i[qi] = np.take_along_axis(cand_i, top, axis=1)
+        order = np.argsort(-best_v, axis=1, kind="stable")
+        best_i = np.take_along_axis(best_i, order, axis=1)
+        best_v = np.take_along_axis(best_v, order, axis=1)
+        best_i[~np.isfinite(best_v)] = -1
+        return best_i, best_v
+
+class AnnIndex:
+    """
+    Persistent IVF index over one model's EmbCache store, saved next to it:
+      data/cache/emb/{model}/ann/centroids.npy  [nlist, d]
+      data/cache/emb/{model}/ann/assign.i32     list id per store row (append-only)
+      data/cache/emb/{model}/ann/meta.json      {"trained_on": n, "imbalance": x, "built_at": t}
+    Once an index exists, EmbCache.put_texts appends assignments for the rows it adds (sync).
+    The loaded IVF lists and the live-row mask are shared by all instances for a directory,
+    so a fresh AnnIndex per call (ann_knn) does not reload them; rows added since are appended
+    to the loaded lists (IVFIndex.extend). Centroids are retrained when the store has grown
+    _RETRAIN_GROWTH times or the lists have become _REBALANCE times more uneven than at training.
+    """
+    _shared: Dict[str, Dict[str, Any]] = {}
+    _guard = threading.Lock()
+
+    def __init__(self, model: str, cache: EmbCache | None = None):
+        self.model = model
+        self.cache = cache or EmbCache()
+        self.dir = self.cache.model_dir(model) / ANN_DIR
+        with AnnIndex._guard:
+            self._s = AnnIndex._shared.setdefault(str(self.dir), {
+                "ivf": None, "n": -1, "meta": None, "live": np.zeros(0, dtype=bool), "dead": 0,
+                "lock": threading.RLock()})
+
+    @staticmethod
+    def exists(model_dir: pathlib.Path) -> bool:
+        return (model_dir / ANN_DIR / "centroids.npy").exists()
+
+    def _store(self) -> _Store:
+        return self.cache.store(self.model)
+
+    def _meta(self) -> Dict[str, Any]:
+        return json.loads((self.dir / "meta.json").read_text())
+
+    def build(self, nlist: int | None = None) -> "AnnIndex":
+        """(Re)train centroids on the whole store and reassign every row."""
+        X = self._store().matrix()
+        n = X.shape[0]
+        if n == 0:
+            raise RuntimeError(f"no cached embeddings for {self.model}")
+        with file_lock(self.dir / "ann.lock"):
+            C = train_centroids(X, nlist or default_nlist(n))
+            a = _assign(X, C)
+            sizes = np.bincount(a, minlength=C.shape[0])
+            np.save(self.dir / "centroids.npy", C)
+            a.tofile(self.dir / "assign.i32")
+            (self.dir / "meta.json").write_text(json.dumps({
+                "trained_on": n, "imbalance": float(sizes.max() * sizes.size / n), "built_at": time.time()}))
+        self._s["ivf"] = None
+        return self
+
+    def sync(self) -> int:
+        """Assign store rows added since the last sync; retrain if the store outgrew the centroids."""
+        X = self._store().matrix()
+        if not AnnIndex.exists(self.dir.parent):
+            return 0
+        meta = self._meta()
+        if X.shape[0] > _RETRAIN_GROWTH * max(1, meta.get("trained_on", 0)):
+            self.build()
+            return X.shape[0]
+        with file_lock(self.dir / "ann.lock"):
+            p = self.dir / "assign.i32"
+            done = p.stat().st_size // 4 if p.exists() else 0
+            if done >= X.shape[0]:
+                return 0
+            C = np.load(self.dir / "centroids.npy")
+            a = _assign(X[done:], C)
+            with open(p, "ab") as f:
+                f.truncate(done * 4)
+                f.write(a.tobytes())
+        return int(a.size)
+
+    def _load(self) -> Tuple[IVFIndex, _Store]:
+        """
+        The shared IVF lists, brought up to the store's size: a full load (one sort of all
+        assignments) after a (re)build here or in another process, otherwise only the rows
+        added since the last call are read and appended.
+        """
+        st, s = self._store(), self._s
+        with s["lock"]:
+            if not AnnIndex.exists(self.dir.parent):
+                self.build()
+            elif s["n"] != len(st.keys):
+                self.sync()
+            if s["ivf"] is not None and s["n"] == len(st.keys):
+                return s["ivf"], st
+            X, meta = st.matrix(), self._meta()
+            if s["ivf"] is not None and meta == s["meta"] and s["n"] < X.shape[0]:
+                a = np.fromfile(self.dir / "assign.i32", dtype=np.int32, offset=s["n"] * 4, count=X.shape[0] - s["n"])
+                ivf = s["ivf"].extend(a, X[:s["n"] + a.size])
+                if ivf.imbalance() <= _REBALANCE * meta.get("imbalance", np.inf):
+                    s["ivf"], s["n"] = ivf, s["n"] + a.size
+                    return ivf, st
+                self.build()  # the new rows crowd a few lists: retrain on everything
+                X, meta = st.matrix(), self._meta()
+            C = np.load(self.dir / "centroids.npy")
+            a = np.fromfile(self.dir / "assign.i32", dtype=np.int32)[:X.shape[0]]
+            s["ivf"], s["n"], s["meta"] = IVFIndex(C, a, X), X.shape[0], meta
+            return s["ivf"], st
+
+    def _live(self, st: _Store, restrict: List[str] | None) -> np.ndarray:
+        """
+        search()'s `allowed`: with `restrict`, the sorted rows of those PMIDs; otherwise the
+        shared mask of rows still current for their key, updated incrementally (rows added
+        since the last call on, rows superseded since then off).
+        """
+        if restrict is not None:
+            rows = self.cache.rows(self.model, restrict)
+            return np.unique(rows[rows >= 0])
+        s = self._s
+        with s["lock"]:
+            d = len(st.superseded)  # read before keys: every superseded row is below len(keys)
+            m = len(st.keys)
+            live = s["live"]
+            if live.size < m:
+                live = s["live"] = np.concatenate([live, np.ones(m - live.size, dtype=bool)])
+            if d > s["dead"]:
+                live[st.superseded[s["dead"]:d]] = False
+                s["dead"] = d
+            return live
+
+    def _pmids_of(self, st: _Store, rows: np.ndarray, restrict: List[str] | None) -> List[List[str]]:
+        # a row is labelled with a PMID whose current text it embeds (among `restrict` if given)
+        if restrict is None:
+            pm = self.cache.pmid_map(self.model)
+            return [[p for p in pm.labels([st.keys[r] for r in rr if r >= 0]) if p is not None] for rr in rows.tolist()]
+        pmids = restrict
+        label: Dict[int, str] = {}
+        for p, r in zip(pmids, self.cache.rows(self.model, pmids)):
+            label.setdefault(int(r), p)
+        return [[label[r] for r in rr if r >= 0 and r in label] for rr in rows.tolist()]
+
+    def query(self, vecs: np.ndarray, k: int, nprobe: int = ANN_NPROBE,
+              restrict: Iterable[str] | None = None) -> Tuple[List[List[str]], np.ndarray]:
+        """Top-k cached PMIDs per query vector (optionally only among `restrict`), with cosine sims."""
+        ivf, st = self._load()
+        restrict = None if restrict is None else [str(p) for p in restrict]
+        rows, sims = ivf.search(vecs, k, nprobe=nprobe, allowed=self._live(st, restrict))
+        return self._pmids_of(st, rows, restrict), sims
+
+    def query_rows(self, pmids: Iterable[str], k: int, nprobe: int = ANN_NPROBE,
+                   restrict: Iterable[str] | None = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Neighbours of the cached vectors of `pmids` as store rows: (self rows [n], rows [n, k], sims [n, k]).
+        Each query's own row is excluded.
+        """
+        ivf, st = self._load()
+        restrict = None if restrict is None else [str(p) for p in restrict]
+        self_rows = self.cache.rows(self.model, pmids)
+        if (self_rows < 0).any():
+            raise KeyError(f"{int((self_rows < 0).sum())} PMIDs have no cached embedding")
+        rows, sims = ivf.search(st.read(self_rows), k, nprobe=nprobe,
+                                allowed=self._live(st, restrict), exclude=self_rows)
+        return self_rows, rows, sims
+
+    def query_ids(self, pmids: Iterable[str], k: int, nprobe: int = ANN_NPROBE,
+                  restrict: Iterable[str] | None = None) -> Tuple[List[List[str]], np.ndarray]:
+        """Like query(), using cached vectors of `pmids`; each PMID's own row is excluded."""
+        restrict = None if restrict is None else [str(p) for p in restrict]
+        _, rows, sims = self.query_rows(pmids, k, nprobe=nprobe, restrict=restrict)
+        return self._pmids_of(self._store(), rows, restrict), sims
+
+def ann_knn(pmids: List[str], vecs: np.ndarray, k: int, model: str,
+            nprobe: int = ANN_NPROBE, cache: EmbCache | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    kNN graph over `pmids` (all cached) via the persistent index, as positions into `pmids`.
+    Rows the probed lists could not fill are completed with an exact search.
+    """
+    pmids = [str(p) for p in pmids]
+    k = max(0, min(k, len(pmids) - 1))
+    self_rows, rows, sims = AnnIndex(model, cache).query_rows(pmids, k, nprobe=nprobe, restrict=pmids)
+    pos: Dict[int, int] = {}
+    for i, r in enumerate(self_rows.tolist()):
+        pos.setdefault(r, i)  # PMIDs sharing a text share a row
+    idx = np.array([[pos.get(r, -1) for r in rr] for rr in rows.tolist()], dtype=np.int64).reshape(len(pmids), k)
+    short = np.flatnonzero((idx < 0).any(axis=1))
+    if short.size:
+        ex_idx, ex_sims = knn_blocked(vecs[short], k=k + 1, Y=vecs)
+        for r, i in enumerate(short):
+            keep = ex_idx[r] != i
+            idx[i] = ex_idx[r][keep][:k]
+            sims[i] = ex_sims[r][keep][:k]
+    return idx, sims.astype("float32")
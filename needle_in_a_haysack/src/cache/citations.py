@@ -0,0 +1,143 @@
+# src/cache/citations.py
+from __future__ import annotations
+import pathlib, time
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cache.sqlite import pool
+from config import CACHE_DIR
+from clients.icite import extract_refs_and_citers
+
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+DB_PATH = CACHE_DIR / "citations.sqlite3"
+
+_DT = np.dtype("<u4")  # PMIDs fit in uint32
+
+def _pack(ids: Iterable[int]) -> bytes:
+    return np.asarray(list(ids), dtype=_DT).tobytes()
+
+def _unpack(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=_DT).astype(np.int64)
+
+class CitationStore:
+    """
+    Citation graph keyed by PMID: references and citers as packed uint32 BLOBs plus year,
+    so batch lookups return NumPy arrays without JSON parsing. PMIDs iCite had no record for
+    are kept apart in `absent` with the time they were asked, so they can be asked again later;
+    years looked up without links (a year-only screen) are kept in `years`.
+    """
+    def __init__(self, db_path: pathlib.Path = DB_PATH):
+        self._pool = pool(db_path)
+        self._pool.ensure("""
+            CREATE TABLE IF NOT EXISTS cites(
+                pmid INTEGER PRIMARY KEY,
+                year INTEGER,
+                refs BLOB NOT NULL,
+                citers BLOB NOT NULL
+            )
+        """)
+        self._pool.ensure("""
+            CREATE TABLE IF NOT EXISTS years(
+                pmid INTEGER PRIMARY KEY,
+                year INTEGER NOT NULL
+            )
+        """)
+        self._pool.ensure("""
+            CREATE TABLE IF NOT EXISTS absent(
+                pmid INTEGER PRIMARY KEY,
+                fetched_at REAL NOT NULL
+            )
+        """)
+
+    @staticmethod
+    def _keys(pmids: Iterable[Any]) -> List[int]:
+        return [int(p) for p in pmids]
+
+    def put_records(self, recs: Iterable[Dict[str,Any]]) -> int:
+        """Store iCite /pubs records (needs references + cited_by fields)."""
+        data = []
+        for rec in recs:
+            pmid = rec.get("pmid") or rec.get("_id")
+            if not pmid:
+                continue
+            refs, citers = extract_refs_and_citers(rec)
+            year = rec.get("year")
+            data.append((int(pmid), int(year) if year else None, _pack(refs), _pack(citers)))
+        return self._put(data)
+
+    def put_arrays(self, rows: Iterable[Tuple[int, Optional[int], Iterable[int], Iterable[int]]]) -> int:
+        """Store (pmid, year, refs, citers) tuples directly."""
+        return self._put([(int(p), int(y) if y else None, _pack(r), _pack(c)) for p, y, r, c in rows])
+
+    def put_packed(self, rows: Iterable[Tuple[int, Optional[int], bytes, bytes]]) -> int:
+        """Store (pmid, year, refs, citers) with refs/citers already packed as little-endian uint32 bytes."""
+        return self._put(list(rows))
+
+    def put_years(self, rows: Iterable[Tuple[Any, int]]) -> int:
+        """Store (pmid, year) pairs known without their links; they don't make a PMID present for has()."""
+        data = [(int(p), int(y)) for p, y in rows if y]
+        if not data: return 0
+        with self._pool.writer() as conn:
+            conn.executemany("INSERT OR REPLACE INTO years(pmid,year) VALUES(?,?)", data)
+        return len(data)
+
+    def mark_absent(self, pmids: Iterable[Any]) -> int:
+        """Record that iCite returned nothing for pmids (now)."""
+        now = time.time()
+        data = [(p, now) for p in dict.fromkeys(self._keys(pmids))]
+        if not data: return 0
+        with self._pool.writer() as conn:
+            conn.executemany("INSERT OR REPLACE INTO absent(pmid,fetched_at) VALUES(?,?)", data)
+        return len(data)
+
+    def _put(self, data: List[tuple]) -> int:
+        if not data: return 0
+        with self._pool.writer() as conn:
+            conn.executemany("INSERT OR REPLACE INTO cites(pmid,year,refs,citers) VALUES(?,?,?,?)", data)
+        return len(data)
+
+    def _rows(self, cols: str, pmids: List[int]) -> Dict[int, tuple]:
+        rows = self._pool.select_in(f"SELECT pmid, {cols} FROM cites WHERE pmid IN ({{qmarks}})",
+                                    list(dict.fromkeys(pmids)))
+        return {r[0]: r[1:] for r in rows}
+
+    def has(self, pmids: Iterable[Any], with_year: bool = False, absent_ttl_days: Optional[float] = None) -> set[str]:
+        """
+        Subset of pmids present in the store (as strings). With `with_year`, only rows with a year
+        count (year-less ones come from old iCite JSON and need a refetch), plus PMIDs marked
+        absent less than `absent_ttl_days` ago (None = absent markers never expire).
+        """
+        keys = self._keys(pmids)
+        if not with_year:
+            return {str(p) for p in self._rows("year", keys)}
+        out = {str(p) for p, (year,) in self._rows("year", keys).items() if year is not None}
+        min_ts = time.time() - absent_ttl_days * 86400 if absent_ttl_days else 0.0
+        rows = self._pool.select_in("SELECT pmid FROM absent WHERE fetched_at>=? AND pmid IN ({qmarks})",
+                                    list(dict.fromkeys(keys)), params=[min_ts])
+        return out | {str(r[0]) for r in rows}
+
+    def _arrays(self, col: str, pmids: Iterable[Any]) -> List[np.ndarray]:
+        keys = self._keys(pmids)
+        got = self._rows(col, keys)
+        empty = np.zeros(0, dtype=np.int64)
+        return [_unpack(got[k][0]) if k in got else empty for k in keys]
+
+    def refs_of(self, pmids: Iterable[Any]) -> List[np.ndarray]:
+        """Referenced PMIDs per input PMID (empty array when unknown), in input order."""
+        return self._arrays("refs", pmids)
+
+    def citers_of(self, pmids: Iterable[Any]) -> List[np.ndarray]:
+        """Citing PMIDs per input PMID (empty array when unknown), in input order."""
+        return self._arrays("citers", pmids)
+
+    def years_of(self, pmids: Iterable[Any]) -> Dict[str, Optional[int]]:
+        """Year per stored PMID: from its full record, else from a year-only lookup (put_years)."""
+        keys = self._keys(pmids)
+        out = {str(k): v[0] for k, v in self._rows("year", keys).items()}
+        rest = [k for k in dict.fromkeys(keys) if out.get(str(k)) is None]
+        if rest:
+            out.update({str(p): y for p, y in self._pool.select_in("SELECT pmid, year FROM years WHERE pmid IN ({qmarks})", rest)})
+        return out
+
+    def close(self):
+        pass
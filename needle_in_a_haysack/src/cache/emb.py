@@ -1,45 +1,307 @@
 # src/cache/emb.py
 from __future__ import annotations
-import pathlib, numpy as np
+import os, json, hashlib, pathlib, threading, numpy as np
 from typing import Dict, Iterable, List, Tuple
 
-ROOT = pathlib.Path(__file__).resolve().parents[2]
-BASE = ROOT / "data" / "cache" / "emb"
+from utils.filelock import file_lock
+from config import CACHE_DIR
+
+BASE = CACHE_DIR / "emb"
 BASE.mkdir(parents=True, exist_ok=True)
 
+VEC_FILE = "vectors.f32"
+KEY_FILE = "keys.txt"
+MAP_FILE = "pmids.tsv"
+META_FILE = "meta.json"
+LOCK_FILE = "store.lock"
+
+class _Store:
+    """
+    Append-only store for one model directory:
+      vectors.f32  contiguous float32 rows (memory-mapped for reads)
+      keys.txt     one key per line; line i <-> row i
+      meta.json    {"dim": d}
+    A key written twice resolves to its latest row.
+    """
+    def __init__(self, d: pathlib.Path):
+        self.dir = d
+        self.vec_path = d / VEC_FILE
+        self.key_path = d / KEY_FILE
+        self.lock_path = d / LOCK_FILE
+        self.dim = 0
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.superseded: List[int] = []  # rows replaced by a later write of their key, in refresh order
+        self._key_off = 0
+        self._mm: np.ndarray | None = None
+        self._lock = threading.RLock()
+        self._read_meta()
+
+    def _read_meta(self) -> None:
+        p = self.dir / META_FILE
+        if p.exists():
+            try:
+                self.dim = int(json.loads(p.read_text()).get("dim", 0))
+            except Exception:
+                self.dim = 0
+
+    def _n_vec_rows(self) -> int:
+        if not self.dim or not self.vec_path.exists():
+            return 0
+        return self.vec_path.stat().st_size // (4 * self.dim)
+
+    def refresh(self) -> None:
+        """Pick up rows appended by other writers since the last refresh."""
+        with self._lock:
+            if not self.dim:
+                self._read_meta()
+            if self.key_path.exists() and self.key_path.stat().st_size > self._key_off:
+                with open(self.key_path, "rb") as f:
+                    f.seek(self._key_off)
+                    chunk = f.read()
+                end = chunk.rfind(b"\n") + 1  # ignore a torn trailing line
+                n_rows = self._n_vec_rows()
+                used = 0
+                for line in chunk[:end].split(b"\n")[:-1]:
+                    if len(self.keys) >= n_rows:
+                        break
+                    key = line.decode()
+                    prev = self.index.get(key)
+                    if prev is not None:
+                        self.superseded.append(prev)
+                    self.index[key] = len(self.keys)
+                    self.keys.append(key)
+                    used += len(line) + 1
+                self._key_off += used
+            n = len(self.keys)
+            if n and (self._mm is None or self._mm.shape[0] != n):
+                self._mm = np.memmap(self.vec_path, dtype="float32", mode="r", shape=(n, self.dim))
+
+    def matrix(self) -> np.ndarray:
+        """All stored rows [n, dim] as a read-only memmap (empty while the store is)."""
+        with self._lock:
+            return self._mm if self._mm is not None else np.empty((0, self.dim), dtype="float32")
+
+    def read(self, rows: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if self._mm is None or rows.size == 0:
+                return np.empty((rows.size, self.dim), dtype="float32")
+            return np.asarray(self._mm[rows])
+
+    def append(self, keys: List[str], mat: np.ndarray) -> None:
+        mat = np.ascontiguousarray(mat, dtype="float32")
+        with self._lock, file_lock(self.lock_path):
+            self._read_meta()
+            if not self.dim:
+                self.dim = int(mat.shape[1])
+                (self.dir / META_FILE).write_text(json.dumps({"dim": self.dim}))
+            if mat.shape[1] != self.dim:
+                raise ValueError(f"dim mismatch: store has {self.dim}, got {mat.shape[1]}")
+            # catch up on other writers' rows (incremental), then cut anything past them that a
+            # crashed writer left half-written: a torn key line or vectors without keys
+            self.refresh()
+            n = len(self.keys)
+            with open(self.key_path, "ab") as kf:
+                kf.truncate(self._key_off)
+            with open(self.vec_path, "ab") as vf:
+                vf.truncate(n * 4 * self.dim)
+                vf.write(mat.tobytes())
+                vf.flush(); os.fsync(vf.fileno())
+            with open(self.key_path, "ab") as kf:
+                kf.write("".join(f"{k}\n" for k in keys).encode())
+                kf.flush(); os.fsync(kf.fileno())
+            self.refresh()
+
+def text_key(text: str) -> str:
+    """Content address of an embedding input: sha1 of the exact text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class _PmidMap:
+    """
+    Append-only `pmid<TAB>text_key` lines; the latest line per PMID wins.
+    Also keeps one current PMID per text key (labels()). Appends go through the owning
+    store's file lock.
+    """
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.key: Dict[str, str] = {}
+        self._pmid_of: Dict[str, str] = {}
+        self._orphans: set[str] = set()  # keys whose labelling PMID moved to another text
+        self._off = 0
+        self._lock = threading.RLock()
+
+    def refresh(self) -> None:
+        with self._lock:
+            if not self.path.exists() or self.path.stat().st_size <= self._off:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._off)
+                chunk = f.read()
+            end = chunk.rfind(b"\n") + 1  # ignore a torn trailing line
+            for line in chunk[:end].split(b"\n")[:-1]:
+                pmid, _, key = line.decode().partition("\t")
+                if key:
+                    old = self.key.get(pmid)
+                    if old is not None and old != key and self._pmid_of.get(old) == pmid:
+                        del self._pmid_of[old]
+                        self._orphans.add(old)
+                    self.key[pmid] = key
+                    self._pmid_of.setdefault(key, pmid)
+            self._off += end
+
+    def labels(self, keys: List[str]) -> List[str | None]:
+        """A PMID currently mapped to each text key (None if none is)."""
+        with self._lock:
+            if self._orphans and not self._orphans.isdisjoint(keys):
+                for p, k in self.key.items():  # one pass relabels every orphaned key
+                    if k in self._orphans:
+                        self._pmid_of.setdefault(k, p)
+                self._orphans.clear()
+            return [self._pmid_of.get(k) for k in keys]
+
+    def append(self, pairs: List[Tuple[str, str]]) -> None:
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.truncate(self._off)  # caller holds the store lock and has just refreshed
+                f.write("".join(f"{p}\t{k}\n" for p, k in pairs).encode())
+                f.flush(); os.fsync(f.fileno())
+            self.refresh()
+
 class EmbCache:
     """
-    Very simple file cache:
-      data/cache/emb/{model}/{id}.npy  (float32 vector)
+    Per-model append-only, content-addressed embedding store:
+      data/cache/emb/{model}/vectors.f32  (float32 matrix, memory-mapped)
+      data/cache/emb/{model}/keys.txt     (row -> text_key, sha1 of the embedded text)
+      data/cache/emb/{model}/pmids.tsv    (PMID -> text_key of its current text)
+    Identical texts share one row; a PMID whose text changed maps to a new row.
+    Rows keyed by PMID (older stores, legacy `{id}.npy` files, imported on first use) stay
+    readable by PMID via get_many until that PMID is re-embedded from its current text.
+    If an ANN index exists for the model (cache/ann.py), new rows are kept in sync.
     """
+    _stores: Dict[str, _Store] = {}
+    _maps: Dict[str, _PmidMap] = {}
+    _guard = threading.Lock()
+
     def __init__(self, base: pathlib.Path = BASE):
         self.base = base
 
-    def _model_dir(self, model: str) -> pathlib.Path:
+    def model_dir(self, model: str) -> pathlib.Path:
+        """The model's store directory (created on first use)."""
         d = self.base / model.replace("/", "_")
         d.mkdir(parents=True, exist_ok=True)
         return d
 
-    def get_many(self, model: str, ids: Iterable[str]) -> Dict[str, np.ndarray]:
-        d = self._model_dir(model)
-        out: Dict[str, np.ndarray] = {}
-        for pid in ids:
-            p = d / f"{str(pid)}.npy"
-            if p.exists():
-                try:
-                    out[str(pid)] = np.load(p)
-                except Exception:
-                    pass
-        return out
-
-    def put_many(self, model: str, rows: List[Tuple[str, np.ndarray]]) -> int:
-        d = self._model_dir(model)
-        n = 0
-        for pid, vec in rows:
-            p = d / f"{str(pid)}.npy"
+    def store(self, model: str) -> _Store:
+        """The model's vector store, shared per process and refreshed from disk."""
+        d = self.model_dir(model)
+        with EmbCache._guard:
+            st = EmbCache._stores.get(str(d))
+            fresh = st is None
+            if fresh:
+                st = EmbCache._stores[str(d)] = _Store(d)
+        st.refresh()
+        if fresh:
+            self._migrate(st, remove=False)
+        return st
+
+    def pmid_map(self, model: str) -> _PmidMap:
+        """The model's PMID -> text_key map, shared per process and refreshed from disk."""
+        d = self.model_dir(model)
+        with EmbCache._guard:
+            pm = EmbCache._maps.get(str(d))
+            if pm is None:
+                pm = EmbCache._maps[str(d)] = _PmidMap(d / MAP_FILE)
+        pm.refresh()
+        return pm
+
+    def rows(self, model: str, pmids: Iterable[str]) -> np.ndarray:
+        """Store row of each PMID's current vector (-1 if none); unmapped PMIDs fall back to PMID keys."""
+        st, pm = self.store(model), self.pmid_map(model)
+        return np.array([st.index.get(pm.key.get(p, p), -1) for p in (str(x) for x in pmids)], dtype=np.int64)
+
+    def _migrate(self, st: _Store, remove: bool) -> int:
+        legacy = sorted(st.dir.glob("*.npy"))
+        todo = [p for p in legacy if p.stem not in st.index]
+        keys, vecs = [], []
+        for p in todo:
             try:
-                np.save(p, vec.astype("float32"))
-                n += 1
+                vecs.append(np.load(p).astype("float32").ravel())
+                keys.append(p.stem)
             except Exception:
                 pass
-        return n
+        if keys:
+            st.append(keys, np.vstack(vecs))
+        if remove:
+            for p in legacy:
+                if p.stem in st.index:
+                    p.unlink(missing_ok=True)
+        return len(keys)
+
+    def migrate_legacy(self, model: str, remove: bool = False) -> int:
+        """Import `{id}.npy` files into the store; optionally delete them afterwards."""
+        return self._migrate(self.store(model), remove=remove)
+
+    def matrix(self, model: str) -> np.ndarray:
+        """Every stored row of the model's store [n, d], memory-mapped (rows, not PMIDs)."""
+        return self.store(model).matrix()
+
+    def dim(self, model: str) -> int:
+        return self.store(model).dim
+
+    def _read(self, st: _Store, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        hit = rows >= 0
+        out = np.zeros((rows.size, st.dim), dtype="float32")
+        if hit.any():
+            out[hit] = st.read(rows[hit])
+        return out, hit
+
+    def get_many(self, model: str, ids: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Current vector per PMID: returns (vecs [n, d], hit [n]) in request order; rows for
+        misses are zero. d is 0 while the store is empty.
+        """
+        return self._read(self.store(model), self.rows(model, ids))
+
+    def get_texts(self, model: str, pmids: List[str], texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Look up vectors by text content. Returns (vecs [n, d], hit [n], stale [n]); `stale`
+        marks PMIDs whose cached vector was computed from a different text. A PMID-keyed
+        legacy row counts as stale: the text it embedded is unknown, so it is never served
+        for (or stored under) a text key and the PMID gets re-embedded.
+        """
+        st, pm = self.store(model), self.pmid_map(model)
+        pmids = [str(p) for p in pmids]
+        keys = [text_key(t) for t in texts]
+        rows = np.array([st.index.get(k, -1) for k in keys], dtype=np.int64)
+        stale = np.array([pm.key[p] != k if p in pm.key else p in st.index for p, k in zip(pmids, keys)], dtype=bool)
+        vecs, hit = self._read(st, rows)
+        # texts already stored under another PMID (duplicates, errata) just need a mapping
+        remap = [(p, k) for p, k, h in zip(pmids, keys, hit) if h and pm.key.get(p) != k]
+        if remap:
+            self._append(model, [], None, list(dict(remap).items()))
+        return vecs, hit, stale
+
+    def put_texts(self, model: str, pmids: List[str], texts: List[str], vecs: np.ndarray) -> int:
+        """Store vectors under their text keys (each distinct text once) and map PMIDs to them."""
+        if not pmids:
+            return 0
+        keys = [text_key(t) for t in texts]
+        st = self.store(model)
+        first = {k: i for i, k in reversed(list(enumerate(keys))) if k not in st.index}
+        new = sorted(first.values())
+        mat = np.asarray(vecs, dtype="float32")[new] if new else None
+        self._append(model, [keys[i] for i in new], mat, list(dict(zip((str(p) for p in pmids), keys)).items()))
+        return len(new)
+
+    def _append(self, model: str, keys: List[str], mat: np.ndarray | None, pairs: List[Tuple[str, str]]) -> None:
+        st, pm = self.store(model), self.pmid_map(model)
+        if keys:
+            st.append(keys, mat)
+        if pairs:
+            with file_lock(st.lock_path):
+                pm.refresh()
+                pm.append(pairs)
+        if keys:
+            from cache.ann import AnnIndex  # local import: cache.ann depends on this module
+            if AnnIndex.exists(self.model_dir(model)):
+                AnnIndex(model, self).sync()
@@ -0,0 +1,46 @@
+# src/cache/labels.py
+from __future__ import annotations
+import pathlib, hashlib, time
+from typing import Iterable, Dict, Sequence, Tuple
+
+from cache.sqlite import pool
+from config import CACHE_DIR
+
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+DB_PATH = CACHE_DIR / "llm_labels.sqlite3"
+
+def label_key(model: str, system: str, template: str, titles: Sequence[str]) -> str:
+    """Cache key: model + prompt (system and user template) + the member titles, order-insensitive."""
+    h = hashlib.sha1()
+    for part in (model, system, template, *sorted(titles)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+class LabelCache:
+    """Cache for LLM theme labels (raw completion text) keyed by label_key()."""
+    def __init__(self, db_path: pathlib.Path = DB_PATH):
+        self._pool = pool(db_path)
+        self._pool.ensure("""
+            CREATE TABLE IF NOT EXISTS labels(
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                text TEXT NOT NULL
+            )
+        """)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(dict.fromkeys(keys))
+        if not keys: return {}
+        rows = self._pool.select_in("SELECT key, text FROM labels WHERE key IN ({qmarks})", keys)
+        return {k: t for k, t in rows}
+
+    def put_many(self, rows: Iterable[Tuple[str, str, str]]) -> int:
+        """rows: (key, model, text)."""
+        now = time.time()
+        data = [(k, m, now, t) for k, m, t in rows]
+        if not data: return 0
+        with self._pool.writer() as conn:
+            conn.executemany("INSERT OR REPLACE INTO labels(key,model,created_at,text) VALUES(?,?,?,?)", data)
+        return len(data)
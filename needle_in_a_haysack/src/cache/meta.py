@@ -0,0 +1,72 @@
+# src/cache/meta.py
+from __future__ import annotations
+import pathlib, json, time
+from typing import Iterable, Dict, Any, Optional, Tuple
+
+from cache.sqlite import pool
+from config import CACHE_DIR
+
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+DB_PATH = CACHE_DIR / "pubmed_meta.sqlite3"
+
+class MetaCache:
+    """Cache for PubMed efetch records (title, abstract, year, pub_types, doi, journal) keyed by PMID."""
+    def __init__(self, db_path: pathlib.Path = DB_PATH):
+        self._pool = pool(db_path)
+        self._pool.ensure("""
+            CREATE TABLE IF NOT EXISTS meta(
+                pmid TEXT PRIMARY KEY,
+                fetched_at REAL NOT NULL,
+                json TEXT NOT NULL
+            )
+        """)
+
+    def get_many(self, pmids: Iterable[str], ttl_days: Optional[float] = None) -> Dict[str, Dict[str,Any]]:
+        """Cached records for pmids; entries older than ttl_days (if given) count as misses."""
+        pmids = list(dict.fromkeys(str(p) for p in pmids))
+        out: Dict[str, Dict[str,Any]] = {}
+        if not pmids: return out
+        min_ts = time.time() - ttl_days * 86400 if ttl_days else 0.0
+        rows = self._pool.select_in(
+            "SELECT pmid, json FROM meta WHERE fetched_at>=? AND pmid IN ({qmarks})",
+            pmids, params=[min_ts]
+        )
+        for pmid, blob in rows:
+            try:
+                out[pmid] = json.loads(blob)
+            except Exception:
+                pass
+        return out
+
+    def put_many(self, rows: Iterable[Dict[str,Any]]) -> int:
+        now = time.time()
+        data = []
+        for rec in rows:
+            pmid = str(rec.get("pmid") or "")
+            if not pmid:
+                continue
+            data.append((pmid, now, json.dumps(rec)))
+        if not data: return 0
+        with self._pool.writer() as conn:
+            conn.executemany("INSERT OR REPLACE INTO meta(pmid,fetched_at,json) VALUES(?,?,?)", data)
+        return len(data)
+
+    def put_json(self, rows: Iterable[Tuple[str, str]]) -> int:
+        """Store already-serialized records: (pmid, json text) pairs (bulk import)."""
+        now = time.time()
+        data = [(str(p), now, j) for p, j in rows]
+        if not data: return 0
+        with self._pool.writer() as conn:
+            conn.executemany("INSERT OR REPLACE INTO meta(pmid,fetched_at,json) VALUES(?,?,?)", data)
+        return len(data)
+
+    def delete_many(self, pmids: Iterable[str]) -> int:
+        keys = [(str(p),) for p in dict.fromkeys(pmids)]
+        if not keys: return 0
+        with self._pool.writer() as conn:
+            conn.executemany("DELETE FROM meta WHERE pmid=?", keys)
+        return len(keys)
+
+    def close(self):
+        # connections belong to the shared pool and live for the whole process
+        pass
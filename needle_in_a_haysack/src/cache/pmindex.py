@@ -0,0 +1,130 @@
+# src/cache/pmindex.py
+from __future__ import annotations
+import pathlib, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from cache.sqlite import pool
+from config import CACHE_DIR
+
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+DB_PATH = CACHE_DIR / "pmid_index.sqlite3"
+
+# source bits in pmids.sources
+PUBMED, ICITE = 1, 2
+KINDS = {"pubmed": PUBMED, "icite": ICITE}
+
+class PmidIndex:
+    """
+    PMID index and ledger of bulk imports (PubMed baseline/update XML, iCite snapshots):
+      pmids(pmid, year, sources)  - every PMID seen in a bulk file, sources = PUBMED | ICITE bits
+      imports(source, ...)        - per file: size/mtime, rows written so far (the resume
+                                    checkpoint), PMID range, done flag
+    A PMID inside the range of a finished import of some kind is resolved for that kind:
+    if the matching cache has no record, the bulk file had none either, so it is not fetched.
+    DeleteCitation entries of update files take the PMID's bit off again (remove).
+    """
+    def __init__(self, db_path: pathlib.Path = DB_PATH):
+        self._pool = pool(db_path)
+        self._pool.ensure("""
+            CREATE TABLE IF NOT EXISTS pmids(
+                pmid INTEGER PRIMARY KEY,
+                year INTEGER,
+                sources INTEGER NOT NULL
+            )
+        """)
+        self._pool.ensure("""
+            CREATE TABLE IF NOT EXISTS imports(
+                source TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                rows_done INTEGER NOT NULL,
+                min_pmid INTEGER,
+                max_pmid INTEGER,
+                done INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    # --- PMID index -------------------------------------------------------------------
+    def add(self, rows: Iterable[Tuple[int, Optional[int]]], kind: str) -> int:
+        """Record (pmid, year) pairs as seen in a `kind` bulk file; a known year is kept."""
+        with self._pool.writer() as conn:
+            return self._add(conn, rows, kind)
+
+    def remove(self, pmids: Iterable[Any], kind: str) -> int:
+        """Take `kind` off pmids (deleted records); PMIDs left with no source leave the index."""
+        with self._pool.writer() as conn:
+            return self._remove(conn, pmids, kind)
+
+    @staticmethod
+    def _add(conn, rows: Iterable[Tuple[int, Optional[int]]], kind: str) -> int:
+        bit = KINDS[kind]
+        data = [(int(p), int(y) if y else None, bit) for p, y in rows]
+        if data:
+            conn.executemany("INSERT INTO pmids(pmid,year,sources) VALUES(?,?,?) ON CONFLICT(pmid) DO UPDATE SET "
+                             "sources = sources | excluded.sources, year = COALESCE(pmids.year, excluded.year)", data)
+        return len(data)
+
+    @staticmethod
+    def _remove(conn, pmids: Iterable[Any], kind: str) -> int:
+        keys = [(int(p),) for p in dict.fromkeys(str(x) for x in pmids) if p.isdigit()]
+        if keys:
+            conn.executemany(f"UPDATE pmids SET sources = sources & ~{KINDS[kind]} WHERE pmid=?", keys)
+            conn.executemany("DELETE FROM pmids WHERE pmid=? AND sources=0", keys)
+        return len(keys)
+
+    def years_of(self, pmids: Iterable[Any]) -> Dict[str, Optional[int]]:
+        rows = self._pool.select_in("SELECT pmid, year FROM pmids WHERE pmid IN ({qmarks})",
+                                    list(dict.fromkeys(int(p) for p in pmids)))
+        return {str(p): y for p, y in rows}
+
+    def count(self, kind: Optional[str] = None) -> int:
+        if kind is None:
+            return int(self._pool.reader().execute("SELECT COUNT(*) FROM pmids").fetchone()[0])
+        return int(self._pool.reader().execute("SELECT COUNT(*) FROM pmids WHERE sources & ?", (KINDS[kind],)).fetchone()[0])
+
+    # --- import ledger ------------------------------------------------------------------
+    def status(self, source: str, size: int, mtime: float) -> Optional[Dict[str, Any]]:
+        """Ledger row of `source` if it describes the same file (size and mtime), else None."""
+        row = self._pool.reader().execute(
+            "SELECT kind, rows_done, min_pmid, max_pmid, done FROM imports WHERE source=? AND size=? AND mtime=?",
+            (source, int(size), float(mtime))).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("kind", "rows_done", "min_pmid", "max_pmid", "done"), row))
+
+    def checkpoint(self, source: str, kind: str, size: int, mtime: float, rows_done: int,
+                   min_pmid: Optional[int], max_pmid: Optional[int], done: bool = False,
+                   added: Iterable[Tuple[int, Optional[int]]] = (), removed: Iterable[Any] = ()) -> None:
+        """
+        Ledger row of `source`, written in one transaction with the index changes of the rows
+        it covers: `added` (pmid, year) pairs, then `removed` PMIDs (DeleteCitation), so a
+        resumed import never finds one applied without the other.
+        """
+        with self._pool.writer() as conn:
+            self._add(conn, added, kind)
+            self._remove(conn, removed, kind)
+            conn.execute("INSERT OR REPLACE INTO imports(source,kind,size,mtime,rows_done,min_pmid,max_pmid,done,updated_at) "
+                         "VALUES(?,?,?,?,?,?,?,?,?)",
+                         (source, kind, int(size), float(mtime), int(rows_done), min_pmid, max_pmid, int(done), time.time()))
+
+    def imports(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        cols = ("source", "kind", "rows_done", "min_pmid", "max_pmid", "done", "updated_at")
+        sql = f"SELECT {', '.join(cols)} FROM imports" + (" WHERE kind=?" if kind else "") + " ORDER BY source"
+        return [dict(zip(cols, r)) for r in self._pool.reader().execute(sql, (kind,) if kind else ())]
+
+    def uncovered(self, kind: str, pmids: List[str]) -> List[str]:
+        """The pmids outside every finished `kind` import's PMID range (input order kept)."""
+        ranges = self._pool.reader().execute(
+            "SELECT min_pmid, max_pmid FROM imports WHERE kind=? AND done=1 AND min_pmid IS NOT NULL ORDER BY min_pmid",
+            (kind,)).fetchall()
+        if not ranges or not pmids:
+            return pmids
+        lo = np.array([r[0] for r in ranges], dtype=np.int64)
+        hi = np.maximum.accumulate(np.array([r[1] for r in ranges], dtype=np.int64))
+        ids = np.array([int(p) if p.isdigit() else -1 for p in pmids], dtype=np.int64)
+        j = np.searchsorted(lo, ids, side="right") - 1  # last range starting at or below each id
+        inside = (j >= 0) & (ids <= hi[np.maximum(j, 0)])
+        return [p for p, c in zip(pmids, inside.tolist()) if not c]
@@ -0,0 +1,91 @@
+# src/cache/sqlite.py
+from __future__ import annotations
+import sqlite3, pathlib, threading, contextlib
+from typing import Dict, Iterator, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# stay well under SQLITE_MAX_VARIABLE_NUMBER (999 on older builds)
+MAX_VARS = 900
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",      # 64 MiB page cache
+    "PRAGMA mmap_size=268435456",    # 256 MiB
+    "PRAGMA busy_timeout=30000",
+)
+
+def chunks(seq: Sequence[T], n: int = MAX_VARS) -> Iterator[Sequence[T]]:
+    for i in range(0, len(seq), n):
+        yield seq[i:i+n]
+
+class SQLitePool:
+    """
+    Per-process access to one SQLite file in WAL mode:
+      - reader(): a thread-local connection, so readers run concurrently
+      - writer(): the single shared write connection, serialized by a lock;
+        the block runs as one transaction (commit on exit, rollback on error)
+    """
+    def __init__(self, path: pathlib.Path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._wlock = threading.Lock()
+        self._wconn = self._connect()
+        self._ddl: set[str] = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        for p in PRAGMAS:
+            conn.execute(p)
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @contextlib.contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        with self._wlock:
+            self._wconn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._wconn
+            except BaseException:
+                self._wconn.execute("ROLLBACK")
+                raise
+            self._wconn.execute("COMMIT")
+
+    def ensure(self, ddl: str) -> None:
+        """Run a CREATE ... IF NOT EXISTS statement once per process."""
+        if ddl in self._ddl:
+            return
+        with self.writer() as conn:
+            conn.execute(ddl)
+        self._ddl.add(ddl)
+
+    def select_in(self, sql: str, keys: List[str], params: Sequence = ()) -> List[tuple]:
+        """
+        Run `sql` (which must contain one `IN ({qmarks})`) over keys in chunks of MAX_VARS,
+        with `params` bound before the keys; returns all rows.
+        """
+        conn = self.reader()
+        rows: List[tuple] = []
+        for part in chunks(keys, MAX_VARS - len(params)):
+            q = sql.format(qmarks=",".join("?" * len(part)))
+            rows.extend(conn.execute(q, [*params, *part]).fetchall())
+        return rows
+
+_POOLS: Dict[str, SQLitePool] = {}
+_GUARD = threading.Lock()
+
+def pool(path: pathlib.Path) -> SQLitePool:
+    """The shared pool for `path` in this process."""
+    key = str(pathlib.Path(path).resolve())
+    with _GUARD:
+        p = _POOLS.get(key)
+        if p is None:
+            p = _POOLS[key] = SQLitePool(pathlib.Path(key))
+        return p
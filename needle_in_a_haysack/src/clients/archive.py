@@ -0,0 +1,124 @@
+# src/clients/archive.py
+from __future__ import annotations
+import gzip, hashlib, io, json, pathlib, time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import requests
+from requests.structures import CaseInsensitiveDict
+from urllib3.response import HTTPResponse
+
+from cache.sqlite import pool
+
+# credentials / contact details: never part of the key, never stored
+VOLATILE_PARAMS = {"api_key", "email", "tool"}
+# the stored body is already decoded, so these would describe the wrong bytes
+DROP_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection", "keep-alive", "set-cookie"}
+
+class ReplayMiss(requests.ConnectionError):
+    """Replay mode got a request that is not in the archive (there is no network to fall back on)."""
+
+def request_key(method: str, url: str, params: Any = None, data: Any = None, json_body: Any = None) -> str:
+    """
+    Archive key of a request: method, URL path, query (URL + `params`, sorted, VOLATILE_PARAMS
+    dropped) and body (JSON canonicalised). Scheme and host are left out, so an archive recorded
+    against one server replays for the same API at any other base URL.
+    """
+    u = urlsplit(url)
+    items = parse_qsl(u.query, keep_blank_values=True)
+    if params:
+        items += list(params.items()) if isinstance(params, dict) else list(params)
+    query = urlencode(sorted((str(k), str(v)) for k, v in items if k not in VOLATILE_PARAMS and v is not None))
+    if json_body is not None:
+        body = json.dumps(json_body, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    elif isinstance(data, dict):
+        body = urlencode(sorted((str(k), str(v)) for k, v in data.items())).encode("utf-8")
+    elif isinstance(data, str):
+        body = data.encode("utf-8")
+    else:
+        body = data or b""
+    h = hashlib.sha1()
+    for part in (method.upper().encode(), u.path.encode("utf-8"), query.encode("utf-8"), body):
+        h.update(part)
+        h.update(b"\x00")
+    return h.hexdigest()
+
+def make_response(method: str, url: str, status: int, headers: Dict[str, str], body: bytes) -> requests.Response:
+    """
+    A requests.Response over in-memory bytes that behaves like a live one: .content / .json()
+    read the body, and `stream=True` callers can read r.raw incrementally.
+    """
+    r = requests.Response()
+    r.status_code = status
+    r.url = url
+    r.reason = "OK" if status < 400 else "Error"
+    r.headers = CaseInsensitiveDict(headers)
+    r.headers["Content-Length"] = str(len(body))
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r.raw = HTTPResponse(body=io.BytesIO(body), headers=dict(r.headers), status=status,
+                         preload_content=False, decode_content=False)
+    r.request = requests.Request(method, url).prepare()
+    return r
+
+class HttpArchive:
+    """
+    Recorded HTTP exchanges in one SQLite file: key -> (method, url, status, headers, gzipped body,
+    elapsed). Bodies are stored decoded (after transfer/content encoding), so a replayed response
+    needs no decompression by the caller.
+    """
+    def __init__(self, db_path: pathlib.Path):
+        pathlib.Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = pathlib.Path(db_path)
+        self._pool = pool(db_path)
+        self._pool.ensure("""
+            CREATE TABLE IF NOT EXISTS exchanges(
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                elapsed REAL NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, key: str) -> Optional[Tuple[str, str, int, Dict[str, str], bytes, float]]:
+        row = self._pool.reader().execute(
+            "SELECT method, url, status, headers, body, elapsed FROM exchanges WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+        method, url, status, headers, body, elapsed = row
+        return method, url, status, json.loads(headers), gzip.decompress(body), elapsed
+
+    def put(self, key: str, method: str, url: str, status: int, headers: Dict[str, str], body: bytes, elapsed: float) -> None:
+        keep = {k: v for k, v in headers.items() if k.lower() not in DROP_HEADERS}
+        with self._pool.writer() as conn:
+            conn.execute("INSERT OR REPLACE INTO exchanges(key,method,url,status,headers,body,elapsed,recorded_at) "
+                         "VALUES(?,?,?,?,?,?,?,?)",
+                         (key, method.upper(), url, status, json.dumps(keep), gzip.compress(body, 6), elapsed, time.time()))
+
+    def record(self, method: str, url: str, kw: Dict[str, Any], r: requests.Response) -> requests.Response:
+        """
+        Store a live response and return one the caller can still consume: the body is read in
+        full here, so for `stream=True` the caller gets an in-memory copy instead of the drained socket.
+        """
+        body = r.content
+        key = request_key(method, url, kw.get("params"), kw.get("data"), kw.get("json"))
+        self.put(key, method, r.url or url, r.status_code, dict(r.headers), body, r.elapsed.total_seconds())
+        if not kw.get("stream"):
+            return r
+        r.close()
+        return make_response(method, r.url or url, r.status_code, {k: v for k, v in r.headers.items()
+                                                                   if k.lower() not in DROP_HEADERS}, body)
+
+    def replay(self, method: str, url: str, kw: Dict[str, Any]) -> Tuple[requests.Response, float]:
+        """(response, recorded elapsed seconds) for a request; ReplayMiss if it was never recorded."""
+        key = request_key(method, url, kw.get("params"), kw.get("data"), kw.get("json"))
+        hit = self.get(key)
+        if hit is None:
+            raise ReplayMiss(f"no recorded response for {method.upper()} {url} (key {key[:12]}) in {self.path}")
+        _, rec_url, status, headers, body, elapsed = hit
+        return make_response(method, rec_url, status, headers, body), elapsed
+
+    def count(self) -> int:
+        return int(self._pool.reader().execute("SELECT COUNT(*) FROM exchanges").fetchone()[0])
@@ -1,81 +1,181 @@
 from __future__ import annotations
+import re, datetime as dt
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, List, Any, Iterable, Iterator, Optional, Tuple, Union
 import requests
-from typing import Dict, List, Any, Iterable, Optional
-from urllib.parse import urlencode
+import urllib3
 
 # ⬇⬇⬇ change to absolute import (because 'src/' is on sys.path)
-from config import ENTREZ_EMAIL, ENTREZ_API_KEY, HTTP_TIMEOUT, USER_AGENT
+from config import ENTREZ_BASE, ENTREZ_EMAIL, ENTREZ_API_KEY, ENTREZ_RATE, ENTREZ_WORKERS, USER_AGENT
+from clients.http import RateLimiter, session, request
+from utils import trace
 
-EUTILS = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+EUTILS = ENTREZ_BASE.rstrip("/")
 HEADERS = {"User-Agent": USER_AGENT, "Accept": "application/json"}
+ESEARCH_WINDOW = 9999  # PubMed refuses retstart beyond this; larger sets are split by date
 
-def esearch(query: str, db: str = "pubmed", retmax: int = 10000, mindate: Optional[int]=None, maxdate: Optional[int]=None, sort: str="date") -> List[str]:
-    params = {
-        "db": db,
-        "term": query,
-        "retmode": "json",
-        "retmax": retmax,
-        "sort": sort,
-        "email": ENTREZ_EMAIL
-    }
+_LIMITER = RateLimiter(ENTREZ_RATE)
+
+def _get(endpoint: str, params: Dict[str, Any], headers: Dict[str, str] = HEADERS, **kw):
+    params = dict(params, email=ENTREZ_EMAIL)
     if ENTREZ_API_KEY:
         params["api_key"] = ENTREZ_API_KEY
+    return request(session("entrez"), "GET", f"{EUTILS}/{endpoint}", limiter=_LIMITER,
+                   headers=headers, params=params, **kw)
+
+def _esearch_page(params: Dict[str, Any], retstart: int, retmax: int) -> Tuple[int, List[str], Dict[str, Any]]:
+    r = _get("esearch.fcgi", dict(params, retstart=retstart, retmax=retmax))
+    res = r.json().get("esearchresult", {})
+    hist = {"WebEnv": res.get("webenv"), "query_key": res.get("querykey")}
+    return int(res.get("count", 0)), res.get("idlist", []), hist
+
+def _esearch_window(params: Dict[str, Any], limit: int) -> Tuple[int, List[str]]:
+    """Page through one result set on the history server; returns (total count, <= ESEARCH_WINDOW ids)."""
+    count, ids, hist = _esearch_page(dict(params, usehistory="y"), 0, min(limit, ESEARCH_WINDOW))
+    want = min(count, limit, ESEARCH_WINDOW)
+    if hist["WebEnv"] and hist["query_key"]:
+        params = dict(params, WebEnv=hist["WebEnv"], query_key=hist["query_key"])
+    while len(ids) < want:
+        _, more, _ = _esearch_page(params, len(ids), want - len(ids))
+        if not more:
+            break
+        ids.extend(more)
+    return count, ids[:want]
+
+def _count(params: Dict[str, Any]) -> int:
+    r = _get("esearch.fcgi", dict(params, rettype="count"))
+    return int(r.json().get("esearchresult", {}).get("count", 0))
+
+def _esearch_sliced(params: Dict[str, Any], lo: dt.date, hi: dt.date, limit: int) -> List[str]:
+    """Recursively halve the publication-date range until each slice fits the esearch window."""
+    p = dict(params, datetype="pdat", mindate=lo.strftime("%Y/%m/%d"), maxdate=hi.strftime("%Y/%m/%d"))
+    n = _count(p)
+    if n <= ESEARCH_WINDOW or lo >= hi:
+        return _esearch_window(p, limit)[1] if n else []
+    mid = lo + (hi - lo) // 2
+    # newest slice first, so sort="date" order survives the split
+    out = _esearch_sliced(params, mid + dt.timedelta(days=1), hi, limit)
+    if len(out) < limit:
+        out += _esearch_sliced(params, lo, mid, limit - len(out))
+    return out
+
+@trace.traced("entrez.esearch")
+def esearch(query: str, db: str = "pubmed", retmax: Optional[int] = 10000, mindate: Optional[int]=None, maxdate: Optional[int]=None, sort: str="date") -> List[str]:
+    """
+    PMIDs for `query`, up to `retmax` (None = all). Uses usehistory/WebEnv paging and splits
+    the date range automatically when the result set exceeds what esearch can page through;
+    when more than one window is wanted, a count-only probe decides that before any IDs are fetched.
+    """
+    params = {"db": db, "term": query, "retmode": "json", "sort": sort}
+    limit = retmax if retmax is not None else float("inf")
     if mindate:
         params["mindate"] = str(mindate)
     if maxdate:
         params["maxdate"] = str(maxdate)
-    r = requests.get(f"{EUTILS}/esearch.fcgi", headers=HEADERS, params=params, timeout=HTTP_TIMEOUT)
-    r.raise_for_status()
-    return r.json().get("esearchresult", {}).get("idlist", [])
+    if limit <= ESEARCH_WINDOW or _count(params) <= ESEARCH_WINDOW:
+        return _esearch_window(params, int(min(limit, ESEARCH_WINDOW)))[1]
+    lo = dt.date(int(mindate), 1, 1) if mindate else dt.date(1800, 1, 1)
+    hi = dt.date(int(maxdate), 12, 31) if maxdate else dt.date.today()
+    base = {k: v for k, v in params.items() if k not in ("mindate", "maxdate")}
+    ids = _esearch_sliced(base, lo, hi, limit)
+    return list(dict.fromkeys(ids))
 
 def esummary(pmids: Iterable[str]) -> Dict[str, Dict[str,Any]]:
     pmids = list(pmids)
     out: Dict[str,Dict[str,Any]] = {}
-    for i in range(0, len(pmids), 500):
-        chunk = pmids[i:i+500]
-        params = {
-            "db":"pubmed", "retmode":"json", "id": ",".join(chunk),
-            "email": ENTREZ_EMAIL
-        }
-        if ENTREZ_API_KEY: params["api_key"] = ENTREZ_API_KEY
-        r = requests.get(f"{EUTILS}/esummary.fcgi", headers=HEADERS, params=params, timeout=HTTP_TIMEOUT)
-        r.raise_for_status()
-        data = r.json().get("result", {})
-        for k,v in data.items():
-            if k == "uids": continue
-            out[k] = v
+    chunks = [pmids[i:i+500] for i in range(0, len(pmids), 500)]
+    def one(chunk: List[str]) -> Dict[str, Any]:
+        r = _get("esummary.fcgi", {"db":"pubmed", "retmode":"json", "id": ",".join(chunk)})
+        return r.json().get("result", {})
+    with ThreadPoolExecutor(max_workers=ENTREZ_WORKERS) as ex:
+        for data in ex.map(one, chunks):
+            for k,v in data.items():
+                if k == "uids": continue
+                out[k] = v
     return out
 
-def efetch_abstracts(pmids: Iterable[str]) -> Dict[str, Dict[str,Any]]:
+_YEAR_RE = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+
+def _text(el: Optional[ET.Element]) -> str:
+    # itertext keeps inline markup (<i>, <sup>, ...) that .text would cut off
+    return "".join(el.itertext()) if el is not None else ""
+
+def _article_record(art: ET.Element) -> Dict[str, Any]:
+    cit = art.find("MedlineCitation")
+    a = cit.find("Article") if cit is not None else None
+    pmid = cit.findtext("PMID") if cit is not None else None
+    title, abst, journal, year = "", "", "", None
+    pubtypes: List[str] = []
+    if a is not None:
+        title = _text(a.find("ArticleTitle"))
+        # structured abstracts: one AbstractText per section, joined in order
+        abst = " ".join(_text(n) for n in a.iterfind("Abstract/AbstractText"))
+        j = a.find("Journal")
+        if j is not None:
+            journal = j.findtext("Title") or ""
+            pd_ = j.find("JournalIssue/PubDate")
+            if pd_ is not None:
+                dp = pd_.findtext("Year") or pd_.findtext("MedlineDate") or ""
+                m = _YEAR_RE.search(dp)  # MedlineDate looks like "1998 Dec-1999 Jan"
+                year = int(m.group(1)) if m else None
+        pubtypes = [pt.text for pt in a.iterfind("PublicationTypeList/PublicationType") if pt.text]
+    doi = None
+    for idn in art.iterfind("PubmedData/ArticleIdList/ArticleId"):
+        if idn.attrib.get("IdType","").lower() == "doi":
+            doi = (idn.text or "").lower()
+    return {"pmid": pmid, "title": title, "abstract": abst, "year": year, "pub_types": pubtypes, "doi": doi, "journal": journal}
+
+def iter_pubmed_articles(source: Union[IO[bytes], str], deleted: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream PubmedArticle records out of efetch / baseline XML (file object or path) with
+    iterparse, freeing each article once extracted, so memory stays flat in the input size.
+    PMIDs under DeleteCitation (update files) are appended to `deleted` when given.
+    """
+    root = None
+    for event, el in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = el
+        if event != "end":
+            continue
+        if el.tag == "PubmedArticle":
+            rec = _article_record(el)
+            el.clear()
+            root.clear()
+            if rec["pmid"]:
+                yield rec
+        elif el.tag in ("DeleteCitation", "PubmedBookArticle"):
+            if deleted is not None and el.tag == "DeleteCitation":
+                deleted.extend(p.text for p in el.iterfind("PMID") if p.text)
+            el.clear()
+            root.clear()
+
+def efetch_abstracts(pmids: Iterable[str], batch_size: int = 200, workers: int = ENTREZ_WORKERS) -> Dict[str, Dict[str,Any]]:
+    """
+    Title, abstract, year, pub types, DOI and journal per PMID. Batches are fetched
+    concurrently (bounded by the shared NCBI rate limit); each worker parses its response
+    as it streams in, overlapping with the other workers' requests. Results keep input batch order.
+    """
     pmids = list(pmids)
     out: Dict[str,Dict[str,Any]] = {}
-    for i in range(0, len(pmids), 200):
-        chunk = pmids[i:i+200]
-        params = {
-            "db":"pubmed", "retmode":"xml", "rettype":"abstract", "id": ",".join(chunk),
-            "email": ENTREZ_EMAIL
-        }
-        if ENTREZ_API_KEY: params["api_key"] = ENTREZ_API_KEY
-        r = requests.get(f"{EUTILS}/efetch.fcgi", headers={"User-Agent": USER_AGENT}, params=params, timeout=HTTP_TIMEOUT)
-        r.raise_for_status()
-        # Minimal XML parsing to extract Title, Abstract, PublicationTypes, Year, DOI (if present)
-        import xml.etree.ElementTree as ET
-        root = ET.fromstring(r.text)
-        for art in root.findall(".//PubmedArticle"):
-            pmid = art.findtext(".//PMID")
-            title = art.findtext(".//ArticleTitle") or ""
-            abst = " ".join([n.text or "" for n in art.findall(".//AbstractText")]) or ""
-            year = None
-            dp = art.findtext(".//PubDate/Year") or art.findtext(".//PubDate/MedlineDate")
-            journal = art.findtext(".//Journal/Title") or ""
-            try:
-                year = int(dp[:4]) if dp else None
-            except Exception:
-                year = None
-            pubtypes = [pt.text for pt in art.findall(".//PublicationTypeList/PublicationType") if pt.text]
-            doi = None
-            for idn in art.findall(".//ArticleIdList/ArticleId"):
-                if idn.attrib.get("IdType","").lower() == "doi":
-                    doi = (idn.text or "").lower()
-            out[pmid] = {"pmid": pmid, "title": title, "abstract": abst, "year": year, "pub_types": pubtypes, "doi": doi, "journal": journal}
+    chunks = [pmids[i:i+batch_size] for i in range(0, len(pmids), batch_size)]
+    def one(chunk: List[str], attempts: int = 3) -> Dict[str, Dict[str, Any]]:
+        with trace.span("entrez.efetch", docs=len(chunk)):  # request + streamed parse
+            for attempt in range(attempts):
+                r = _get("efetch.fcgi", {"db":"pubmed", "retmode":"xml", "rettype":"abstract", "id": ",".join(chunk)},
+                         headers={"User-Agent": USER_AGENT}, stream=True)
+                try:
+                    r.raw.decode_content = True
+                    return {rec["pmid"]: rec for rec in iter_pubmed_articles(r.raw)}
+                # a body cut off mid-stream surfaces from r.raw as urllib3 errors (ProtocolError /
+                # IncompleteRead, ReadTimeoutError), not as requests exceptions
+                except (requests.RequestException, urllib3.exceptions.HTTPError, ET.ParseError):
+                    if attempt == attempts - 1:
+                        raise  # stream broke mid-body; re-request the whole batch
+                finally:
+                    r.close()
+            return {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for part in ex.map(one, chunks):
+            out.update(part)
     return out
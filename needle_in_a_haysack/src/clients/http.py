@@ -0,0 +1,150 @@
+# src/clients/http.py
+from __future__ import annotations
+import time, random, threading, pathlib
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_TIMEOUT, HTTP_MODE, HTTP_ARCHIVE, HTTP_REPLAY_LATENCY
+from utils import trace
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class RateLimiter:
+    """Thread-safe limiter spacing request starts at least 1/rate seconds apart."""
+    def __init__(self, rate_per_s: float):
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+_SESSIONS: Dict[str, requests.Session] = {}
+_NAMES: Dict[int, str] = {}  # id(session) -> client name, for per-client trace counters
+_POOL_SIZE: Dict[str, int] = {}
+_GUARD = threading.Lock()
+
+def session(name: str, pool: int = 16) -> requests.Session:
+    """
+    One pooled keep-alive session per client name, shared by all threads. The connection pool
+    holds at least `pool` connections: a caller asking for more than the session was created
+    with grows it, so it does not matter which caller of a shared name comes first.
+    """
+    with _GUARD:
+        s = _SESSIONS.get(name)
+        if s is None:
+            s = _SESSIONS[name] = requests.Session()
+            _NAMES[id(s)] = name
+        if pool > _POOL_SIZE.get(name, 0):
+            # requests in flight keep their connections from the old adapter
+            adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _POOL_SIZE[name] = pool
+        return s
+
+MODES = ("live", "record", "replay")
+_MODE = "live"
+_ARCHIVE = None  # clients.archive.HttpArchive while recording / replaying
+_LATENCY: Optional[float] = 0.0  # seconds added per replayed response; None = as recorded
+
+def set_mode(mode: str, archive: str | pathlib.Path | None = None, latency: str | float | None = None) -> None:
+    """
+    Switch the transport shared by every client:
+      live   - plain network requests
+      record - network requests, each successful response also stored in the archive
+      replay - responses served from the archive only; an unrecorded request raises ReplayMiss
+    `latency` (replay) is milliseconds added per response, or "recorded" for the original timing.
+    """
+    global _MODE, _ARCHIVE, _LATENCY
+    if mode not in MODES:
+        raise ValueError(f"HTTP mode must be one of {MODES}, got {mode!r}")
+    if mode == "live":
+        _MODE, _ARCHIVE = mode, None
+        return
+    from clients.archive import HttpArchive
+    _ARCHIVE = HttpArchive(pathlib.Path(archive or HTTP_ARCHIVE))
+    lat = HTTP_REPLAY_LATENCY if latency is None else latency
+    _LATENCY = None if str(lat).strip().lower() == "recorded" else float(lat) / 1000.0
+    _MODE = mode
+
+def mode() -> str:
+    return _MODE
+
+def request(sess: requests.Session,
+            method: str,
+            url: str,
+            limiter: Optional[RateLimiter] = None,
+            retries: int = 5,
+            backoff: float = 0.5,
+            timeout: float = HTTP_TIMEOUT,
+            **kw) -> requests.Response:
+    """
+    Send one request through `sess`, waiting on `limiter` before every attempt.
+    429/5xx and connection errors are retried with exponential backoff + jitter
+    (Retry-After is honoured); the final failure is raised.
+    In record / replay mode (set_mode) responses are also archived / only served from the archive.
+    Traced as span "http.<client>" with request / retry / byte (and replayed) counters.
+    """
+    if not trace.enabled():
+        return _send(sess, method, url, limiter, retries, backoff, timeout, **kw)
+    name = _NAMES.get(id(sess), "other")
+    with trace.span(f"http.{name}", method=method) as sp:
+        r = _send(sess, method, url, limiter, retries, backoff, timeout, _client=name, **kw)
+        sp.set(status=r.status_code)
+    trace.count(f"http.{name}.requests")
+    if _MODE == "replay":
+        trace.count(f"http.{name}.replayed")
+    size = r.headers.get("Content-Length")
+    if size is None and not kw.get("stream"):
+        size = len(r.content)
+    trace.count(f"http.{name}.bytes", int(size or 0))
+    return r
+
+def _send(sess: requests.Session, method: str, url: str, limiter: Optional[RateLimiter],
+          retries: int, backoff: float, timeout: float, _client: str = "", **kw) -> requests.Response:
+    if _MODE == "replay":  # no limiter, no retries: nothing goes over the network
+        r, elapsed = _ARCHIVE.replay(method, url, kw)
+        delay = elapsed if _LATENCY is None else _LATENCY
+        if delay > 0:
+            time.sleep(delay)
+        return r
+    r = _request(sess, method, url, limiter, retries, backoff, timeout, _client=_client, **kw)
+    if _MODE == "record":
+        r = _ARCHIVE.record(method, url, kw, r)
+    return r
+
+def _request(sess: requests.Session, method: str, url: str, limiter: Optional[RateLimiter],
+             retries: int, backoff: float, timeout: float, _client: str = "", **kw) -> requests.Response:
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        if attempt and _client:
+            trace.count(f"http.{_client}.retries")
+        try:
+            r = sess.request(method, url, timeout=timeout, **kw)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+            continue
+        if r.status_code in RETRY_STATUS and attempt < retries:
+            ra = r.headers.get("Retry-After", "")
+            delay = float(ra) if ra.replace(".", "", 1).isdigit() else backoff * (2 ** attempt) * (1 + random.random())
+            r.close()
+            time.sleep(delay)
+            continue
+        r.raise_for_status()
+        return r
+    raise RuntimeError("unreachable")
+
+if HTTP_MODE != "live":
+    set_mode(HTTP_MODE)
@@ -1,31 +1,46 @@
 # src/clients/icite.py
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Iterable, Tuple
-import requests
-from config import ICITE_BASE, HTTP_TIMEOUT, USER_AGENT
+from config import ICITE_BASE, ICITE_RATE, ICITE_WORKERS, HTTP_TIMEOUT, USER_AGENT
+from clients.http import RateLimiter, session, request
+from utils import trace
 
 HEADERS = {"User-Agent": USER_AGENT, "Accept": "application/json"}
+_LIMITER = RateLimiter(ICITE_RATE)
 
 def get_pubs(pmids: Iterable[int | str],
              fields: List[str] | None = None,
-             legacy: bool = True) -> List[Dict[str, Any]]:
+             legacy: bool = True,
+             batch_size: int = 800,
+             workers: int = ICITE_WORKERS) -> List[Dict[str, Any]]:
+    """
+    iCite /pubs records for pmids. Batches are requested concurrently over a pooled session
+    (rate-limited, retried on 429/5xx); records come back in batch order.
+    """
     pmids = [str(p) for p in pmids]
     out: List[Dict[str, Any]] = []
     if not pmids:
         return out
-    for i in range(0, len(pmids), 800):
-        batch = pmids[i:i+800]
+    sess = session("icite", pool=max(1, workers))
+    def one(batch: List[str]) -> List[Dict[str, Any]]:
         params = {"pmids": ",".join(batch)}
         if fields:
             params["fl"] = ",".join(fields)
         params["legacy"] = "true" if legacy else "false"
-        r = requests.get(f"{ICITE_BASE}/pubs", headers=HEADERS, params=params, timeout=HTTP_TIMEOUT)
-        r.raise_for_status()
-        data = r.json()
+        with trace.span("icite.pubs", docs=len(batch)):
+            r = request(sess, "GET", f"{ICITE_BASE}/pubs", _LIMITER, headers=HEADERS, params=params, timeout=HTTP_TIMEOUT)
+            data = r.json()
         if isinstance(data, list):
-            out.extend(data)
-        elif isinstance(data, dict):
-            out.append(data)
+            return data
+        if isinstance(data, dict):
+            # the API wraps multi-record answers as {"data": [...]}; a bare dict is one record
+            return data["data"] if isinstance(data.get("data"), list) else [data]
+        return []
+    batches = [pmids[i:i+batch_size] for i in range(0, len(pmids), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as ex:
+        for part in ex.map(one, batches):
+            out.extend(part)
     return out
 
 def extract_refs_and_citers(rec: Dict[str, Any]) -> Tuple[List[int], List[int]]:
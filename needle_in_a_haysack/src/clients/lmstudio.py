@@ -1,10 +1,15 @@
 # src/clients/lmstudio.py
 from __future__ import annotations
-import os, subprocess, shutil
+import os, subprocess, shutil, time
+from concurrent.futures import ThreadPoolExecutor
 import requests, numpy as np
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from config import LMSTUDIO_BASE, LMSTUDIO_EMB_MODEL, LMSTUDIO_CHAT_MODEL, HTTP_TIMEOUT, USER_AGENT
+from config import (LMSTUDIO_BASE, LMSTUDIO_EMB_MODEL, LMSTUDIO_CHAT_MODEL, LMSTUDIO_EMB_BATCH_TOKENS,
+                    LMSTUDIO_EMB_CONCURRENCY, LMSTUDIO_CHAT_MAX_CONCURRENCY, HTTP_TIMEOUT, USER_AGENT)
+from clients import http
+from clients.http import session, request
+from utils import trace
 
 HEADERS_JSON = {"Content-Type": "application/json", "User-Agent": USER_AGENT}
 
@@ -33,69 +38,110 @@ def _cli_load(model_key: str, ttl: int = 900) -> None:
     cmd = [_LMS, "load", model_key, "--ttl", str(ttl)]
     subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; good enough for batch packing
+    return len(text) // 4 + 1
+
+def token_batches(texts: List[str], max_tokens: int, max_items: Optional[int] = None) -> List[List[int]]:
+    """
+    Pack text indices into batches of at most `max_tokens` estimated tokens (and `max_items`
+    texts). Texts are grouped by length so each batch pads little; a text longer than the
+    budget gets a batch of its own.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    batches: List[List[int]] = []
+    cur: List[int] = []
+    tok = 0
+    for i in order:
+        t = approx_tokens(texts[i])
+        if cur and (tok + t > max_tokens or (max_items and len(cur) >= max_items)):
+            batches.append(cur)
+            cur, tok = [], 0
+        cur.append(i)
+        tok += t
+    if cur:
+        batches.append(cur)
+    return batches
+
 class LMEmbeddings:
     """
     Embedding client with on-demand model management:
-      - SDK path: load (with TTL), embed, explicit unload()
-      - REST path: optional CLI auto load/unload around the call
-    Returns L2-normalized float32 ndarray [N, D].
+      - SDK path: load (with TTL), batched embed, explicit unload()
+      - REST path: optional CLI auto load/unload around the call; `concurrency` batches in flight
+    Batches are sized by estimated token count (`max_tokens`), capped at `batch_size` texts.
+    Returns L2-normalized float32 ndarray [N, D]; throughput of the last call is in `last_stats`.
     """
     def __init__(self,
                  base: str = LMSTUDIO_BASE,
                  model: str = LMSTUDIO_EMB_MODEL,
-                 ttl_sec: int = 900):
+                 ttl_sec: int = 900,
+                 max_tokens: int = LMSTUDIO_EMB_BATCH_TOKENS,
+                 concurrency: int = LMSTUDIO_EMB_CONCURRENCY):
         self.base = base.rstrip("/")
         self.model = model
         self.ttl_sec = ttl_sec
+        self.max_tokens = max_tokens
+        self.concurrency = max(1, concurrency)
+        self.last_stats: Dict[str, float] = {}
 
-    def _encode_sdk(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+    def _encode_sdk(self, texts: List[str], batches: List[List[int]]) -> List[List[List[float]]]:
         mdl = lms.embedding_model(self.model, ttl=self.ttl_sec)  # auto-load w/ TTL
-        vecs: list[list[float]] = []
-        # SDK exposes per-text .embed(); keep batches small to tame VRAM spikes
-        for i in range(0, len(texts), batch_size):
-            for t in texts[i:i+batch_size]:
-                vecs.append(mdl.embed(t))
         try:
-            mdl.unload()  # free VRAM immediately
-        except Exception:
-            pass
-        arr = np.array(vecs, dtype="float32")
-        arr /= (np.linalg.norm(arr, axis=1, keepdims=True) + 1e-12)
-        return arr
+            # the SDK call is synchronous; one list per batch keeps VRAM bounded
+            return [mdl.embed([texts[i] for i in b]) for b in batches]
+        finally:
+            try:
+                mdl.unload()  # free VRAM immediately
+            except Exception:
+                pass
 
-    def _encode_rest(self, texts: List[str], batch_size: int = 128) -> np.ndarray:
+    def _encode_rest(self, texts: List[str], batches: List[List[int]]) -> List[List[List[float]]]:
         # Optionally ensure only the embedding model is loaded
         if _USE_CLI:
             _cli_unload_all()
             _cli_load(self.model, ttl=self.ttl_sec)
 
-        vecs: list[list[float]] = []
         url = f"{self.base}/v1/embeddings"
-        for i in range(0, len(texts), batch_size):
-            body = {"model": self.model, "input": texts[i:i+batch_size]}
-            r = requests.post(url, headers=HEADERS_JSON, json=body, timeout=HTTP_TIMEOUT)
-            if r.status_code != 200:
-                msg = r.text
+        sess = session("lmstudio", pool=self.concurrency)
+        def one(b: List[int]) -> List[List[float]]:
+            body = {"model": self.model, "input": [texts[i] for i in b]}
+            try:
+                with trace.span("lmstudio.embed_batch", docs=len(b)):
+                    r = request(sess, "POST", url, headers=HEADERS_JSON, json=body, timeout=HTTP_TIMEOUT)
+            except requests.HTTPError as e:
+                msg = e.response.text if e.response is not None else str(e)
                 if "model_not_found" in msg or "Failed to load model" in msg:
                     hint = ("Embeddings model isn't loaded. Install the lmstudio SDK (preferred) "
                             "or set LMSTUDIO_USE_CLI=1 so we auto load/unload via CLI.")
-                    raise RuntimeError(f"LM Studio embeddings error: {msg}\n{hint}")
-                r.raise_for_status()
-            data = r.json()
-            vecs.extend(d["embedding"] for d in data["data"])
-
-        if _USE_CLI:
-            _cli_unload_all()  # free VRAM
+                    raise RuntimeError(f"LM Studio embeddings error: {msg}\n{hint}") from e
+                raise
+            data = sorted(r.json()["data"], key=lambda d: d.get("index", 0))
+            return [d["embedding"] for d in data]
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as ex:
+                return list(ex.map(one, batches))
+        finally:
+            if _USE_CLI:
+                _cli_unload_all()  # free VRAM
 
-        arr = np.array(vecs, dtype="float32")
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        t0 = time.perf_counter()
+        batches = token_batches(texts, self.max_tokens, max_items=batch_size)
+        with trace.span("lmstudio.embed", docs=len(texts), batches=len(batches)):
+            if _HAVE_LMSDK and http.mode() == "live":  # the SDK bypasses the record/replay transport
+                parts = self._encode_sdk(texts, batches)
+            else:
+                parts = self._encode_rest(texts, batches)
+        arr = np.empty((len(texts), len(parts[0][0]) if parts else 0), dtype="float32")
+        for b, vecs in zip(batches, parts):
+            arr[b] = np.asarray(vecs, dtype="float32")
         arr /= (np.linalg.norm(arr, axis=1, keepdims=True) + 1e-12)
+        dt = time.perf_counter() - t0
+        self.last_stats = {"docs": len(texts), "batches": len(batches),
+                           "tokens": sum(approx_tokens(t) for t in texts),
+                           "seconds": dt, "docs_per_s": len(texts) / dt if dt > 0 else 0.0}
         return arr
 
-    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
-        if _HAVE_LMSDK:
-            return self._encode_sdk(texts, batch_size=batch_size)
-        return self._encode_rest(texts, batch_size=batch_size)
-
 class LMChat:
     def __init__(self, base: str = LMSTUDIO_BASE, model: str = LMSTUDIO_CHAT_MODEL):
         self.base = base.rstrip("/")
@@ -108,6 +154,8 @@ class LMChat:
             "max_tokens": max_tokens,
             "stream": False
         }
-        r = requests.post(f"{self.base}/v1/chat/completions", headers=HEADERS_JSON, json=body, timeout=HTTP_TIMEOUT)
-        r.raise_for_status()
+        # pooled session sized for label_themes' concurrency: safe to call from several threads at once
+        with trace.span("lmstudio.chat"):
+            r = request(session("lmstudio", pool=LMSTUDIO_CHAT_MAX_CONCURRENCY), "POST", f"{self.base}/v1/chat/completions",
+                        headers=HEADERS_JSON, json=body, retries=2)
         return r.json()["choices"][0]["message"]["content"]
\ No newline at end of file
@@ -1,18 +1,46 @@
 from __future__ import annotations
-import os
+import os, pathlib
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+# SQLite caches and the embedding store live here (benchmarks point it at a scratch dir)
+CACHE_DIR = pathlib.Path(os.getenv("CACHE_DIR", str(PROJECT_ROOT / "data" / "cache")))
 
 LMSTUDIO_BASE = os.getenv("LMSTUDIO_BASE", "http://127.0.0.1:1234")
 LMSTUDIO_EMB_MODEL = os.getenv("LMSTUDIO_EMB_MODEL", "text-embedding-qwen3-embedding-0.6b")
 LMSTUDIO_CHAT_MODEL = os.getenv("LMSTUDIO_CHAT_MODEL", "gemma-3n-e2b-it")
+# embedding batches are packed up to this many (estimated) tokens; REST keeps this many batches in flight
+LMSTUDIO_EMB_BATCH_TOKENS = int(os.getenv("LMSTUDIO_EMB_BATCH_TOKENS", "8192"))
+LMSTUDIO_EMB_CONCURRENCY = int(os.getenv("LMSTUDIO_EMB_CONCURRENCY", "4"))
+# theme labelling sends every uncached theme at once, up to this many chat completions in flight
+LMSTUDIO_CHAT_MAX_CONCURRENCY = int(os.getenv("LMSTUDIO_CHAT_MAX_CONCURRENCY", "32"))
 
+ENTREZ_BASE = os.getenv("ENTREZ_BASE", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
 ENTREZ_EMAIL = os.getenv("ENTREZ_EMAIL", "you@example.com")
 ENTREZ_API_KEY = os.getenv("ENTREZ_API_KEY", "")
+# NCBI limits: 3 req/s without an API key, 10 req/s with one
+ENTREZ_RATE = float(os.getenv("ENTREZ_RATE", "10" if ENTREZ_API_KEY else "3"))
+ENTREZ_WORKERS = int(os.getenv("ENTREZ_WORKERS", "4"))
+
+# PubMed metadata cache: records older than this many days are refetched (unset/0 = never stale)
+META_TTL_DAYS = float(os.getenv("META_TTL_DAYS", "0")) or None
 
 ICITE_BASE = os.getenv("ICITE_BASE", "https://icite.od.nih.gov/api")
+ICITE_RATE = float(os.getenv("ICITE_RATE", "10"))  # requests/s, shared by all threads
+ICITE_WORKERS = int(os.getenv("ICITE_WORKERS", "4"))
+# PMIDs iCite returned nothing for are asked again after this many days (it lags PubMed; 0 = never)
+ICITE_ABSENT_TTL_DAYS = float(os.getenv("ICITE_ABSENT_TTL_DAYS", "7")) or None
+# worker processes parsing bulk PubMed / iCite files (scripts/run_bulk_import.py)
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
 HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "30"))
 USER_AGENT = os.getenv("USER_AGENT", "litgap-poc/0.1 (+https://example.org)")
+# HTTP transport: live (default), record (live + archive every response) or replay (archive only, no network)
+HTTP_MODE = os.getenv("HTTP_MODE", "live")
+HTTP_ARCHIVE = pathlib.Path(os.getenv("HTTP_ARCHIVE", str(CACHE_DIR / "http_archive.sqlite3")))
+# added to every replayed response: milliseconds, or "recorded" for each exchange's original latency
+HTTP_REPLAY_LATENCY = os.getenv("HTTP_REPLAY_LATENCY", "0")
 
 KNN_K = int(os.getenv("KNN_K", "20"))
+KNN_BLOCK = int(os.getenv("KNN_BLOCK", "2048"))  # query rows per kNN block (memory ~ block x col_block)
 HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.6"))
 HYBRID_BETA  = float(os.getenv("HYBRID_BETA", "0.4"))
 
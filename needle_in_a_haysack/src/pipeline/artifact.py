@@ -0,0 +1,248 @@
+# src/pipeline/artifact.py
+from __future__ import annotations
+import json, pathlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import scipy.sparse as sp
+
+from utils.io import jdump
+
+FORMAT = "universe-dir/1"
+MANIFEST = "manifest.json"
+DOCS = "docs.parquet"
+DTM = "dtm.npz"      # doc x term title counts (themes/terms.py), vocabulary in vocab.json
+VOCAB = "vocab.json"
+# name -> dtype of every array file; all are plain .npy so they can be memory-mapped
+ARRAYS = {
+    "centroids": "float32",       # [T, d] unit-norm theme centroids, row t <-> manifest themes[t]
+    "member_offsets": "int64",    # [T + 1] theme t's members are members[offsets[t]:offsets[t+1]]
+    "members": "int64",           # doc row indices, grouped by theme
+    "labels": "int64",            # [n] theme id per doc (-1 = none)
+    "knn_idx": "int64",           # [n, k] kNN graph (see update_universe)
+    "knn_cos": "float32",
+    "knn_hyb": "float32",
+}
+
+def save_universe(uni: Dict[str,Any], outdir: pathlib.Path) -> pathlib.Path:
+    """
+    Write a universe dict (build_universe / update_universe output) as a directory:
+      manifest.json   queries, params, counts, per-theme summaries (no member lists or vectors)
+      docs.parquet    one row per doc, row i <-> doc index i
+      *.npy           centroids, theme membership (CSR-style), labels and the kNN graph
+      dtm.npz         sparse doc x term matrix, vocab.json its columns
+    """
+    outdir = pathlib.Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    themes = uni["themes"]
+    n = int(uni["count"])
+    members = [np.asarray(t["members_idx"], dtype=np.int64) for t in themes]
+    arrays: Dict[str, np.ndarray] = {
+        "centroids": np.asarray([t["centroid"] for t in themes], dtype="float32").reshape(len(themes), -1),
+        "member_offsets": np.concatenate([[0], np.cumsum([m.size for m in members])]).astype(np.int64),
+        "members": np.concatenate(members) if members else np.zeros(0, dtype=np.int64),
+    }
+    g = uni.get("knn")
+    if g:
+        arrays["labels"] = np.asarray(g["labels"])
+        arrays["knn_idx"] = np.asarray(g["idx"]).reshape(n, -1)
+        arrays["knn_cos"] = np.asarray(g["cos"]).reshape(n, -1)
+        arrays["knn_hyb"] = np.asarray(g["hyb"]).reshape(n, -1)
+    for name, arr in arrays.items():
+        np.save(outdir / f"{name}.npy", np.ascontiguousarray(arr, dtype=ARRAYS[name]))
+    docs = uni["docs"]
+    table = pa.Table.from_pandas(docs if isinstance(docs, pd.DataFrame) else pd.DataFrame.from_records(docs),
+                                 preserve_index=False)
+    pq.write_table(table, outdir / DOCS)
+    d = uni.get("dtm")
+    if d:
+        sp.save_npz(outdir / DTM, _dtm_matrix(d))
+        jdump(list(d["vocab"]), outdir / VOCAB)
+    manifest = {
+        "format": FORMAT,
+        "queries": uni.get("queries", []),
+        "params": uni.get("params", {}),
+        "count": n,
+        "cluster_method": uni.get("cluster_method"),
+        "timings": uni.get("timings", {}),
+        # terms only when computed: their absence tells rank_gaps to derive them (older universes)
+        "themes": [{"theme_id": int(t["theme_id"]), "size": int(t["size"]), "year_stats": t.get("year_stats", {}),
+                    **({"terms": t["terms"]} if "terms" in t else {})} for t in themes],
+        "arrays": sorted(arrays),
+    }
+    # extra top-level keys (e.g. terms added by later stages) ride along in the manifest
+    manifest["extra"] = {k: v for k, v in uni.items()
+                         if k not in ("queries", "params", "count", "cluster_method", "timings", "themes", "docs", "knn", "dtm")}
+    jdump(manifest, outdir / MANIFEST)
+    return outdir
+
+def _dtm_matrix(d: Dict[str,Any]) -> sp.csr_matrix:
+    return sp.csr_matrix((np.asarray(d["data"]), np.asarray(d["indices"]), np.asarray(d["indptr"])),
+                         shape=tuple(d["shape"]))
+
+class Universe:
+    """
+    Lazy view of a saved universe. Arrays are memory-mapped on first use, docs columns are
+    read from Parquet on demand, and theme dicts are assembled only for the themes asked for.
+    `uni["themes"]`, `uni["docs"]`, `uni["params"]`, ... give the same shapes as the old
+    universe.json dict; to_dict() / export_json() materialize all of it.
+    A legacy universe.json path opens as a fully in-memory Universe.
+    """
+    def __init__(self, path: pathlib.Path, data: Optional[Dict[str,Any]] = None):
+        self.path = pathlib.Path(path)
+        self._data = data
+        self._arrays: Dict[str, np.ndarray] = {}
+        self.manifest: Dict[str,Any] = data if data is not None else json.loads((self.path / MANIFEST).read_text(encoding="utf-8"))
+        self._tpos = {int(t["theme_id"]): i for i, t in enumerate(self.manifest["themes"])}
+
+    @classmethod
+    def open(cls, path: str | pathlib.Path) -> "Universe":
+        path = pathlib.Path(path)
+        if path.is_dir():
+            return cls(path)
+        return cls(path, json.loads(path.read_text(encoding="utf-8")))
+
+    # --- arrays -------------------------------------------------------------------------
+    def array(self, name: str) -> Optional[np.ndarray]:
+        """Memory-mapped array by name (see ARRAYS), or None if the universe has none."""
+        if name not in self._arrays:
+            if self._data is not None:
+                self._arrays[name] = self._array_from_dict(name)
+            else:
+                p = self.path / f"{name}.npy"
+                self._arrays[name] = np.load(p, mmap_mode="r") if p.exists() else None
+        return self._arrays[name]
+
+    def _array_from_dict(self, name: str) -> Optional[np.ndarray]:
+        d = self._data
+        if name == "centroids":
+            return np.asarray([t["centroid"] for t in d["themes"]], dtype="float32").reshape(len(d["themes"]), -1)
+        if name in ("member_offsets", "members"):
+            ms = [np.asarray(t["members_idx"], dtype=np.int64) for t in d["themes"]]
+            if name == "members":
+                return np.concatenate(ms) if ms else np.zeros(0, dtype=np.int64)
+            return np.concatenate([[0], np.cumsum([m.size for m in ms])]).astype(np.int64)
+        g = d.get("knn")
+        if not g:
+            return None
+        key = {"labels": "labels", "knn_idx": "idx", "knn_cos": "cos", "knn_hyb": "hyb"}[name]
+        arr = np.asarray(g[key], dtype=ARRAYS[name])
+        return arr if name == "labels" else arr.reshape(int(d["count"]), -1)
+
+    # --- docs ---------------------------------------------------------------------------
+    @property
+    def count(self) -> int:
+        return int(self.manifest["count"])
+
+    def docs(self, columns: Optional[Sequence[str]] = None, rows: Optional[Sequence[int]] = None) -> pd.DataFrame:
+        """Doc table restricted to `columns` and (positional) `rows`; index is the doc row."""
+        if self._data is not None:
+            df = pd.DataFrame(self._data["docs"])
+            df = df[list(columns)] if columns is not None else df
+        else:
+            table = pq.read_table(self.path / DOCS, columns=list(columns) if columns is not None else None,
+                                  memory_map=True)
+            if rows is not None:
+                table = table.take(pa.array(np.asarray(rows, dtype=np.int64)))
+            df = table.to_pandas()
+            for f in table.schema:
+                if pa.types.is_list(f.type):  # arrow lists arrive as ndarrays; keep the JSON-era lists
+                    df[f.name] = [None if v is None else v.tolist() for v in df[f.name]]
+            if rows is not None:
+                df.index = pd.Index(np.asarray(rows, dtype=np.int64))
+            return df
+        return df.iloc[list(rows)] if rows is not None else df
+
+    def pmids(self) -> np.ndarray:
+        return self.docs(columns=["pmid"])["pmid"].astype(str).to_numpy()
+
+    def dtm(self) -> Optional[Tuple[sp.csr_matrix, List[str]]]:
+        """(doc x term title counts, vocabulary), or None for universes saved without one."""
+        if self._data is not None:
+            d = self._data.get("dtm")
+            return (_dtm_matrix(d), list(d["vocab"])) if d else None
+        if not (self.path / DTM).exists():
+            return None
+        return sp.load_npz(self.path / DTM).tocsr(), json.loads((self.path / VOCAB).read_text(encoding="utf-8"))
+
+    # --- themes -------------------------------------------------------------------------
+    def theme_ids(self) -> List[int]:
+        return list(self._tpos)
+
+    def members(self, theme_id: int) -> np.ndarray:
+        i = self._tpos[int(theme_id)]
+        off = self.array("member_offsets")
+        return np.asarray(self.array("members")[off[i]:off[i+1]])
+
+    def theme(self, theme_id: int, pmids: Optional[np.ndarray] = None) -> Dict[str,Any]:
+        """One theme in the universe.json shape (members, member PMIDs, centroid, year stats)."""
+        i = self._tpos[int(theme_id)]
+        summary = self.manifest["themes"][i]
+        idx = self.members(theme_id)
+        pm = pmids if pmids is not None else self.pmids()
+        t = {
+            "theme_id": int(summary["theme_id"]),
+            "size": int(summary["size"]),
+            "members_idx": idx.tolist(),
+            "members_pmids": pm[idx].tolist(),
+            "centroid": np.asarray(self.array("centroids")[i]).tolist(),
+            "year_stats": summary.get("year_stats", {}),
+        }
+        if "terms" in summary:  # universes saved before themes carried terms have none
+            t["terms"] = summary["terms"]
+        return t
+
+    def themes(self) -> Iterator[Dict[str,Any]]:
+        pm = self.pmids()
+        for tid in self._tpos:
+            yield self.theme(tid, pm)
+
+    # --- dict compatibility / export ----------------------------------------------------
+    def __getitem__(self, key: str) -> Any:
+        if self._data is not None:
+            return self._data[key]
+        if key == "themes":
+            return list(self.themes())
+        if key == "docs":
+            return self.docs().to_dict(orient="records")
+        if key == "knn":
+            if self.array("knn_idx") is None:
+                raise KeyError(key)
+            return {"idx": np.asarray(self.array("knn_idx")), "cos": np.asarray(self.array("knn_cos")),
+                    "hyb": np.asarray(self.array("knn_hyb")), "labels": np.asarray(self.array("labels"))}
+        if key == "dtm":
+            m = self.dtm()
+            if m is None:
+                raise KeyError(key)
+            return {"indptr": m[0].indptr, "indices": m[0].indices, "data": m[0].data,
+                    "shape": list(m[0].shape), "vocab": m[1]}
+        if key in self.manifest.get("extra", {}):
+            return self.manifest["extra"][key]
+        return self.manifest[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str,Any]:
+        """The full universe dict, as build_universe returns it."""
+        if self._data is not None:
+            return self._data
+        out = {k: self.manifest[k] for k in ("queries", "params", "count", "cluster_method")}
+        out["themes"] = self["themes"]
+        out["docs"] = self["docs"]
+        if self.array("knn_idx") is not None:
+            out["knn"] = self["knn"]
+        if self.dtm() is not None:
+            out["dtm"] = self["dtm"]
+        out["timings"] = self.manifest.get("timings", {})
+        out.update(self.manifest.get("extra", {}))
+        return out
+
+    def export_json(self, path: pathlib.Path) -> None:
+        """Write the single-file universe.json form."""
+        jdump(self.to_dict(), pathlib.Path(path))
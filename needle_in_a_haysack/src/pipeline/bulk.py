@@ -0,0 +1,200 @@
+# src/pipeline/bulk.py
+from __future__ import annotations
+import gzip, io, json, pathlib, time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from itertools import islice
+from typing import IO, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np, pandas as pd
+
+from cache.citations import CitationStore
+from cache.meta import MetaCache
+from cache.pmindex import PmidIndex
+from clients.entrez import iter_pubmed_articles
+from clients.icite import extract_refs_and_citers
+from config import BULK_WORKERS
+from utils import trace
+
+ICITE_COLS = ["pmid", "year", "references", "cited_by"]
+# a file whose PMIDs fill at least this share of their min..max range (baseline files, the iCite
+# snapshot) marks the range as covered; sparse ones (daily update files) do not
+DENSE_RANGE = 0.25
+
+_U4 = np.dtype("<u4")
+Progress = Optional[Callable[[Dict[str, Any]], None]]
+
+def _open(path: str) -> IO[bytes]:
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def _file_id(path: str | pathlib.Path) -> Tuple[str, int, float]:
+    p = pathlib.Path(path).resolve()
+    st = p.stat()
+    return str(p), st.st_size, st.st_mtime
+
+def _year(v: Any) -> Optional[int]:
+    try:
+        return int(float(v)) or None
+    except (TypeError, ValueError):
+        return None
+
+def _covered(lo: Optional[int], hi: Optional[int], n: int) -> Tuple[Optional[int], Optional[int]]:
+    if lo is None or hi is None or n < DENSE_RANGE * (hi - lo + 1):
+        return None, None
+    return lo, hi
+
+def _bounded_map(ex: Executor, fn: Callable, jobs: Iterable[Tuple[Any, tuple]], depth: int) -> Iterator[Tuple[Any, Any]]:
+    """
+    ex.submit(fn, *args) per (tag, args) job with at most `depth` jobs in flight, so a lazy job
+    stream is read only as fast as it is processed. Yields (tag, result) in job order.
+    """
+    window: Deque[Tuple[Any, Future]] = deque()
+    for tag, args in jobs:
+        window.append((tag, ex.submit(fn, *args)))
+        if len(window) >= depth:
+            tag0, fut = window.popleft()
+            yield tag0, fut.result()
+    while window:
+        tag0, fut = window.popleft()
+        yield tag0, fut.result()
+
+# --- workers: parse only; the parent process does every write, in input order --------------
+def _parse_pubmed(path: str) -> Tuple[List[Tuple[str, str, Optional[int]]], List[str]]:
+    """(pmid, record JSON, year) per article of one XML file, plus its DeleteCitation PMIDs."""
+    deleted: List[str] = []
+    with _open(path) as fh:
+        rows = [(rec["pmid"], json.dumps(rec), rec["year"]) for rec in iter_pubmed_articles(fh, deleted)]
+    return rows, deleted
+
+def _pack_ids(v: Any) -> bytes:
+    if isinstance(v, str):  # CSV snapshot: space-separated PMIDs
+        ids = np.array(v.split(), dtype=np.int64) if v.strip() else np.zeros(0, dtype=np.int64)
+    else:
+        ids = np.asarray(v, dtype=np.int64)
+    return ids[ids > 0].astype(_U4).tobytes()
+
+def _parse_icite(rows: List[Any], fmt: str) -> List[Tuple[int, Optional[int], bytes, bytes]]:
+    """(pmid, year, packed refs, packed citers) per snapshot row: CSV tuples or JSON lines."""
+    out = []
+    if fmt == "csv":
+        for pmid, year, refs, citers in rows:
+            if str(pmid).isdigit():
+                out.append((int(pmid), _year(year), _pack_ids(refs), _pack_ids(citers)))
+        return out
+    for line in rows:
+        line = line.strip()
+        if not line:
+            continue
+        rec = json.loads(line)
+        pmid = rec.get("pmid") or rec.get("_id")
+        if pmid and str(pmid).isdigit():
+            refs, citers = extract_refs_and_citers(rec)
+            out.append((int(pmid), _year(rec.get("year")), _pack_ids(refs), _pack_ids(citers)))
+    return out
+
+# --- PubMed baseline / update XML ---------------------------------------------------------
+def import_pubmed(paths: Iterable[str | pathlib.Path],
+                  workers: int = BULK_WORKERS,
+                  restart: bool = False,
+                  on_progress: Progress = None) -> Dict[str, Any]:
+    """
+    Load PubMed baseline / update files (.xml or .xml.gz) into the metadata cache and the PMID
+    index. Worker processes parse whole files; the parent writes them in file-name order, so
+    update files override the baseline and their DeleteCitation entries apply (to the metadata
+    cache and, with the file's checkpoint, the PMID index); a rerun skips finished files unless `restart`.
+    Returns stats: files / skipped / records / deleted / seconds.
+    """
+    t0 = time.perf_counter()
+    idx, mc = PmidIndex(), MetaCache()
+    files = sorted((_file_id(p) for p in paths), key=lambda f: pathlib.Path(f[0]).name)
+    todo = [f for f in files if restart or not (idx.status(*f) or {}).get("done")]
+    stats: Dict[str, Any] = {"files": len(todo), "skipped": len(files) - len(todo), "records": 0, "deleted": 0}
+    with trace.span("bulk.pubmed", files=len(todo)) as sp, \
+         ProcessPoolExecutor(max_workers=max(1, workers)) as ex:
+        for i, (f, (rows, deleted)) in enumerate(_bounded_map(ex, _parse_pubmed, ((f, (f[0],)) for f in todo), max(1, workers) + 1)):
+            src, size, mtime = f
+            ids = [int(p) for p, _, _ in rows if p.isdigit()]
+            with trace.span("bulk.pubmed.write", docs=len(rows)):
+                mc.put_json((p, j) for p, j, _ in rows)
+                mc.delete_many(deleted)
+                lo, hi = _covered(min(ids, default=None), max(ids, default=None), len(ids))
+                idx.checkpoint(src, "pubmed", size, mtime, len(rows), lo, hi, done=True,
+                               added=((int(p), y) for p, _, y in rows if p.isdigit()), removed=deleted)
+            stats["records"] += len(rows)
+            stats["deleted"] += len(deleted)
+            if on_progress:
+                on_progress({"file": src, "done": i + 1, "of": len(todo), "records": stats["records"],
+                             "seconds": round(time.perf_counter() - t0, 1)})
+        sp.set(docs=stats["records"])
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+# --- iCite snapshot -----------------------------------------------------------------------
+def icite_format(path: str) -> str:
+    """"csv" (icite_metadata.csv, optionally .gz/.zip) or "jsonl" (one /pubs record per line, optionally .gz)."""
+    name = pathlib.Path(path).name.lower()
+    for ext in (".gz", ".zip"):
+        name = name[:-len(ext)] if name.endswith(ext) else name
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".json", ".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"unrecognised iCite snapshot format: {path}")
+
+def _icite_chunks(path: str, fmt: str, start: int, rows: int) -> Iterator[List[Any]]:
+    """Snapshot rows from `start` on, `rows` at a time, never holding more than one chunk."""
+    if fmt == "csv":
+        skip = (lambda i: 0 < i <= start) if start else None  # a callable: no set of `start` row numbers
+        for df in pd.read_csv(path, usecols=ICITE_COLS, dtype=str, keep_default_na=False,
+                              chunksize=rows, skiprows=skip):
+            yield list(df[ICITE_COLS].itertuples(index=False, name=None))
+        return
+    with _open(path) as fh:
+        lines = islice(io.TextIOWrapper(fh, encoding="utf-8"), start, None)
+        while True:
+            part = list(islice(lines, rows))
+            if not part:
+                return
+            yield part
+
+def import_icite(path: str | pathlib.Path,
+                 workers: int = BULK_WORKERS,
+                 chunk_rows: int = 50_000,
+                 restart: bool = False,
+                 on_progress: Progress = None) -> Dict[str, Any]:
+    """
+    Load an iCite snapshot (see icite_format) into the citation store and the PMID index.
+    The parent streams `chunk_rows`-row chunks to worker processes (a few chunks in flight),
+    writes their packed records in order and checkpoints the rows done after each chunk, so an
+    interrupted import resumes where it stopped; a finished snapshot is skipped unless `restart`.
+    Returns stats: rows / records / skipped / resumed_from / seconds.
+    """
+    t0 = time.perf_counter()
+    src, size, mtime = _file_id(path)
+    fmt = icite_format(src)
+    idx, cs = PmidIndex(), CitationStore()
+    st = None if restart else idx.status(src, size, mtime)
+    if st and st["done"]:
+        return {"rows": st["rows_done"], "records": 0, "skipped": True, "resumed_from": 0, "seconds": 0.0}
+    start = st["rows_done"] if st else 0
+    lo, hi = (st["min_pmid"], st["max_pmid"]) if st else (None, None)
+    done, records = start, 0
+    with trace.span("bulk.icite", resumed_from=start) as sp, \
+         ProcessPoolExecutor(max_workers=max(1, workers)) as ex:
+        jobs = ((len(c), (c, fmt)) for c in _icite_chunks(src, fmt, start, chunk_rows))
+        for n, recs in _bounded_map(ex, _parse_icite, jobs, max(1, workers) + 2):
+            with trace.span("bulk.icite.write", docs=len(recs)):
+                cs.put_packed(recs)
+                if recs:
+                    ids = [r[0] for r in recs]
+                    lo = min(ids) if lo is None else min(lo, min(ids))
+                    hi = max(ids) if hi is None else max(hi, max(ids))
+                done += n
+                records += len(recs)
+                idx.checkpoint(src, "icite", size, mtime, done, lo, hi, added=((p, y) for p, y, _, _ in recs))
+            if on_progress:
+                on_progress({"file": src, "rows": done, "records": records,
+                             "seconds": round(time.perf_counter() - t0, 1)})
+        sp.set(docs=records)
+    idx.checkpoint(src, "icite", size, mtime, done, *_covered(lo, hi, done), done=True)
+    return {"rows": done, "records": records, "skipped": False, "resumed_from": start,
+            "seconds": round(time.perf_counter() - t0, 3)}
@@ -3,31 +3,33 @@ from __future__ import annotations
 from typing import Dict, Any, List, Tuple, Set
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 
-from cache.icite import ICiteCache
-from clients.icite import get_pubs, extract_refs_and_citers
-from pipeline.evidence import split_by_kind
+from pipeline.fetch import ensure_citations
+from pipeline.evidence import split_by_kind, paper_kind
 from config import COV_LEVELS
+from utils import trace
 
 def sr_included_primaries(sr_pmids: List[str],
                           primary_pool: Set[str]) -> Dict[str, Set[str]]:
     """
     Approximate SR 'included studies' as its referenced PMIDs intersected with known primary pool.
     """
-    ic = ICiteCache()
-    have = ic.get_many(sr_pmids, legacy=True)
-    need = [p for p in sr_pmids if p not in have]
-    if need:
-        fetched = get_pubs(need, fields=["pmid","references"], legacy=True)
-        ic.put_many(fetched, legacy=True)
-        for rec in fetched:
-            have[str(rec.get("pmid") or rec.get("_id") or "")] = rec
+    refs = ensure_citations(sr_pmids).refs_of(sr_pmids)
     out: Dict[str,Set[str]] = {}
-    for s in sr_pmids:
-        refs,_ = extract_refs_and_citers(have.get(s, {}))
-        out[s] = set(str(x) for x in refs) & primary_pool
+    for s, r in zip(sr_pmids, refs):
+        out[s] = set(str(x) for x in r.tolist()) & primary_pool
     return out
 
+def _level(cov_ratio: float) -> str:
+    level = "NONE"
+    for name, thr in COV_LEVELS.items():
+        if cov_ratio < thr:
+            level = name
+            break
+    return level
+
+@trace.traced("coverage.theme")
 def coverage_for_theme(theme: Dict[str,Any], docs_df: pd.DataFrame) -> Dict[str,Any]:
     """
     Compute coverage metrics for one theme:
@@ -61,12 +63,7 @@ def coverage_for_theme(theme: Dict[str,Any], docs_df: pd.DataFrame) -> Dict[str,
     else:
         p_years = pd.to_numeric(sub.set_index("pmid").loc[list(E)]["year"], errors="coerce")
         new_prim = int((p_years > last_sr_year).sum()) if p_years.notna().any() else 0
-    # coverage level
-    level = "NONE"
-    for name, thr in COV_LEVELS.items():
-        if cov_ratio < thr:
-            level = name
-            break
+    level = _level(cov_ratio)
     return {
         "theme_id": theme["theme_id"],
         "E_size": len(E),
@@ -80,3 +77,96 @@ def coverage_for_theme(theme: Dict[str,Any], docs_df: pd.DataFrame) -> Dict[str,
         "E": sorted(list(E)),
         "S": sorted(list(S)),
     }
+
+@trace.traced("coverage.universe")
+def coverage_for_universe(themes: List[Dict[str,Any]], docs_df: pd.DataFrame) -> List[Dict[str,Any]]:
+    """
+    coverage_for_theme for every theme at once (same rows, same order):
+      - documents are classified once,
+      - references of every SR in any theme come from one citation-store round trip,
+      - SR -> included primaries is a sparse SR x doc matrix, masked to primaries of the
+        SR's own theme, from which per-theme coverage, SR maps and counts are read off.
+    Themes are assumed disjoint (as produced by clustering).
+    """
+    pmid_col = docs_df["pmid"].astype(str).to_numpy()
+    n = len(pmid_col)
+    titles = docs_df["title"].tolist() if "title" in docs_df else [""] * n
+    ptypes = docs_df["pub_types"].tolist() if "pub_types" in docs_df else [[]] * n
+    kind = np.array([paper_kind(t or "", p if isinstance(p, list) else []) for t, p in zip(titles, ptypes)])
+    years = pd.to_numeric(docs_df["year"], errors="coerce").to_numpy(dtype=float) if "year" in docs_df else np.full(n, np.nan)
+
+    row_of = {p: i for i, p in enumerate(pmid_col)}
+    T = len(themes)
+    label = np.full(n, -1, dtype=np.int64)
+    for t, th in enumerate(themes):
+        rows = [row_of[p] for p in th["members_pmids"] if p in row_of]
+        label[rows] = t
+    in_theme = label >= 0
+    is_prim = in_theme & (kind == "primary")
+    is_sr = in_theme & (kind == "sr")
+
+    # SR x doc inclusion matrix: SR cites doc, doc is a primary of the SR's theme
+    sr_rows = np.flatnonzero(is_sr)
+    sr_pmids = pmid_col[sr_rows].tolist()
+    with trace.span("coverage.sr_refs", docs=len(sr_pmids)):
+        refs = ensure_citations(sr_pmids).refs_of(sr_pmids) if sr_pmids else []
+    num = np.array([int(p) if p.isdigit() else -1 for p in pmid_col], dtype=np.int64)
+    order = np.argsort(num)
+    lens = np.array([r.size for r in refs], dtype=np.int64)
+    flat = np.concatenate(refs) if refs else np.zeros(0, dtype=np.int64)
+    src = np.repeat(np.arange(len(sr_rows)), lens)
+    at = np.clip(np.searchsorted(num[order], flat), 0, max(n - 1, 0))
+    dst = order[at] if n else at
+    ok = (num[dst] == flat) if n else np.zeros(0, dtype=bool)
+    src, dst = src[ok], dst[ok]
+    keep = is_prim[dst] & (label[dst] == label[sr_rows[src]])
+    M = sp.csr_matrix((np.ones(int(keep.sum()), dtype=np.int8), (src[keep], dst[keep])), shape=(len(sr_rows), n))
+    M.sum_duplicates()
+
+    # per-theme aggregates
+    covered = np.asarray((M.sum(axis=0) > 0)).ravel()
+    E_size = np.bincount(label[is_prim], minlength=T)
+    S_count = np.bincount(label[is_sr], minlength=T)
+    cov_count = np.bincount(label[covered], minlength=T)
+    last_sr = np.full(T, -np.inf)
+    sr_years = years[sr_rows]
+    np.fmax.at(last_sr, label[sr_rows][~np.isnan(sr_years)], sr_years[~np.isnan(sr_years)])
+
+    prim_by_t: List[List[int]] = [[] for _ in range(T)]
+    sr_by_t: List[List[int]] = [[] for _ in range(T)]
+    for i in np.flatnonzero(is_prim):
+        prim_by_t[label[i]].append(i)
+    for j, i in enumerate(sr_rows):
+        sr_by_t[label[i]].append(j)
+
+    out = []
+    for t, th in enumerate(themes):
+        S = [sr_pmids[j] for j in sr_by_t[t]]
+        if E_size[t] == 0:
+            out.append({"theme_id": th["theme_id"], "E_size": 0, "S_count": int(S_count[t]),
+                        "coverage_ratio": 0.0, "covered": [], "sr_map": {}, "new_primary_count": 0,
+                        "last_sr_year": None, "coverage_level": "NONE"})
+            continue
+        E_rows = np.asarray(prim_by_t[t], dtype=np.int64)
+        cov_ratio = float(cov_count[t]) / float(E_size[t])
+        last_sr_year = int(last_sr[t]) if np.isfinite(last_sr[t]) else None
+        if last_sr_year is None:
+            new_prim = int(E_size[t])  # treat as all new (no SR exists)
+        else:
+            py = years[E_rows]
+            new_prim = int((py > last_sr_year).sum()) if (~np.isnan(py)).any() else 0
+        sr_map = {sr_pmids[j]: sorted(pmid_col[M.indices[M.indptr[j]:M.indptr[j+1]]].tolist()) for j in sr_by_t[t]}
+        out.append({
+            "theme_id": th["theme_id"],
+            "E_size": int(E_size[t]),
+            "S_count": len(S),
+            "coverage_ratio": cov_ratio,
+            "covered": sorted(pmid_col[E_rows[covered[E_rows]]].tolist()),
+            "sr_map": sr_map,
+            "new_primary_count": new_prim,
+            "last_sr_year": last_sr_year,
+            "coverage_level": _level(cov_ratio),
+            "E": sorted(pmid_col[E_rows].tolist()),
+            "S": sorted(S),
+        })
+    return out
@@ -0,0 +1,43 @@
+# src/pipeline/embed.py
+from __future__ import annotations
+from typing import List, Tuple
+import numpy as np
+
+from cache.emb import EmbCache
+from clients.lmstudio import LMEmbeddings
+from config import LMSTUDIO_EMB_MODEL
+from utils import trace
+
+def embed_cached(pmids: List[str],
+                 texts: List[str],
+                 batch_size: int = 48,
+                 model: str = LMSTUDIO_EMB_MODEL,
+                 cache: EmbCache | None = None) -> Tuple[np.ndarray, int]:
+    """
+    Embed texts aligned with pmids, reusing cached vectors and persisting new ones.
+    The cache is keyed by text content: identical texts are embedded once, and a PMID
+    whose title/abstract changed since it was cached is re-embedded.
+    Returns (L2-normalized vecs [n, d] in input order, cache hit count).
+    """
+    cache = cache or EmbCache()
+    pmids = [str(p) for p in pmids]
+    vecs, hit, _ = cache.get_texts(model, pmids, texts)
+    miss = np.flatnonzero(~hit)
+    trace.count("cache.emb.hit", int(hit.sum()))
+    trace.count("cache.emb.miss", int(miss.size))
+    if miss.size:
+        uniq = list(dict.fromkeys(texts[i] for i in miss))
+        at = {t: j for j, t in enumerate(uniq)}
+        new_vecs = LMEmbeddings(model=model).encode(uniq, batch_size=batch_size)
+        new_vecs = new_vecs[[at[texts[i]] for i in miss]]
+        cache.put_texts(model, [pmids[i] for i in miss], [texts[i] for i in miss], new_vecs)
+        if vecs.shape[1] != new_vecs.shape[1]:
+            full = np.zeros((len(pmids), new_vecs.shape[1]), dtype="float32")
+            if hit.any():
+                full[hit] = vecs[hit]
+            vecs = full
+        vecs[miss] = new_vecs
+    if vecs.shape[1] == 0 and pmids:
+        raise RuntimeError("No documents to embed.")
+    vecs /= (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12)
+    return vecs, int(hit.sum())
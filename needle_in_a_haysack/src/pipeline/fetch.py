@@ -0,0 +1,103 @@
+# src/pipeline/fetch.py
+from __future__ import annotations
+from typing import Dict, Any, List, Tuple, Optional
+
+from cache.meta import MetaCache
+from cache.icite import ICiteCache
+from cache.citations import CitationStore
+from cache.pmindex import PmidIndex
+from clients.entrez import efetch_abstracts
+from clients.icite import get_pubs
+from config import META_TTL_DAYS, ICITE_ABSENT_TTL_DAYS
+from utils import trace
+
+def fetch_meta(pmids: List[str], ttl_days: Optional[float] = META_TTL_DAYS) -> Tuple[Dict[str, Dict[str,Any]], int]:
+    """
+    efetch_abstracts behind the persistent metadata cache: only misses (or entries older
+    than ttl_days) go to the network, and are written back in one bulk insert. Misses inside
+    a bulk-imported PubMed range (cache.pmindex) have no record to fetch and are skipped.
+    Returns ({pmid -> meta} in input order, cache hit count).
+    """
+    pmids = [str(p) for p in pmids]
+    mc = MetaCache()
+    have = mc.get_many(pmids, ttl_days=ttl_days)
+    hits = len(have)
+    need = [p for p in pmids if p not in have]
+    trace.count("cache.meta.hit", hits)
+    trace.count("cache.meta.miss", len(need))
+    if need and not ttl_days:  # with a TTL, stale bulk records must still be refetched
+        n = len(need)
+        need = PmidIndex().uncovered("pubmed", need)
+        trace.count("cache.meta.bulk_absent", n - len(need))
+    if need:
+        fetched = efetch_abstracts(need)
+        mc.put_many(fetched.values())
+        have.update(fetched)
+    mc.close()
+    return {p: have[p] for p in dict.fromkeys(pmids) if p in have}, hits
+
+CITE_FIELDS = ["pmid", "references", "cited_by", "year"]
+
+def _complete(rec: Dict[str,Any]) -> bool:
+    # the old hydrate path cached records without "year"; those still need a fetch
+    return (("references" in rec or "citedPmids" in rec)
+            and ("cited_by" in rec or "citedByPmids" in rec)
+            and "year" in rec)
+
+def ensure_citations(pmids: List[str], absent_ttl_days: Optional[float] = ICITE_ABSENT_TTL_DAYS) -> CitationStore:
+    """
+    Make sure refs/citers/year for pmids are in the citation store: complete records
+    already in the iCite JSON cache are imported, the rest fetched from iCite once.
+    PMIDs iCite has no record for are not asked again until absent_ttl_days have passed.
+    PMIDs inside a bulk-imported iCite snapshot's range (cache.pmindex) are not fetched.
+    """
+    pmids = [str(p) for p in dict.fromkeys(pmids) if str(p).isdigit()]
+    cs = CitationStore()
+    have = cs.has(pmids, with_year=True, absent_ttl_days=absent_ttl_days) if pmids else set()
+    need = [p for p in pmids if p not in have]
+    trace.count("cache.citations.hit", len(pmids) - len(need))
+    trace.count("cache.citations.miss", len(need))
+    if need:
+        n = len(need)
+        need = PmidIndex().uncovered("icite", need)
+        trace.count("cache.citations.bulk_absent", n - len(need))
+    if need:
+        legacy = {p: r for p, r in ICiteCache().get_many(need, legacy=True).items() if _complete(r)}
+        cs.put_records(legacy.values())
+        need = [p for p in need if p not in legacy]
+        trace.count("cache.icite_json.hit", len(legacy))
+    if need:
+        fetched = get_pubs(need, fields=CITE_FIELDS, legacy=True)
+        cs.put_records(fetched)
+        dated = {str(r.get("pmid") or r.get("_id") or "") for r in fetched if r.get("year")}
+        # remember PMIDs iCite does not know (yet) or has no year for, so they are not requested
+        # on every run but are again once the absent TTL runs out
+        cs.mark_absent(p for p in need if p not in dated)
+    return cs
+
+def ensure_years(pmids: List[str], absent_ttl_days: Optional[float] = ICITE_ABSENT_TTL_DAYS) -> Dict[str, Optional[int]]:
+    """
+    Publication year per PMID for screening, without fetching links: years already in the
+    citation store, the bulk PMID index or the metadata cache are used as they are; the rest
+    come from one iCite call with fl=pmid,year and are kept in the store's year table.
+    PMIDs iCite has no year for map to None and are not asked again until absent_ttl_days pass.
+    """
+    pmids = [str(p) for p in dict.fromkeys(pmids) if str(p).isdigit()]
+    cs = CitationStore()
+    years = {p: y for p, y in cs.years_of(pmids).items() if y}
+    years.update((p, y) for p, y in PmidIndex().years_of([p for p in pmids if p not in years]).items() if y)
+    rest = [p for p in pmids if p not in years]
+    if rest:
+        years.update((p, int(m["year"])) for p, m in MetaCache().get_many(rest).items() if m.get("year"))
+    need = [p for p in pmids if p not in years]
+    if need:
+        need = [p for p in need if p not in cs.has(need, with_year=True, absent_ttl_days=absent_ttl_days)]
+    trace.count("cache.years.hit", len(pmids) - len(need))
+    trace.count("cache.years.miss", len(need))
+    if need:
+        fetched = {str(r.get("pmid") or r.get("_id") or ""): r.get("year") for r in get_pubs(need, fields=["pmid", "year"])}
+        dated = {p: int(y) for p, y in fetched.items() if p in need and y}
+        cs.put_years(dated.items())
+        cs.mark_absent(p for p in need if p not in dated)
+        years.update(dated)
+    return {p: years.get(p) for p in pmids}
@@ -3,19 +3,9 @@ from __future__ import annotations
 from typing import Dict, Any, List
 import numpy as np
 import pandas as pd
-import re
-from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 
-STOP = ENGLISH_STOP_WORDS
-TOK = re.compile(r"[A-Za-z0-9]+")
-
-def top_terms(titles: List[str], k: int = 8) -> List[str]:
-    tf = {}
-    for t in titles:
-        for w in TOK.findall((t or "").lower()):
-            if len(w) < 3 or w in STOP: continue
-            tf[w] = tf.get(w, 0) + 1
-    return [w for w,_ in sorted(tf.items(), key=lambda x: x[1], reverse=True)[:k]]
+from themes.terms import theme_terms
+from utils import trace
 
 def simple_questions(theme_title_terms: List[str]) -> List[str]:
     # produce a couple of templated question sketches from term list
@@ -40,15 +30,21 @@ def gap_score(coverage_ratio: float, new_primary_count: int, E_size: int, last_s
     newp = np.tanh(new_primary_count / 10.0)
     return 0.5*cov_term + 0.2*recency + 0.2*newp + 0.1*mass
 
-def rank_gaps(universe: Dict[str,Any], coverage_rows: List[Dict[str,Any]], now_year: int) -> List[Dict[str,Any]]:
-    df = pd.DataFrame(universe["docs"])
+@trace.traced("gap.rank")
+def rank_gaps(universe: Dict[str,Any], coverage_rows: List[Dict[str,Any]], now_year: int,
+              docs_df: pd.DataFrame | None = None) -> List[Dict[str,Any]]:
     theme_by_id = {t["theme_id"]: t for t in universe["themes"]}
+    # c-TF-IDF terms stored with the universe; computed in one pass for older universes
+    if any("terms" not in t for t in theme_by_id.values()):
+        df = docs_df if docs_df is not None else pd.DataFrame(universe["docs"])
+        with trace.span("gap.terms", docs=len(df)):
+            computed = theme_terms(df["title"].fillna("").tolist(), {tid: t["members_idx"] for tid, t in theme_by_id.items()}, k=8)
+    else:
+        computed = {}
     rows = []
     for row in coverage_rows:
         tid = row["theme_id"]; t = theme_by_id[tid]
-        members_idx = t["members_idx"]
-        titles = [df.iloc[i]["title"] for i in members_idx]
-        terms = top_terms(titles, k=8)
+        terms = t["terms"] if "terms" in t else computed.get(int(tid), [])
         qs = simple_questions(terms)
         score = gap_score(row["coverage_ratio"], row["new_primary_count"], row["E_size"], row["last_sr_year"], now_year)
         rows.append({
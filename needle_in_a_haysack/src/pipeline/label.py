@@ -0,0 +1,58 @@
+# src/pipeline/label.py
+from __future__ import annotations
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache.labels import LabelCache, label_key
+from clients.lmstudio import LMChat
+from config import LMSTUDIO_CHAT_MAX_CONCURRENCY
+from utils import trace
+
+def label_themes(chat: LMChat,
+                 titles_by_theme: Dict[int, List[str]],
+                 system: str,
+                 template: str,
+                 concurrency: Optional[int] = None,
+                 cache: Optional[LabelCache] = None,
+                 temperature: float = 0.2,
+                 max_tokens: int = 400) -> Tuple[Dict[int, Dict[str,Any]], Dict[str,Any]]:
+    """
+    LLM label per theme: {"llm_yaml": text} or {"llm_error": msg}.
+    Labels cached under (model, prompt, sorted titles) are returned without a call; the rest go
+    to the chat server with up to `concurrency` requests in flight (default: all of them, at most
+    LMSTUDIO_CHAT_MAX_CONCURRENCY), so a cold run takes about as long as its slowest request.
+    Successful completions are cached, errors are not. `template` is formatted with titles=
+    (newline separated).
+    Returns (labels, stats) with stats = themes / cached / generated / errors / seconds.
+    """
+    t0 = time.perf_counter()
+    cache = cache if cache is not None else LabelCache()
+    keys = {tid: label_key(chat.model, system, template, titles) for tid, titles in titles_by_theme.items()}
+    hits = cache.get_many(keys.values())
+    out: Dict[int, Dict[str,Any]] = {tid: {"llm_yaml": hits[k], "llm_cached": True} for tid, k in keys.items() if k in hits}
+    todo = [tid for tid in titles_by_theme if tid not in out]
+    trace.count("cache.labels.hit", len(out))
+    trace.count("cache.labels.miss", len(todo))
+
+    def one(tid: int) -> Dict[str,Any]:
+        try:
+            prompt = template.format(titles="\n".join(titles_by_theme[tid]))
+            return {"llm_yaml": chat.chat(system, prompt, temperature=temperature, max_tokens=max_tokens)}
+        except Exception as e:
+            return {"llm_error": str(e)}
+
+    if todo:
+        limit = concurrency or LMSTUDIO_CHAT_MAX_CONCURRENCY
+        with ThreadPoolExecutor(max_workers=max(1, min(limit, len(todo)))) as ex:
+            for tid, res in zip(todo, ex.map(one, todo)):
+                out[tid] = res
+    cache.put_many((keys[tid], chat.model, out[tid]["llm_yaml"]) for tid in todo if "llm_yaml" in out[tid])
+    stats = {
+        "themes": len(titles_by_theme),
+        "cached": len(titles_by_theme) - len(todo),
+        "generated": sum(1 for tid in todo if "llm_yaml" in out[tid]),
+        "errors": sum(1 for tid in todo if "llm_error" in out[tid]),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return {tid: out[tid] for tid in titles_by_theme}, stats
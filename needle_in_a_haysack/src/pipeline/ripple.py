@@ -1,66 +1,104 @@
 # src/pipeline/ripple.py
 from __future__ import annotations
-from typing import List, Dict, Any, Set, Tuple
-import numpy as np, pandas as pd
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+import numpy as np
 
-from cache.icite import ICiteCache
-from cache.emb import EmbCache
-from clients.icite import get_pubs, extract_refs_and_citers
-from clients.entrez import efetch_abstracts
-from clients.lmstudio import LMEmbeddings
-from themes.hybrid_graph import cosine_sim_matrix
-from config import LMSTUDIO_EMB_MODEL
+from pipeline.fetch import fetch_meta, ensure_citations, ensure_years
+from pipeline.embed import embed_cached
+from cache.citations import CitationStore
+from utils import trace
+
+MAX_EXPAND = 300  # default shortlist size: candidates fetched + embedded per ripple
+
+def cheap_rank(cs: CitationStore,
+               seed_pmids: Sequence[str],
+               prefer: str = "citers",
+               exclude: Iterable[str] = ()) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tier 1: candidates around the seeds from the citation store alone, ranked by how many
+    seeds link to them (citers and/or refs, per `prefer`), ties to newer (higher) PMIDs.
+    Seeds and `exclude` are dropped. Returns (candidate PMIDs, link counts), best first.
+    """
+    pools: List[np.ndarray] = []
+    if prefer in ("citers", "both"):
+        pools += cs.citers_of(seed_pmids)
+    if prefer in ("refs", "both"):
+        pools += cs.refs_of(seed_pmids)
+    flat = np.concatenate([np.unique(p) for p in pools]) if pools else np.zeros(0, dtype=np.int64)
+    cand, links = np.unique(flat, return_counts=True)
+    drop = np.array([int(p) for p in (*seed_pmids, *exclude) if str(p).isdigit()], dtype=np.int64)
+    keep = ~np.isin(cand, drop)
+    cand, links = cand[keep], links[keep]
+    order = np.lexsort((-cand, -links))
+    return cand[order], links[order]
 
 def ripple_expand_from_primaries(seed_pmids: List[str],
                                  allowed_since_year: int | None,
-                                 max_expand: int = 300,
-                                 prefer: str = "citers") -> Dict[str,Any]:
+                                 max_expand: int = MAX_EXPAND,
+                                 prefer: str = "citers",
+                                 centroid: Optional[Sequence[float]] = None,
+                                 exclude: Iterable[str] = ()) -> Dict[str,Any]:
     """
-    Expand around seed primary studies, preferring recent citers (or refs), with a strict cap.
-    Returns fetched docs {pmid->meta} and the ordered candidate list.
+    Two-tier expansion around seed primary studies:
+      1. rank all citers (or refs, or both) of the seeds by seed link count (cheap_rank) and
+         walk that order, checking years in chunks (year only, ensure_years), until
+         `max_expand` pass allowed_since_year;
+      2. fetch metadata, full citation records and embeddings for that shortlist only and
+         rerank it by cosine to `centroid` (the theme centroid; without one the tier-1 order is kept).
+    Returns fetched docs {pmid->meta}, the ordered candidate list, per-candidate scores
+    (pmid, links, year, cos) in the same order, and volume stats.
     """
-    ic = ICiteCache()
-    have = ic.get_many(seed_pmids, legacy=True)
-    need = [p for p in seed_pmids if p not in have]
-    if need:
-        fetched = get_pubs(need, fields=["pmid","references","cited_by","year"], legacy=True)
-        ic.put_many(fetched, legacy=True)
-        for rec in fetched:
-            have[str(rec.get("pmid") or rec.get("_id") or "")] = rec
+    seed_pmids = [str(p) for p in seed_pmids]
+    with trace.span("ripple.rank", seeds=len(seed_pmids)) as sp:
+        cs = ensure_citations(seed_pmids)
+        cand, links = cheap_rank(cs, seed_pmids, prefer=prefer, exclude=exclude)
+        sp.set(docs=int(len(cand)))
 
-    cand: List[int] = []
-    for s in seed_pmids:
-        refs,citers = extract_refs_and_citers(have.get(s, {}))
-        pool = citers if prefer=="citers" else refs
-        cand.extend(pool)
-    # unique and filter by year if we can
-    cand = list(dict.fromkeys(cand))
-    if allowed_since_year is not None:
-        # fetch years
-        have2 = ic.get_many([str(x) for x in cand], legacy=True)
-        need2 = [str(x) for x in cand if str(x) not in have2]
-        if need2:
-            fetched2 = get_pubs(need2, fields=["pmid","year"], legacy=True)
-            ic.put_many(fetched2, legacy=True)
-            for rec in fetched2:
-                have2[str(rec.get("pmid") or rec.get("_id") or "")] = rec
-        cand = [c for c in cand if (have2.get(str(c),{}).get("year") or 0) >= allowed_since_year]
-    cand = cand[:max_expand]
+    # year screen in rank order: only as many candidates are looked up as it takes to fill the slice
+    short: List[int] = []
+    years: Dict[str, Optional[int]] = {}
+    step = max(100, max_expand)
+    screened = 0
+    with trace.span("ripple.screen") as sp:
+        for i in range(0, len(cand), step):
+            if len(short) >= max_expand:
+                break
+            part = [str(x) for x in cand[i:i+step].tolist()]
+            screened += len(part)
+            if allowed_since_year is None:
+                years.update(cs.years_of(part))  # whatever is already known; no network
+                short.extend(range(i, i + len(part)))
+                continue
+            years.update(ensure_years(part))
+            short.extend(i + j for j, p in enumerate(part) if (years.get(p) or 0) >= allowed_since_year)
+        short = short[:max_expand]
+        sp.set(docs=screened)
 
-    # fetch metadata for candidates
-    meta = efetch_abstracts([str(x) for x in cand])
-    # embed (cache)
-    cache = EmbCache()
-    pid = [str(x) for x in meta.keys()]
+    # tier 2: fetch + embed the shortlist only
+    with trace.span("ripple.fetch", docs=len(short)):
+        meta, _ = fetch_meta([str(cand[i]) for i in short])
+        ensure_citations([str(cand[i]) for i in short])
+    rows = [i for i in short if str(cand[i]) in meta]
+    pid = [str(cand[i]) for i in rows]
     texts = [(meta[p]["title"] or "") + "\n" + (meta[p]["abstract"] or "") for p in pid]
-    cached = cache.get_many(LMSTUDIO_EMB_MODEL, pid)
-    miss_idx, miss_texts, miss_pmids = [], [], []
-    for i,p in enumerate(pid):
-        if p not in cached:
-            miss_idx.append(i); miss_texts.append(texts[i]); miss_pmids.append(p)
-    if miss_texts:
-        emb = LMEmbeddings()
-        new_vecs = emb.encode(miss_texts, batch_size=32)
-        cache.put_many(LMSTUDIO_EMB_MODEL, [(miss_pmids[j], new_vecs[j]) for j in range(len(miss_pmids))])
+    cos = np.full(len(pid), np.nan, dtype=np.float32)
+    if pid:
+        with trace.span("ripple.embed", docs=len(pid)):
+            vecs, _ = embed_cached(pid, texts, batch_size=32)
+        if centroid is not None:
+            c = np.asarray(centroid, dtype=np.float32)
+            cos = vecs @ (c / (np.linalg.norm(c) + 1e-12))
+    order = np.lexsort((np.arange(len(pid)), -np.nan_to_num(cos, nan=-np.inf))) if centroid is not None else np.arange(len(pid))
 
-    return {"meta": meta, "candidates": [str(x) for x in cand]}
+    scored = []
+    for j in order.tolist():
+        p = pid[j]
+        y = years.get(p) or meta[p].get("year")
+        scored.append({"pmid": p, "links": int(links[rows[j]]), "year": int(y) if y else None,
+                       "cos": None if np.isnan(cos[j]) else round(float(cos[j]), 4)})
+    return {
+        "meta": meta,
+        "candidates": [s["pmid"] for s in scored],
+        "scored": scored,
+        "stats": {"pool": int(len(cand)), "screened": screened, "fetched": len(short), "embedded": len(pid)},
+    }
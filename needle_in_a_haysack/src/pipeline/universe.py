@@ -1,8 +1,10 @@
 # src/pipeline/universe.py
 from __future__ import annotations
-import time, pathlib, sys
-from typing import List, Dict, Any, Literal, Set
-import numpy as np, pandas as pd, networkx as nx
+import time, pathlib, sys, queue, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Literal, Set, Tuple
+import numpy as np, pandas as pd
 
 # import roots
 ROOT = pathlib.Path(__file__).resolve().parents[2]
@@ -10,207 +12,398 @@ SRC = ROOT / "src"
 if str(ROOT) not in sys.path: sys.path.insert(0, str(ROOT))
 if str(SRC)  not in sys.path: sys.path.insert(0, str(SRC))
 
-from clients.entrez import esearch, efetch_abstracts
-from clients.icite import get_pubs, extract_refs_and_citers
-from cache.icite import ICiteCache
-from clients.lmstudio import LMEmbeddings
-from themes.hybrid_graph import cosine_sim_matrix, build_knn, hybrid_weights
+from clients.entrez import esearch
+from themes.hybrid_graph import knn_blocked, knn_update, hybrid_weights, ref_incidence, coupling_knn
 from themes.themes import soft_membership
-from config import KNN_K, HYBRID_ALPHA, HYBRID_BETA, LMSTUDIO_EMB_MODEL
-from cache.emb import EmbCache
+from themes.cluster import cluster_knn, warm_start, align_labels
+from themes.terms import build_dtm, top_terms_by_class
+from config import KNN_K, KNN_BLOCK, HYBRID_ALPHA, HYBRID_BETA, LMSTUDIO_EMB_MODEL, META_TTL_DAYS, ENTREZ_WORKERS
+from pipeline.embed import embed_cached
+from pipeline.fetch import fetch_meta, ensure_citations
+from cache.ann import ann_knn
+from utils import trace
 
 def hydrate_pmids(seed_pmids: List[str],
                   mode: Literal["none","refs","citers","both"]="none",
                   hops: int = 1,
-                  per_seed_budget: int = 200) -> List[str]:
+                  per_seed_budget: int = 200,
+                  budget: int | None = None,
+                  min_links: int = 1,
+                  min_gain: float = 0.25,
+                  exclude: Iterable[str] = ()) -> List[str]:
     """
-    Optional node expansion using iCite refs/citers with hard budgets.
-    Returns the union list (seed + expansion), de-duplicated, as strings.
+    Optional node expansion over iCite refs/citers, best candidates first.
+    A candidate's score is the number of loaded documents linking to it: with "refs" the
+    documents that cite it (coupling), with "citers" the ones it cites (co-citation).
+    Each hop loads the links of the nodes admitted so far (one concurrent iCite fetch),
+    then admits candidates by (-score, pmid) until the global `budget` (default
+    per_seed_budget * #seeds) is spent or scores drop below `min_links`. Expansion stops
+    early when a hop's mean admitted score falls below `min_gain` x the first hop's.
+    PMIDs in `exclude` (documents already held elsewhere) are never admitted nor expanded.
+    Returns seeds (input order) followed by admitted PMIDs in admission order; the result
+    depends only on the seed set and parameters.
     """
-    if mode == "none" or hops <= 0:
-        return [str(x) for x in seed_pmids]
-    cache = ICiteCache()
-    frontier: Set[str] = set(str(x) for x in seed_pmids)
-    universe: Set[str] = set(frontier)
-    for _ in range(hops):
-        need = list(frontier)
-        have = cache.get_many(need, legacy=True)
-        missing = [p for p in need if p not in have]
-        if missing:
-            fetched = get_pubs(missing, fields=["pmid","references","cited_by"], legacy=True)
-            cache.put_many(fetched, legacy=True)
-            for rec in fetched:
-                have[str(rec.get("pmid") or rec.get("_id") or "")] = rec
-        new: Set[str] = set()
-        for p in need:
-            rec = have.get(p, {})
-            refs, citers = extract_refs_and_citers(rec)
-            pool: List[int] = []
-            if mode in ("refs","both"):
-                pool.extend(refs[:per_seed_budget//(2 if mode=="both" else 1)])
-            if mode in ("citers","both"):
-                pool.extend(citers[:per_seed_budget//(2 if mode=="both" else 1)])
-            for q in pool:
-                q = str(q)
-                if q not in universe:
-                    new.add(q)
-        frontier = new
-        universe |= new
-        if not frontier: break
-    return list(universe)
+    seeds = list(dict.fromkeys(str(x) for x in seed_pmids))
+    if mode == "none" or hops <= 0 or not seeds:
+        return seeds
+    budget = per_seed_budget * len(seeds) if budget is None else budget
+    universe: Set[int] = {int(p) for p in seeds if p.isdigit()}
+    frontier = sorted(universe)
+    universe.update(int(p) for p in (str(x) for x in exclude) if p.isdigit())
+    links: List[np.ndarray] = []  # link targets of every loaded node, accumulated over hops
+    admitted: List[int] = []
+    first_gain = None
+    for hop in range(hops):
+        if not frontier or len(admitted) >= budget:
+            break
+        need = [str(p) for p in frontier]
+        with trace.span("hydrate.load", hop=hop, docs=len(need)):
+            cs = ensure_citations(need)
+        if mode in ("refs", "both"):
+            links.extend(cs.refs_of(need))
+        if mode in ("citers", "both"):
+            links.extend(cs.citers_of(need))
+        flat = np.concatenate(links) if links else np.zeros(0, dtype=np.int64)
+        cand, score = np.unique(flat[flat > 0], return_counts=True)
+        fresh = ~np.isin(cand, np.fromiter(universe, dtype=np.int64, count=len(universe)))
+        cand, score = cand[fresh & (score >= min_links)], score[fresh & (score >= min_links)]
+        order = np.lexsort((cand, -score))[:budget - len(admitted)]  # priority: score desc, pmid asc
+        if order.size == 0:
+            break
+        gain = float(score[order].mean())
+        first_gain = gain if first_gain is None else first_gain
+        if gain < min_gain * first_gain:
+            break  # marginal gain too low: not worth fetching/embedding this hop
+        frontier = cand[order].tolist()
+        admitted.extend(frontier)
+        universe.update(frontier)
+    return seeds + [str(p) for p in admitted]
 
-def build_universe(queries: List[str],
-                   year_min: int | None,
-                   year_max: int | None,
-                   retmax: int = 500,
-                   hydrate: Literal["none","refs","citers","both"]="none",
-                   hops: int = 1,
-                   per_seed_budget: int = 150,
-                   knn_k: int = KNN_K,
-                   alpha: float = HYBRID_ALPHA,
-                   beta: float  = HYBRID_BETA,
-                   resolution: float = 0.8,
-                   threshold: float = 0.4,
-                   emb_batch: int = 48) -> Dict[str,Any]:
-    """
-    Multi-query -> (optional) hydration -> efetch -> cached embeddings -> hybrid kNN -> clustering.
-    Returns full universe dict {docs, themes, cluster_method, params...}.
-    """
-    t0 = time.perf_counter()
-    # 1) union PMIDs from all queries
-    pmid_set: Set[str] = set()
+class _Timer:
+    """Busy time and first-start/last-end span per stage (thread-safe); traced as "stream.<stage>"."""
+    def __init__(self):
+        self.busy: Dict[str, float] = {}
+        self.span: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, t0: float, t1: float, docs: int = 0) -> None:
+        trace.record(f"stream.{stage}", t0, t1, docs=docs)
+        with self._lock:
+            self.busy[stage] = self.busy.get(stage, 0.0) + (t1 - t0)
+            sp = self.span.setdefault(stage, [t0, t1])
+            sp[0], sp[1] = min(sp[0], t0), max(sp[1], t1)
+
+class _Laps:
+    """Wall time between successive calls, per named stage; traced as "universe.<stage>"."""
+    STAGES = ("esearch", "hydrate", "fetch_embed", "knn", "cluster", "package")
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._t = time.perf_counter()
+
+    def __call__(self, stage: str) -> None:
+        t = time.perf_counter()
+        trace.record(f"universe.{stage}", self._t, t)
+        self.timings[stage] = round(t - self._t, 3)
+        self._t = t
+
+    def total(self) -> Dict[str, float]:
+        self.timings["total"] = round(sum(v for k, v in self.timings.items() if k in self.STAGES), 3)
+        return self.timings
+
+def search_pmids(queries: List[str], year_min: int | None, year_max: int | None, retmax: int = 500) -> List[str]:
+    """Union of esearch results over all queries, in first-seen order (stable run to run, so request batches are too)."""
+    pmids: Dict[str, None] = {}
     for q in queries:
         ids = esearch(q, retmax=retmax, mindate=year_min, maxdate=year_max, sort="date")
-        pmid_set.update(str(x) for x in ids)
-    pmids = list(pmid_set)
-    # 2) hydrate optionally
-    pmids_h = hydrate_pmids(pmids, mode=hydrate, hops=hops, per_seed_budget=per_seed_budget)
-    # 3) efetch metadata
-    meta = efetch_abstracts(pmids_h)
-    df = pd.DataFrame.from_records(list(meta.values()))
-    df = df.dropna(subset=["title"]).reset_index(drop=True)
-    # 4) embeddings (cached)
-    cache = EmbCache()
-    pid = [str(x) for x in df["pmid"].tolist()]
-    texts = (df["title"].fillna("") + "\n" + df["abstract"].fillna("")).tolist()
-    cached = cache.get_many(LMSTUDIO_EMB_MODEL, pid)
-    miss_idx, miss_texts, miss_pmids = [], [], []
-    for i, p in enumerate(pid):
-        if p not in cached:
-            miss_idx.append(i); miss_texts.append(texts[i]); miss_pmids.append(p)
-    if miss_texts:
-        emb = LMEmbeddings()
-        new_vecs = emb.encode(miss_texts, batch_size=emb_batch)
-        cache.put_many(LMSTUDIO_EMB_MODEL, [(miss_pmids[j], new_vecs[j]) for j in range(len(miss_pmids))])
-    else:
-        new_vecs = np.empty((0,0), dtype="float32")
-    # assemble vecs
-    if cached:
-        dim = next(iter(cached.values())).size
-    else:
-        dim = new_vecs.shape[1]
-    vecs = np.zeros((len(pid), dim), dtype="float32")
-    for i,p in enumerate(pid):
-        if p in cached:
-            vecs[i] = cached[p]
-    for pos, j in enumerate(miss_idx):
-        vecs[j] = new_vecs[pos]
-    vecs /= (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12)
-    # 5) hybrid kNN graph
-    cos = cosine_sim_matrix(vecs)
-    knn_idx, knn_cos = build_knn(cos, k=knn_k)
-    # bibliographic coupling on kNN pairs
-    icache = ICiteCache()
-    have = icache.get_many(pid, legacy=True)
-    need = [p for p in pid if p not in have]
-    if need:
-        fetched = get_pubs(need, fields=["pmid","references","cited_by"], legacy=True)
-        icache.put_many(fetched, legacy=True)
-        for rec in fetched:
-            have[str(rec.get("pmid") or rec.get("_id") or "")] = rec
-    ref_sets: Dict[str,set[int]] = {}
-    for p in pid:
-        refs,_ = extract_refs_and_citers(have.get(p, {}))
-        ref_sets[p] = set(refs)
-    bc_knn = np.zeros_like(knn_cos, dtype="float32")
-    for i in range(len(pid)):
-        Ri = ref_sets.get(pid[i], set())
-        if not Ri: continue
-        for t, j in enumerate(knn_idx[i]):
-            Rj = ref_sets.get(pid[j], set())
-            if not Rj: continue
-            inter = len(Ri & Rj)
-            if inter:
-                uni = len(Ri | Rj) or 1
-                bc_knn[i,t] = inter/uni
-    hyb = hybrid_weights(knn_cos, bc_knn, alpha=alpha, beta=beta)
-    # 6) cluster
-    G = nx.Graph()
-    for i in range(len(pid)):
-        for t, j in enumerate(knn_idx[i]):
-            w = float(hyb[i,t])
-            if w<=0: continue
-            if G.has_edge(i,j):
-                if G[i][j]["weight"] < w:
-                    G[i][j]["weight"] = w
-            else:
-                G.add_edge(i,j,weight=w)
-    labels=None; method=None
-    try:
-        import igraph as ig, leidenalg as la
-        mapping = {n:i for i,n in enumerate(G.nodes())}
-        edges = [(mapping[u],mapping[v]) for u,v in G.edges()]
-        weights = [G[u][v].get("weight",1.0) for u,v in G.edges()]
-        g = ig.Graph(n=len(mapping), edges=edges)
-        g.es["weight"] = weights
-        part = la.find_partition(g, la.RBConfigurationVertexPartition, weights="weight", resolution_parameter=resolution)
-        labels = np.zeros(len(mapping), dtype=int)
-        for cid, members in enumerate(part):
-            for v in members:
-                labels[v] = cid
-        method="leiden"
-    except Exception:
+        pmids.update(dict.fromkeys(str(x) for x in ids))
+    return list(pmids)
+
+def _stream_docs(pmids: List[str],
+                 ttl_days: float | None,
+                 emb_batch: int,
+                 chunk: int = 200,
+                 depth: int = 4,
+                 workers: int = ENTREZ_WORKERS) -> Tuple[List[Dict[str,Any]], np.ndarray, Dict[str,float]]:
+    """
+    Producer/consumer pipeline over PMID chunks: efetch (cached, `workers` chunks in flight)
+    feeds two bounded queues, one embedding each chunk as it lands and one loading its iCite
+    references into the citation store. Queue `depth` bounds how far fetching runs ahead.
+    Returns (meta records with a title, their vecs, timings) in `pmids` order.
+    """
+    chunks = [pmids[i:i+chunk] for i in range(0, len(pmids), chunk)]
+    q_emb: "queue.Queue" = queue.Queue(maxsize=depth)
+    q_cite: "queue.Queue" = queue.Queue(maxsize=depth)
+    recs: List[List[Dict[str,Any]]] = [[] for _ in chunks]
+    vecs: List[np.ndarray | None] = [None] * len(chunks)
+    errors: List[BaseException] = []
+    tm = _Timer()
+
+    def fetch(c: List[str]) -> List[Dict[str,Any]]:
+        t0 = time.perf_counter()
+        meta, _ = fetch_meta(c, ttl_days=ttl_days)
+        tm.add("fetch", t0, time.perf_counter(), docs=len(c))
+        return [m for m in meta.values() if m.get("title") is not None]
+
+    def produce() -> None:
+        ex = ThreadPoolExecutor(max_workers=max(1, workers))
+        inflight: deque = deque()
         try:
-            import importlib.util, hdbscan  # type: ignore
-            labels = hdbscan.HDBSCAN(min_cluster_size=max(10, len(pid)//50), metric="euclidean").fit_predict(vecs)
-            method="hdbscan"
-        except Exception:
-            TH = float(threshold)
-            H = nx.Graph((u,v,d) for u,v,d in G.edges(data=True) if d.get("weight",0.0)>=TH)
-            labels = -1*np.ones(len(pid), dtype=int); cid=0
-            for comp in nx.connected_components(H):
-                for i in comp: labels[i]=cid
-                cid+=1
-            method=f"components@{TH}"
-    uniq, W = soft_membership(vecs, labels, knn_idx, hyb, topm=2, lam=0.5)
-    # 7) package
+            for i, c in enumerate(chunks):
+                if errors:  # a stage failed: fetching further chunks would be wasted requests
+                    break
+                inflight.append((i, ex.submit(fetch, c)))
+                while inflight and (len(inflight) >= workers or i == len(chunks) - 1) and not errors:
+                    j, fut = inflight.popleft()
+                    recs[j] = fut.result()
+                    q_emb.put(j); q_cite.put(j)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            # drop fetches not started yet; running ones finish, their results are discarded
+            ex.shutdown(wait=True, cancel_futures=True)
+            q_emb.put(None); q_cite.put(None)
+
+    def consume(q: "queue.Queue", stage: str, work) -> None:
+        # keep draining after a failure so the producer never blocks on a full queue
+        while (j := q.get()) is not None:
+            if errors or not recs[j]:
+                continue
+            t0 = time.perf_counter()
+            try:
+                work(j)
+            except BaseException as e:
+                errors.append(e)
+            tm.add(stage, t0, time.perf_counter(), docs=len(recs[j]))
+
+    def embed(j: int) -> None:
+        pid = [str(r["pmid"]) for r in recs[j]]
+        texts = [(r.get("title") or "") + "\n" + (r.get("abstract") or "") for r in recs[j]]
+        vecs[j], _ = embed_cached(pid, texts, batch_size=emb_batch)
+
+    def cite(j: int) -> None:
+        ensure_citations([str(r["pmid"]) for r in recs[j]])
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=produce, daemon=True),
+               threading.Thread(target=consume, args=(q_emb, "embed", embed), daemon=True),
+               threading.Thread(target=consume, args=(q_cite, "citations", cite), daemon=True)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wall = time.perf_counter() - t0
+    if errors:
+        raise errors[0]
+    out_recs = [r for rc in recs for r in rc]
+    done = [v for v in vecs if v is not None]
+    if not done:
+        return out_recs, np.zeros((0, 0), dtype="float32"), {}
+    timings = {f"{k}_busy": round(v, 3) for k, v in tm.busy.items()}
+    timings.update({f"{k}_span": round(v[1] - v[0], 3) for k, v in tm.span.items()})
+    timings["stream_wall"] = round(wall, 3)
+    # > 1 means stages ran concurrently: sum of per-stage spans over the pipeline's wall time
+    timings["overlap"] = round(sum(v[1] - v[0] for v in tm.span.values()) / max(wall, 1e-9), 2)
+    return out_recs, np.vstack(done), timings
+
+def _texts(df: pd.DataFrame) -> List[str]:
+    return (df["title"].fillna("") + "\n" + df["abstract"].fillna("")).tolist()
+
+def _package(queries: List[str],
+             params: Dict[str,Any],
+             df: pd.DataFrame,
+             vecs: np.ndarray,
+             knn_idx: np.ndarray,
+             knn_cos: np.ndarray,
+             hyb: np.ndarray,
+             labels: np.ndarray,
+             method: str) -> Dict[str,Any]:
+    with trace.span("universe.soft_membership", docs=len(labels)):
+        uniq, W = soft_membership(vecs, labels, knn_idx, hyb, topm=2, lam=0.5)
+    # title terms: one doc x term matrix for the corpus, c-TF-IDF top terms for every theme
+    with trace.span("universe.terms", docs=len(df)):
+        dtm, vocab = build_dtm(df["title"].fillna("").tolist())
+        terms = top_terms_by_class(dtm, vocab, labels, k=8)
+    pmid_col = df["pmid"].astype(str).to_numpy()
+    year_col = pd.to_numeric(df["year"], errors="coerce").to_numpy() if "year" in df else np.full(len(df), np.nan)
     themes=[]
     for t in uniq:
         members = np.where(labels==t)[0].tolist()
         if not members: continue
         cent = vecs[members].mean(axis=0)
         cent = cent/(np.linalg.norm(cent)+1e-12)
-        yrs = pd.to_numeric(pd.Series([meta[str(df.iloc[i]['pmid'])]['year'] if str(df.iloc[i]['pmid']) in meta else df.iloc[i]['year'] for i in members]), errors="coerce")
+        yrs = pd.Series(year_col[members])
         theme = {
             "theme_id": int(t),
             "size": len(members),
             "members_idx": members,
-            "members_pmids": [str(df.iloc[i]["pmid"]) for i in members],
+            "members_pmids": pmid_col[members].tolist(),
             "centroid": cent.tolist(),
             "year_stats": {
                 "min": int(yrs.min()) if yrs.notna().any() else None,
                 "max": int(yrs.max()) if yrs.notna().any() else None,
                 "median": float(yrs.median()) if yrs.notna().any() else None,
             },
+            "terms": terms.get(int(t), []),
         }
         themes.append(theme)
-    out = {
+    return {
         "queries": queries,
-        "params": {"year_min":year_min,"year_max":year_max,"retmax":retmax,"hydrate":hydrate,"hops":hops,
-                   "per_seed_budget":per_seed_budget,"knn_k":knn_k,"alpha":alpha,"beta":beta,"resolution":resolution},
-        "count": len(pid),
+        "params": params,
+        "count": len(df),
         "cluster_method": method,
         "themes": themes,
         "docs": df.to_dict(orient="records"),
+        # kNN graph and labels, so update_universe can extend the universe incrementally
+        "knn": {"idx": np.ascontiguousarray(knn_idx, dtype=np.int64), "cos": np.ascontiguousarray(knn_cos, dtype="float32"),
+                "hyb": np.ascontiguousarray(hyb, dtype="float32"), "labels": np.asarray(labels, dtype=np.int64)},
+        "dtm": {"indptr": dtm.indptr, "indices": dtm.indices, "data": dtm.data, "shape": list(dtm.shape), "vocab": vocab},
     }
+
+def build_universe(queries: List[str],
+                   year_min: int | None,
+                   year_max: int | None,
+                   retmax: int = 500,
+                   hydrate: Literal["none","refs","citers","both"]="none",
+                   hops: int = 1,
+                   per_seed_budget: int = 150,
+                   hydrate_budget: int | None = None,
+                   knn_k: int = KNN_K,
+                   alpha: float = HYBRID_ALPHA,
+                   beta: float  = HYBRID_BETA,
+                   resolution: float = 0.8,
+                   threshold: float = 0.4,
+                   emb_batch: int = 48,
+                   knn_block: int = KNN_BLOCK,
+                   knn_backend: Literal["exact","ann"] = "exact",
+                   meta_ttl_days: float | None = META_TTL_DAYS,
+                   stream_chunk: int = 200,
+                   stream_depth: int = 4) -> Dict[str,Any]:
+    """
+    Multi-query -> (optional) hydration -> efetch -> cached embeddings -> hybrid kNN -> clustering.
+    efetch, embedding and iCite loading run as an overlapped pipeline over `stream_chunk`-PMID
+    chunks (see _stream_docs); stage timings are returned under "timings".
+    knn_backend="ann" answers the kNN from the persistent IVF index over the embedding cache.
+    Returns full universe dict {docs, themes, cluster_method, params, knn...}.
+    """
+    lap = _Laps()
+    # 1) union PMIDs from all queries
+    pmids = search_pmids(queries, year_min, year_max, retmax)
+    lap("esearch")
+    # 2) hydrate optionally
+    pmids_h = hydrate_pmids(pmids, mode=hydrate, hops=hops, per_seed_budget=per_seed_budget, budget=hydrate_budget)
+    lap("hydrate")
+    # 3-4) efetch metadata -> embeddings, with iCite refs loaded alongside (all cached)
+    records, vecs, stream_t = _stream_docs(pmids_h, meta_ttl_days, emb_batch, chunk=stream_chunk, depth=stream_depth)
+    if not records:
+        raise RuntimeError("No documents to embed.")
+    df = pd.DataFrame.from_records(records)
+    pid = [str(x) for x in df["pmid"].tolist()]
+    lap("fetch_embed")
+    # 5) hybrid kNN graph
+    with trace.span("universe.knn_search", docs=len(pid), backend=knn_backend):
+        if knn_backend == "ann":
+            knn_idx, knn_cos = ann_knn(pid, vecs, k=knn_k, model=LMSTUDIO_EMB_MODEL)
+        else:
+            knn_idx, knn_cos = knn_blocked(vecs, k=knn_k, block=knn_block)
+    # bibliographic coupling on kNN pairs
+    with trace.span("universe.coupling", docs=len(pid)):
+        R = ref_incidence(ensure_citations(pid).refs_of(pid))
+        bc_knn = coupling_knn(R, knn_idx)
+    hyb = hybrid_weights(knn_cos, bc_knn, alpha=alpha, beta=beta)
+    lap("knn")
+    # 6) cluster
+    labels, method = cluster_knn(vecs, knn_idx, hyb, resolution=resolution, threshold=threshold)
+    lap("cluster")
+    # 7) package
+    params = {"year_min":year_min,"year_max":year_max,"retmax":retmax,"hydrate":hydrate,"hops":hops,
+              "per_seed_budget":per_seed_budget,"hydrate_budget":hydrate_budget,"knn_k":knn_k,"knn_backend":knn_backend,"alpha":alpha,"beta":beta,
+              "resolution":resolution,"threshold":threshold}
+    out = _package(queries, params, df, vecs, knn_idx, knn_cos, hyb, labels, method)
+    lap("package")
+    out["timings"] = dict(lap.total(), **stream_t)
+    return out
+
+def update_universe(existing: Dict[str,Any],
+                    new_pmids: List[str],
+                    queries: List[str] | None = None,
+                    emb_batch: int = 48,
+                    knn_block: int = KNN_BLOCK,
+                    meta_ttl_days: float | None = META_TTL_DAYS,
+                    stream_chunk: int = 200,
+                    stream_depth: int = 4) -> Dict[str,Any]:
+    """
+    Add new_pmids to a universe built by build_universe, at a cost driven by the delta:
+    only new documents get a full kNN search, existing rows are rewritten only where a new
+    document enters their neighbour list, coupling is recomputed for those rows only, and
+    Leiden warm-starts from the previous partition. Theme ids of surviving themes are kept
+    (matched by member overlap); new themes get fresh ids. Docs keep their positions and
+    new ones are appended. Graph params (knn_k, alpha, beta, resolution, threshold) are the
+    existing universe's; `queries` are appended to its query list.
+    New PMIDs are hydrated like a full build with the existing universe's hydration params
+    (hydrate, hops, per_seed_budget, hydrate_budget), counting the budget over the new seeds
+    and never re-adding documents the universe already has.
+    """
+    lap = _Laps()
+    params = dict(existing["params"])
+    old_docs = existing["docs"]
+    df_old = pd.DataFrame.from_records(old_docs)
+    pid_old = [str(d["pmid"]) for d in old_docs]
+    have = set(pid_old)
+    todo = [p for p in dict.fromkeys(str(x) for x in new_pmids) if p not in have]
+    todo = hydrate_pmids(todo, mode=params.get("hydrate", "none"), hops=params.get("hops", 1),
+                         per_seed_budget=params.get("per_seed_budget", 150), budget=params.get("hydrate_budget"),
+                         exclude=pid_old)
+    lap("hydrate")
+    records, vecs_new, stream_t = _stream_docs(todo, meta_ttl_days, emb_batch, chunk=stream_chunk, depth=stream_depth)
+    all_queries = list(existing.get("queries", [])) + [q for q in (queries or []) if q not in existing.get("queries", [])]
+    vecs_old, _ = embed_cached(pid_old, _texts(df_old), batch_size=emb_batch)
+    lap("fetch_embed")
+    alpha, beta = params.get("alpha", HYBRID_ALPHA), params.get("beta", HYBRID_BETA)
+    g = existing.get("knn")
+    if g:
+        idx0 = np.asarray(g["idx"], dtype=np.int64).reshape(len(pid_old), -1)
+        cos0 = np.asarray(g["cos"], dtype="float32").reshape(idx0.shape)
+        hyb0 = np.asarray(g["hyb"], dtype="float32").reshape(idx0.shape)
+        labels0 = np.asarray(g["labels"], dtype=np.int64)
+    else:  # universes written before the graph was stored: rebuild it once
+        idx0, cos0 = knn_blocked(vecs_old, k=params.get("knn_k", KNN_K), block=knn_block)
+        hyb0 = hybrid_weights(cos0, coupling_knn(ref_incidence(ensure_citations(pid_old).refs_of(pid_old)), idx0), alpha=alpha, beta=beta)
+        labels0 = np.full(len(pid_old), -1, dtype=np.int64)
+        for t in existing["themes"]:
+            labels0[t["members_idx"]] = t["theme_id"]
+    if not records:
+        out = dict(existing, queries=all_queries)
+        out["timings"] = dict(lap.total(), **stream_t)
+        return out
+    df = pd.concat([df_old, pd.DataFrame.from_records(records)], ignore_index=True)
+    pid = pid_old + [str(r["pmid"]) for r in records]
+    vecs = np.vstack([vecs_old, vecs_new])
+    k = idx0.shape[1]
+    if k < min(params.get("knn_k", KNN_K), len(pid) - 1):  # old graph was capped by a tiny corpus
+        idx, cos = knn_blocked(vecs, k=params.get("knn_k", KNN_K), block=knn_block)
+        changed = np.ones(len(pid), dtype=bool)
+        hyb = np.zeros_like(cos)
+    else:
+        with trace.span("universe.knn_update", docs=len(pid)):
+            idx, cos, changed = knn_update(vecs, idx0, cos0, block=knn_block)
+        hyb = np.zeros_like(cos)
+        hyb[:len(pid_old)] = hyb0
+    # coupling only for rewritten rows, over the documents those rows touch
+    rows = np.flatnonzero(changed)
+    touched = np.unique(np.concatenate([rows, idx[rows].ravel()]))
+    local = np.full(len(pid), -1, dtype=np.int64)
+    local[touched] = np.arange(touched.size)
+    tp = [pid[i] for i in touched]
+    with trace.span("universe.coupling", docs=int(rows.size)):
+        R = ref_incidence(ensure_citations(tp).refs_of(tp))
+        bc = coupling_knn(R, local[idx[rows]], row_ids=local[rows])
+    hyb[rows] = hybrid_weights(cos[rows], bc, alpha=alpha, beta=beta)
+    lap("knn")
+    init = warm_start(labels0, idx)
+    labels, method = cluster_knn(vecs, idx, hyb, resolution=params.get("resolution", 0.8),
+                                 threshold=params.get("threshold", 0.4), initial=init)
+    labels = align_labels(labels, labels0)
+    lap("cluster")
+    out = _package(all_queries, params, df, vecs, idx, cos, hyb, labels, method)
+    lap("package")
+    out["timings"] = dict(lap.total(), **stream_t, changed_rows=int(changed.sum()), new_docs=len(records))
     return out
@@ -0,0 +1,103 @@
+# src/themes/cluster.py
+from __future__ import annotations
+from typing import Dict, Tuple
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+from themes.hybrid_graph import knn_edges, edges_to_csr
+
+def components_labels(n: int, edges: np.ndarray, weights: np.ndarray, threshold: float) -> np.ndarray:
+    """Connected components over edges with weight >= threshold; nodes without such edges get -1."""
+    keep = weights >= threshold
+    e = edges[keep]
+    labels = -1 * np.ones(n, dtype=int)
+    if e.size == 0:
+        return labels
+    _, comp = connected_components(edges_to_csr(n, e, weights[keep]), directed=False)
+    linked = np.zeros(n, dtype=bool)
+    linked[e.ravel()] = True
+    # renumber the linked components 0..C-1 in order of first node
+    _, first, inv = np.unique(comp[linked], return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first))
+    labels[linked] = rank[inv.ravel()]
+    return labels
+
+def cluster_knn(vecs: np.ndarray,
+                knn_idx: np.ndarray,
+                hyb: np.ndarray,
+                resolution: float,
+                threshold: float,
+                initial: np.ndarray | None = None) -> Tuple[np.ndarray, str]:
+    """
+    Cluster the hybrid kNN graph: Leiden → HDBSCAN → thresholded components.
+    Labels are aligned with row order of vecs / knn_idx (isolated nodes included).
+    `initial` (one community id >= 0 per node) warm-starts Leiden from a previous partition.
+    """
+    n = knn_idx.shape[0]
+    edges, w = knn_edges(knn_idx, hyb)
+    try:
+        import igraph as ig  # type: ignore
+        import leidenalg as la  # type: ignore
+        g = ig.Graph(n=n, edges=list(zip(edges[:, 0].tolist(), edges[:, 1].tolist())))
+        g.es["weight"] = w
+        init = None if initial is None else np.unique(initial, return_inverse=True)[1].ravel().tolist()
+        part = la.find_partition(g, la.RBConfigurationVertexPartition, weights="weight",
+                                 resolution_parameter=resolution, initial_membership=init)
+        return np.asarray(part.membership, dtype=int), "leiden"
+    except Exception:
+        pass
+    try:
+        import importlib.util
+        if importlib.util.find_spec("hdbscan") is None:
+            raise ImportError("hdbscan not installed")
+        import hdbscan  # type: ignore
+        labels = hdbscan.HDBSCAN(min_cluster_size=max(10, n // 50), metric="euclidean").fit_predict(vecs)
+        return labels, "hdbscan"
+    except Exception:
+        TH = float(threshold)
+        return components_labels(n, edges, w, TH), f"components@{TH}"
+
+def warm_start(labels_old: np.ndarray, knn_idx: np.ndarray) -> np.ndarray:
+    """
+    Initial membership for a graph grown from a clustered one: old nodes keep their label,
+    new nodes (and old unlabelled ones) take the most common label among their kNN,
+    else a singleton community of their own.
+    """
+    n, n_old = knn_idx.shape[0], labels_old.shape[0]
+    init = np.full(n, -1, dtype=np.int64)
+    init[:n_old] = labels_old
+    for i in np.flatnonzero(init < 0):
+        nei = knn_idx[i][(knn_idx[i] >= 0) & (knn_idx[i] < n_old)]
+        lab = labels_old[nei]
+        lab = lab[lab >= 0]
+        if lab.size:
+            init[i] = np.bincount(lab).argmax()
+    free = init < 0
+    init[free] = init.max(initial=-1) + 1 + np.arange(int(free.sum()))
+    return init
+
+def align_labels(labels: np.ndarray, prev: np.ndarray) -> np.ndarray:
+    """
+    Renumber `labels` so clusters keep the id of the previous cluster they overlap most
+    (prev covers the first len(prev) nodes; -1 = unlabelled). Matching is greedy by overlap
+    size; clusters without a match get ids above every previous one. -1 stays -1.
+    """
+    n_prev = prev.shape[0]
+    both = (labels[:n_prev] >= 0) & (prev >= 0)
+    pairs, counts = np.unique(np.stack([labels[:n_prev][both], prev[both]]), axis=1, return_counts=True)
+    mapping: Dict[int, int] = {}
+    used = set()
+    for t in np.argsort(-counts, kind="stable"):
+        new, old = int(pairs[0, t]), int(pairs[1, t])
+        if new not in mapping and old not in used:
+            mapping[new] = old
+            used.add(old)
+    nxt = max(int(prev.max(initial=-1)), -1) + 1
+    for c in np.unique(labels[labels >= 0]):
+        if int(c) not in mapping:
+            mapping[int(c)] = nxt
+            nxt += 1
+    out = labels.copy()
+    ok = labels >= 0
+    out[ok] = [mapping[int(c)] for c in labels[ok]]
+    return out
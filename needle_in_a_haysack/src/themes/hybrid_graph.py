@@ -1,6 +1,9 @@
 from __future__ import annotations
 import numpy as np
-from typing import Tuple
+import scipy.sparse as sp
+from typing import Iterable, List, Tuple
+
+from config import KNN_BLOCK
 
 def cosine_sim_matrix(X: np.ndarray, Y: np.ndarray | None = None) -> np.ndarray:
     if Y is None: Y = X
@@ -9,12 +12,183 @@ def cosine_sim_matrix(X: np.ndarray, Y: np.ndarray | None = None) -> np.ndarray:
     return Xn @ Yn.T
 
 def build_knn(sims: np.ndarray, k: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-k from a dense similarity matrix; the self-match is excluded when square."""
     n = sims.shape[0]
-    k = min(k, n-1) if n > 1 else 1
+    if sims.shape[0] == sims.shape[1]:
+        sims = sims.copy()
+        np.fill_diagonal(sims, -np.inf)
+    k = min(k, n-1) if n > 1 else 0
+    if k <= 0:
+        return np.zeros((n, 0), dtype=np.int64), np.zeros((n, 0), dtype=sims.dtype)
     idx = np.argpartition(-sims, kth=k-1, axis=1)[:, :k]
     vals = np.take_along_axis(sims, idx, axis=1)
     return idx, vals
 
+def knn_blocked(X: np.ndarray,
+                k: int = 20,
+                block: int = KNN_BLOCK,
+                col_block: int | None = None,
+                Y: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine top-k of each row of X against Y (default: X itself, self-match excluded),
+    without materializing the n x m matrix. Row blocks of X are multiplied against column
+    blocks of Y and merged into a running top-k, so peak memory is
+    O(n*k + block*col_block). Neighbours are returned sorted by descending similarity.
+    """
+    same = Y is None
+    Xn = np.ascontiguousarray(X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12), dtype="float32")
+    Yn = Xn if same else np.ascontiguousarray(Y / (np.linalg.norm(Y, axis=1, keepdims=True) + 1e-12), dtype="float32")
+    n, m = Xn.shape[0], Yn.shape[0]
+    k = max(0, min(k, m - 1 if same else m))
+    idx = np.zeros((n, k), dtype=np.int64)
+    vals = np.zeros((n, k), dtype="float32")
+    if k == 0 or n == 0:
+        return idx, vals
+    block = max(1, int(block))
+    col_block = max(k, int(col_block or 4 * block))
+    for s in range(0, n, block):
+        e = min(n, s + block)
+        best_v = np.full((e - s, k), -np.inf, dtype="float32")
+        best_i = np.full((e - s, k), -1, dtype=np.int64)
+        for cs in range(0, m, col_block):
+            ce = min(m, cs + col_block)
+            S = Xn[s:e] @ Yn[cs:ce].T
+            if same and cs < e and s < ce:
+                r = np.arange(max(s, cs), min(e, ce))
+                S[r - s, r - cs] = -np.inf
+            kk = min(k, ce - cs)
+            part = np.argpartition(S, kth=S.shape[1]-kk, axis=1)[:, -kk:]
+            cand_v = np.concatenate([best_v, np.take_along_axis(S, part, axis=1)], axis=1)
+            cand_i = np.concatenate([best_i, part + cs], axis=1)
+            top = np.argpartition(-cand_v, kth=k-1, axis=1)[:, :k]
+            best_v = np.take_along_axis(cand_v, top, axis=1)
+            best_i = np.take_along_axis(cand_i, top, axis=1)
+        order = np.argsort(-best_v, axis=1, kind="stable")
+        idx[s:e] = np.take_along_axis(best_i, order, axis=1)
+        vals[s:e] = np.take_along_axis(best_v, order, axis=1)
+    return idx, vals
+
+def knn_update(X: np.ndarray,
+               knn_idx: np.ndarray,
+               knn_sims: np.ndarray,
+               block: int = KNN_BLOCK) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Extend an exact kNN graph over X[:n_old] (knn_idx/knn_sims, n_old rows) to all of X,
+    where rows n_old.. are new documents. New rows get a full search; an old row is only
+    rewritten when some new document beats its current k-th neighbour.
+    Returns (idx [n, k], sims [n, k], changed [n] bool); same result as knn_blocked(X, k).
+    """
+    n_old, k = knn_idx.shape
+    n = X.shape[0]
+    idx = np.zeros((n, k), dtype=np.int64)
+    sims = np.zeros((n, k), dtype="float32")
+    idx[:n_old], sims[:n_old] = knn_idx, knn_sims
+    changed = np.zeros(n, dtype=bool)
+    if n == n_old or k == 0:
+        return idx, sims, changed
+    changed[n_old:] = True
+    # new rows against everything (k + 1 so the self-match can be dropped)
+    ni, nv = knn_blocked(X[n_old:], k=k + 1, block=block, Y=X)
+    own = ni == (np.arange(n_old, n)[:, None])
+    keep = np.argsort(own, axis=1, kind="stable")[:, :k]  # stable: self moves last, order kept
+    idx[n_old:] = np.take_along_axis(ni, keep, axis=1)
+    sims[n_old:] = np.take_along_axis(nv, keep, axis=1)
+    if n_old == 0:
+        return idx, sims, changed
+    # old rows: best new candidates, merged where they beat the current k-th neighbour
+    ci, cv = knn_blocked(X[:n_old], k=min(k, n - n_old), block=block, Y=X[n_old:])
+    hit = cv[:, 0] > knn_sims[:, -1]
+    rows = np.flatnonzero(hit)
+    if rows.size:
+        cand_i = np.concatenate([knn_idx[rows], ci[rows] + n_old], axis=1)
+        cand_v = np.concatenate([knn_sims[rows], cv[rows]], axis=1)
+        order = np.argsort(-cand_v, axis=1, kind="stable")[:, :k]
+        idx[rows] = np.take_along_axis(cand_i, order, axis=1)
+        sims[rows] = np.take_along_axis(cand_v, order, axis=1)
+        changed[rows] = True
+    return idx, sims, changed
+
+def ref_incidence(ref_lists: List[Iterable[int]]) -> sp.csr_matrix:
+    """Binary CSR document x reference matrix (duplicate refs collapse, like a set)."""
+    arrs = [np.asarray(r, dtype=np.int64).ravel() for r in ref_lists]
+    lens = np.fromiter((a.size for a in arrs), dtype=np.int64, count=len(arrs))
+    flat = np.concatenate(arrs) if arrs else np.zeros(0, dtype=np.int64)
+    uniq, cols = np.unique(flat, return_inverse=True)
+    rows = np.repeat(np.arange(len(ref_lists)), lens)
+    R = sp.csr_matrix((np.ones(flat.size, dtype=np.float32), (rows, cols.ravel())),
+                      shape=(len(ref_lists), uniq.size))
+    R.sum_duplicates()
+    R.data[:] = 1.0
+    return R
+
+def _jaccard(R: sp.csr_matrix, counts: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    inter = np.asarray(R[rows].multiply(R[cols]).sum(axis=1), dtype=np.float64).ravel()
+    uni = counts[rows] + counts[cols] - inter
+    out = np.zeros(rows.size, dtype=np.float64)
+    ok = inter > 0
+    out[ok] = inter[ok] / np.maximum(uni[ok], 1)
+    return out
+
+def coupling_knn(R: sp.csr_matrix, knn_idx: np.ndarray, pair_block: int = 200_000,
+                 row_ids: np.ndarray | None = None) -> np.ndarray:
+    """
+    Bibliographic coupling (Jaccard of reference sets) for every kNN pair (i, knn_idx[i, t]),
+    from sparse row products; same values as the set-based |Ri & Rj| / |Ri | Rj|.
+    `row_ids` gives the document of each knn_idx row when only a subset of rows is passed.
+    """
+    n, k = knn_idx.shape
+    counts = np.diff(R.indptr).astype(np.float64)
+    rows = np.repeat(np.arange(n) if row_ids is None else np.asarray(row_ids, dtype=np.int64), k)
+    cols = knn_idx.ravel()
+    out = np.zeros(rows.size, dtype="float32")
+    for s in range(0, rows.size, pair_block):
+        out[s:s+pair_block] = _jaccard(R, counts, rows[s:s+pair_block], cols[s:s+pair_block])
+    return out.reshape(n, k)
+
+def coupling_pairs(R: sp.csr_matrix, threshold: float, block: int = KNN_BLOCK) -> sp.csr_matrix:
+    """
+    All document pairs (i != j) with coupling Jaccard >= threshold, as a symmetric CSR matrix.
+    Shared-reference counts come from R @ R.T, computed one row block at a time.
+    """
+    n = R.shape[0]
+    counts = np.diff(R.indptr).astype(np.float64)
+    RT = R.T.tocsc()
+    rr, cc, vv = [], [], []
+    for s in range(0, n, block):
+        C = (R[s:s+block] @ RT).tocoo()
+        i, j = C.row + s, C.col
+        jac = C.data / (counts[i] + counts[j] - C.data)
+        keep = (i != j) & (jac >= threshold)
+        rr.append(i[keep]); cc.append(j[keep]); vv.append(jac[keep].astype("float32"))
+    cat = lambda xs, dt: np.concatenate(xs) if xs else np.zeros(0, dtype=dt)
+    return sp.csr_matrix((cat(vv, "float32"), (cat(rr, np.int64), cat(cc, np.int64))), shape=(n, n))
+
+def knn_edges(knn_idx: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Undirected edge list from kNN arrays: (i, knn_idx[i, t]) pairs are symmetrized to u < v,
+    duplicates keep their max weight, and non-positive weights / self-loops are dropped.
+    Returns (edges [m, 2] int64, weights [m] float32) sorted by (u, v).
+    """
+    n, k = knn_idx.shape
+    i = np.repeat(np.arange(n, dtype=np.int64), k)
+    j = knn_idx.ravel().astype(np.int64)
+    w = np.asarray(weights, dtype="float32").ravel()
+    keep = (w > 0) & (j >= 0) & (i != j)
+    i, j, w = i[keep], j[keep], w[keep]
+    key = np.minimum(i, j) * n + np.maximum(i, j)
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if key.size else np.zeros(0, dtype=np.int64)
+    w = np.maximum.reduceat(w[order], starts) if key.size else w
+    key = key[starts]
+    return np.stack([key // n, key % n], axis=1), w
+
+def edges_to_csr(n: int, edges: np.ndarray, weights: np.ndarray) -> sp.csr_matrix:
+    """Symmetric weighted adjacency matrix from a u < v edge list."""
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    return sp.csr_matrix((np.concatenate([weights, weights]), (rows, cols)), shape=(n, n))
+
 def hybrid_weights(cosine_knn_sims: np.ndarray, coupling_knn_sims: np.ndarray | None, alpha: float, beta: float) -> np.ndarray:
     if coupling_knn_sims is None:
         return cosine_knn_sims
@@ -0,0 +1,58 @@
+# src/themes/terms.py
+from __future__ import annotations
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+
+# words of 3+ letters/digits that are not pure numbers
+TOKEN_PATTERN = r"(?u)\b(?!\d+\b)\w\w\w+\b"
+
+def build_dtm(texts: Sequence[str]) -> Tuple[sp.csr_matrix, List[str]]:
+    """Tokenize once: sparse doc x term count matrix (English stop words removed) and its vocabulary."""
+    cv = CountVectorizer(token_pattern=TOKEN_PATTERN, stop_words="english", lowercase=True, dtype=np.int32)
+    try:
+        X = cv.fit_transform([t or "" for t in texts])
+    except ValueError:  # empty vocabulary
+        return sp.csr_matrix((len(texts), 0), dtype=np.int32), []
+    return X.tocsr(), cv.get_feature_names_out().tolist()
+
+def ctfidf(X: sp.csr_matrix, labels: np.ndarray) -> Tuple[List[int], sp.csr_matrix]:
+    """
+    Class-based TF-IDF: term counts summed per class (one sparse product), L1-normalized
+    per class, weighted by log(1 + mean class size in words / term frequency over classes).
+    Returns (class ids, scores [T, V] CSR); labels < 0 are ignored.
+    """
+    labels = np.asarray(labels)
+    uniq = sorted(set(int(x) for x in labels if x >= 0))
+    has = labels >= 0
+    col = np.searchsorted(uniq, labels[has])
+    L = sp.csr_matrix((np.ones(int(has.sum())), (col, np.flatnonzero(has))), shape=(len(uniq), X.shape[0]))
+    C = (L @ X).astype(np.float64).tocsr()
+    if C.nnz == 0:
+        return uniq, C
+    words = np.asarray(C.sum(axis=1)).ravel()
+    freq = np.asarray(C.sum(axis=0)).ravel()
+    idf = np.log1p(words.mean() / np.maximum(freq, 1))
+    tf = sp.diags(1.0 / np.maximum(words, 1)) @ C
+    return uniq, (tf @ sp.diags(idf)).tocsr()
+
+def top_terms_by_class(X: sp.csr_matrix, vocab: List[str], labels: np.ndarray, k: int = 8) -> Dict[int, List[str]]:
+    """Top-k c-TF-IDF terms of every class, ties broken alphabetically."""
+    uniq, S = ctfidf(X, labels)
+    vocab_arr = np.asarray(vocab, dtype=object)
+    out: Dict[int, List[str]] = {}
+    for r, c in enumerate(uniq):
+        lo, hi = S.indptr[r], S.indptr[r+1]
+        idx, val = S.indices[lo:hi], S.data[lo:hi]
+        order = np.lexsort((vocab_arr[idx].astype(str), -val))[:k] if idx.size else []
+        out[c] = vocab_arr[idx[order]].tolist() if idx.size else []
+    return out
+
+def theme_terms(texts: Sequence[str], themes_members: Dict[int, Sequence[int]], k: int = 8) -> Dict[int, List[str]]:
+    """Convenience: tokenize texts and return top-k terms per theme id (members are row indices)."""
+    X, vocab = build_dtm(texts)
+    labels = np.full(len(texts), -1, dtype=np.int64)
+    for tid, rows in themes_members.items():
+        labels[np.asarray(list(rows), dtype=np.int64)] = tid
+    return top_terms_by_class(X, vocab, labels, k=k)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import numpy as np
+import scipy.sparse as sp
 
 def soft_membership(
     doc_vecs: np.ndarray,
@@ -7,38 +8,62 @@ def soft_membership(
     kNN_idx: np.ndarray,
     kNN_sims: np.ndarray,
     topm: int = 2,
-    lam: float = 0.5
+    lam: float = 0.5,
+    sparse: bool = False,
+    block: int = 4096
 ):
-    # Centroids
+    """
+    Soft theme membership: softmax over themes of
+      lam * cos(doc, theme centroid) + (1-lam) * mean kNN sim to neighbours in that theme,
+    keeping only the top-m themes per doc.
+    Returns (theme ids, W) with W dense [n, T], or CSR [n, T] holding only top-m when sparse=True.
+    Scores are computed in row blocks, so sparse output needs O(block * T) working memory.
+    """
+    n = doc_vecs.shape[0]
+    labels = np.asarray(labels)
     uniq = sorted(set(int(x) for x in labels if x >= 0))
-    centroids = {}
-    for t in uniq:
-        M = doc_vecs[labels==t]
-        c = M.mean(axis=0)
-        centroids[t] = c / (np.linalg.norm(c)+1e-12)
+    T = len(uniq)
+    if T == 0:
+        return uniq, (sp.csr_matrix((n, 0), dtype="float32") if sparse else np.zeros((n, 0), dtype="float32"))
+    col_of = np.full(int(max(uniq)) + 1, -1, dtype=np.int64)
+    col_of[uniq] = np.arange(T)
+    doc_col = np.where(labels >= 0, col_of[np.maximum(labels, 0)], -1)
 
-    # cosine to centroids
-    cos_to_t = np.zeros((doc_vecs.shape[0], len(uniq)), dtype="float32")
-    for j,t in enumerate(uniq):
-        c = centroids[t]
-        cos_to_t[:, j] = (doc_vecs @ c) / (np.linalg.norm(doc_vecs,axis=1)+1e-12)
+    # Centroids: one label-indicator matmul
+    has = doc_col >= 0
+    L = sp.csr_matrix((np.ones(int(has.sum()), dtype="float32"), (doc_col[has], np.flatnonzero(has))), shape=(T, n))
+    C = np.asarray(L @ doc_vecs) / np.asarray(L.sum(axis=1))
+    C /= (np.linalg.norm(C, axis=1, keepdims=True) + 1e-12)
 
-    # neighbor similarity per theme (avg sim to neighbors with that label)
-    avg_nei = np.zeros_like(cos_to_t)
-    for i in range(doc_vecs.shape[0]):
-        nei = kNN_idx[i]; sims = kNN_sims[i]
-        for j,t in enumerate(uniq):
-            mask = (labels[nei] == t)
-            avg_nei[i,j] = sims[mask].mean() if mask.any() else 0.0
+    # neighbour similarity per theme: scatter kNN sims into sparse n x T sums / counts
+    k = kNN_idx.shape[1]
+    rows = np.repeat(np.arange(n), k)
+    nei = kNN_idx.ravel()
+    ncol = np.where(nei >= 0, doc_col[np.maximum(nei, 0)], -1)
+    ok = ncol >= 0
+    S_sum = sp.csr_matrix((np.asarray(kNN_sims, dtype=np.float64).ravel()[ok], (rows[ok], ncol[ok])), shape=(n, T))
+    S_cnt = sp.csr_matrix((np.ones(int(ok.sum())), (rows[ok], ncol[ok])), shape=(n, T))
 
-    raw = lam * cos_to_t + (1-lam) * avg_nei
-    raw = raw - raw.max(axis=1, keepdims=True)
-    e = np.exp(raw)
-    W = e / (e.sum(axis=1, keepdims=True) + 1e-12)
-
-    # keep only top-m
-    top_idx = np.argsort(-W, axis=1)[:, :topm]
-    W_sparse = np.zeros_like(W)
-    rows = np.arange(W.shape[0])[:,None]
-    W_sparse[rows, top_idx] = W[rows, top_idx]
-    return uniq, W_sparse
+    norms = np.linalg.norm(doc_vecs, axis=1) + 1e-12
+    W = None if sparse else np.zeros((n, T), dtype="float32")
+    w_rows, w_cols, w_vals = [], [], []
+    m = min(topm, T)
+    for s in range(0, n, block):
+        e = min(n, s + block)
+        cos_to_t = ((doc_vecs[s:e] @ C.T) / norms[s:e, None]).astype("float32")
+        cnt = S_cnt[s:e].toarray()
+        avg_nei = np.divide(S_sum[s:e].toarray(), cnt, out=np.zeros_like(cnt), where=cnt > 0).astype("float32")
+        raw = lam * cos_to_t + (1-lam) * avg_nei
+        raw = raw - raw.max(axis=1, keepdims=True)
+        ex = np.exp(raw)
+        Wb = ex / (ex.sum(axis=1, keepdims=True) + 1e-12)
+        # keep only top-m
+        top_idx = np.argsort(-Wb, axis=1)[:, :m]
+        r = np.arange(e - s)[:, None]
+        if sparse:
+            w_rows.append(np.repeat(np.arange(s, e), m)); w_cols.append(top_idx.ravel()); w_vals.append(Wb[r, top_idx].ravel())
+        else:
+            W[s + r, top_idx] = Wb[r, top_idx]
+    if sparse:
+        W = sp.csr_matrix((np.concatenate(w_vals), (np.concatenate(w_rows), np.concatenate(w_cols))), shape=(n, T))
+    return uniq, W
@@ -0,0 +1,47 @@
+# src/utils/filelock.py
+from __future__ import annotations
+import os, pathlib, threading, contextlib
+from typing import Dict, Iterator
+
+try:
+    import fcntl  # POSIX
+
+    def _lock_fd(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock_fd(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_fd(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+    def _unlock_fd(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+_THREAD_LOCKS: Dict[str, threading.Lock] = {}
+_GUARD = threading.Lock()
+
+@contextlib.contextmanager
+def file_lock(path: pathlib.Path) -> Iterator[None]:
+    """
+    Exclusive advisory lock on `path`, held across threads and processes.
+    Blocks until acquired; released on exit.
+    """
+    key = str(path)
+    with _GUARD:
+        tl = _THREAD_LOCKS.setdefault(key, threading.Lock())
+    with tl:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(key, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock_fd(fd)
+            try:
+                yield
+            finally:
+                _unlock_fd(fd)
+        finally:
+            os.close(fd)
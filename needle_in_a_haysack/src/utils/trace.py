@@ -0,0 +1,183 @@
+# src/utils/trace.py
+from __future__ import annotations
+import contextlib, functools, json, os, pathlib, threading, time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Process-wide tracing switch. While off, span() hands back one shared no-op object and
+# count() returns after a single flag check, so instrumented code pays ~nothing.
+_ON = False
+_LOCK = threading.Lock()
+_EVENTS: List[Dict[str,Any]] = []
+_COUNTERS: Dict[str, float] = {}
+_T0 = 0
+
+def enabled() -> bool:
+    return _ON
+
+def start() -> None:
+    """Clear previous data and start recording spans and counters."""
+    global _ON, _T0
+    with _LOCK:
+        _EVENTS.clear()
+        _COUNTERS.clear()
+        _T0 = time.perf_counter_ns()
+        _ON = True
+
+def stop() -> None:
+    global _ON
+    _ON = False
+
+class _NullSpan:
+    __slots__ = ()
+    def __enter__(self) -> "_NullSpan": return self
+    def __exit__(self, *exc) -> bool: return False
+    def set(self, **args) -> None: pass
+
+_NULL = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "args", "t0")
+
+    def __init__(self, name: str, args: Dict[str,Any]):
+        self.name, self.args = name, args
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def set(self, **args) -> None:
+        """Attach values only known inside the span (e.g. docs=len(result))."""
+        self.args.update(args)
+
+    def __exit__(self, et, ev, tb) -> bool:
+        t1 = time.perf_counter_ns()
+        if et is not None:
+            self.args["error"] = et.__name__
+        e = {"name": self.name, "cat": self.name.split(".", 1)[0], "ph": "X",
+             "ts": (self.t0 - _T0) / 1e3, "dur": (t1 - self.t0) / 1e3,
+             "pid": os.getpid(), "tid": threading.get_ident()}
+        if self.args:
+            e["args"] = self.args
+        with _LOCK:
+            _EVENTS.append(e)
+        return False
+
+def span(name: str, **args):
+    """
+    Context manager timing one stage: `with span("universe.knn", docs=n): ...`.
+    A numeric `docs` arg feeds the docs/s column of the summary.
+    """
+    return _Span(name, args) if _ON else _NULL
+
+def record(name: str, t0: float, t1: float, **args) -> None:
+    """Add a finished span from time.perf_counter() readings (for code that already times itself)."""
+    if not _ON:
+        return
+    e = {"name": name, "cat": name.split(".", 1)[0], "ph": "X", "ts": t0 * 1e6 - _T0 / 1e3,
+         "dur": (t1 - t0) * 1e6, "pid": os.getpid(), "tid": threading.get_ident()}
+    if args:
+        e["args"] = args
+    with _LOCK:
+        _EVENTS.append(e)
+
+def traced(name: str) -> Callable:
+    """Decorator form of span() (flag checked per call)."""
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not _ON:
+                return fn(*a, **kw)
+            with _Span(name, {}):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+def count(name: str, n: float = 1) -> None:
+    """Add n to a named counter (e.g. "http.entrez.requests", "cache.meta.hit")."""
+    if not _ON:
+        return
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+def counters() -> Dict[str, float]:
+    with _LOCK:
+        return dict(_COUNTERS)
+
+def span_stats() -> List[Dict[str,Any]]:
+    """
+    Per span name: calls, busy seconds (sum of durations), wall seconds (first start to last
+    end, so concurrent spans are not double counted), max ms, docs and docs per wall second.
+    Sorted by wall time, longest first.
+    """
+    with _LOCK:
+        events = list(_EVENTS)
+    agg: Dict[str, Dict[str,Any]] = {}
+    for e in events:
+        a = agg.setdefault(e["name"], {"name": e["name"], "calls": 0, "busy": 0.0, "lo": e["ts"],
+                                       "hi": 0.0, "max": 0.0, "docs": 0})
+        a["calls"] += 1
+        a["busy"] += e["dur"]
+        a["lo"] = min(a["lo"], e["ts"])
+        a["hi"] = max(a["hi"], e["ts"] + e["dur"])
+        a["max"] = max(a["max"], e["dur"])
+        d = e.get("args", {}).get("docs")
+        if isinstance(d, (int, float)):
+            a["docs"] += d
+    out = []
+    for a in agg.values():
+        wall = (a["hi"] - a["lo"]) / 1e6
+        out.append({"name": a["name"], "calls": a["calls"], "busy_s": round(a["busy"] / 1e6, 4),
+                    "wall_s": round(wall, 4), "max_ms": round(a["max"] / 1e3, 2), "docs": a["docs"],
+                    "docs_per_s": round(a["docs"] / wall, 1) if a["docs"] and wall > 0 else None})
+    return sorted(out, key=lambda r: -r["wall_s"])
+
+def summary() -> str:
+    """Plain-text table of span_stats() and counters()."""
+    rows = span_stats()
+    w = max([len(r["name"]) for r in rows] + [4])
+    lines = [f"{'span':<{w}} {'calls':>7} {'wall s':>9} {'busy s':>9} {'max ms':>9} {'docs':>8} {'docs/s':>9}"]
+    for r in rows:
+        lines.append(f"{r['name']:<{w}} {r['calls']:>7} {r['wall_s']:>9.3f} {r['busy_s']:>9.3f} {r['max_ms']:>9.1f} "
+                     f"{r['docs'] or '':>8} {r['docs_per_s'] or '':>9}")
+    cs = counters()
+    if cs:
+        lines.append("")
+        cw = max(len(k) for k in cs)
+        for k in sorted(cs):
+            v = cs[k]
+            lines.append(f"{k:<{cw}} {int(v) if float(v).is_integer() else round(v, 3):>12}")
+    return "\n".join(lines)
+
+def write(path: str | pathlib.Path) -> pathlib.Path:
+    """Chrome trace JSON (chrome://tracing, Perfetto): complete events, thread names, counters."""
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _LOCK:
+        events = list(_EVENTS)
+    names = {t.ident: t.name for t in threading.enumerate()}
+    meta = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": names.get(tid, str(tid))}}
+            for tid in sorted({e["tid"] for e in events})]
+    end = (time.perf_counter_ns() - _T0) / 1e3
+    cs = counters()
+    if cs:
+        meta.append({"name": "counters", "ph": "C", "ts": end, "pid": os.getpid(), "tid": 0, "args": cs})
+    doc = {"traceEvents": meta + events, "displayTimeUnit": "ms",
+           "otherData": {"counters": cs, "spans": span_stats()}}
+    # span args may hold numpy scalars
+    path.write_text(json.dumps(doc, default=lambda o: o.item() if hasattr(o, "item") else str(o)), encoding="utf-8")
+    return path
+
+@contextlib.contextmanager
+def session(path: Optional[str]) -> Iterator[None]:
+    """Script helper: with a path, trace the block, then write the trace and print the summary."""
+    if not path:
+        yield
+        return
+    start()
+    try:
+        yield
+    finally:
+        stop()
+        write(path)
+        print(f"\n=== TRACE ({path}) ===")
+        print(summary())
@@ -0,0 +1,61 @@
+# tests/test_entrez.py
+from __future__ import annotations
+import pathlib, sys, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+SRC = pathlib.Path(__file__).resolve().parents[1] / "src"
+if str(SRC) not in sys.path: sys.path.insert(0, str(SRC))
+
+from clients import entrez
+
+ARTICLE = ("<PubmedArticle><MedlineCitation><PMID>{0}</PMID><Article><ArticleTitle>Title {0}</ArticleTitle>"
+           "<Journal><JournalIssue><PubDate><Year>2020</Year></PubDate></JournalIssue></Journal>"
+           "</Article></MedlineCitation></PubmedArticle>")
+
+def _body(pmids):
+    return ("<?xml version=\"1.0\"?><PubmedArticleSet>" + "".join(ARTICLE.format(p) for p in pmids)
+            + "</PubmedArticleSet>").encode()
+
+@pytest.fixture
+def efetch_server(monkeypatch):
+    """Local efetch that cuts off the first `state["truncate"]` responses mid-body."""
+    state = {"calls": 0, "truncate": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["calls"] += 1
+            body = _body(["1", "2", "3"])
+            self.send_response(200)
+            self.send_header("Content-Type", "text/xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if state["calls"] <= state["truncate"]:
+                self.wfile.write(body[: len(body) // 2])  # promised more than is sent
+                self.close_connection = True
+            else:
+                self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(entrez, "EUTILS", f"http://127.0.0.1:{srv.server_address[1]}")
+    yield state
+    srv.shutdown()
+    srv.server_close()
+
+def test_efetch_retries_truncated_body(efetch_server):
+    efetch_server["truncate"] = 1
+    out = entrez.efetch_abstracts(["1", "2", "3"], workers=1)
+    assert sorted(out) == ["1", "2", "3"]
+    assert out["2"]["title"] == "Title 2"
+    assert efetch_server["calls"] == 2
+
+def test_efetch_raises_after_last_attempt(efetch_server):
+    efetch_server["truncate"] = 10
+    with pytest.raises(Exception):
+        entrez.efetch_abstracts(["1", "2", "3"], workers=1)
+    assert efetch_server["calls"] == 3